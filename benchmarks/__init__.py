@@ -0,0 +1,13 @@
+"""
+Бенчмарки API и рассылки напоминаний.
+
+Запуск (нужен PostgreSQL, как для тестов; данные создаются в отдельной
+тестовой базе и удаляются после прогона):
+
+    python -m benchmarks --users 200 --habits-per-user 5 --output before.json
+    python -m benchmarks --users 200 --habits-per-user 5 --compare before.json
+
+Результаты — JSON с p50/p99 задержки и пропускной способностью по каждому
+сценарию; --compare сравнивает с сохраненным прогоном и завершается с кодом 1,
+если какой-то сценарий стал медленнее больше чем на --tolerance.
+"""
@@ -0,0 +1,60 @@
+import argparse
+import logging
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Бенчмарки API и рассылки')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--habits-per-user', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=200, help='Замеров на сценарий API')
+    parser.add_argument('--reminder-runs', type=int, default=5, help='Прогонов send_reminders')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора данных')
+    parser.add_argument('--only', nargs='+', help='Только эти сценарии')
+    parser.add_argument('--output', help='Файл для результатов (по умолчанию benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Допустимое ухудшение (доля)')
+    options = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+
+    django.setup()
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+    from . import results
+    from .suite import SCENARIOS, run_benchmarks
+
+    unknown = set(options.only or ()) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Неизвестные сценарии: {', '.join(sorted(unknown))}; есть: {', '.join(SCENARIOS)}")
+
+    # Логи каждого запроса и пачки только мешают читать результаты
+    logging.disable(logging.INFO)
+    # Отдельная тестовая база, как у pytest: рабочие данные не трогаются
+    setup_test_environment(debug=False)
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        current = run_benchmarks(
+            options.users, options.habits_per_user, options.iterations,
+            options.reminder_runs, options.seed, options.only)
+    finally:
+        teardown_databases(databases, verbosity=0)
+
+    output = options.output or f"benchmarks/results/{current['environment']['commit'] or 'local'}.json"
+    results.write(current, output)
+    for name, stats in current['benchmarks'].items():
+        print(f"{name:<16} p50 {stats['p50_ms']:>9} ms  p99 {stats['p99_ms']:>9} ms  "
+              f"{stats['throughput_per_s']:>9}/s")
+    print(f'Результаты записаны в {output}')
+
+    if options.compare:
+        rows = results.compare(results.load(options.compare), current, options.tolerance)
+        print(results.format_comparison(rows))
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
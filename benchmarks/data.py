@@ -0,0 +1,23 @@
+from django.db.models import Max
+from rest_framework.authtoken.models import Token
+from habits.seeding import seed as seed_habits
+from users.models import CustomUser
+
+PASSWORD = 'password123'
+EMAIL_DOMAIN = 'bench.example.com'
+
+
+def seed(users, habits_per_user, seed=0, batch_size=1000):
+    """
+    Создает users пользователей с токенами и в среднем по habits_per_user
+    привычек на каждого тем же генератором, что и seed_habits (habits.seeding).
+    Данные детерминированы seed, чтобы прогоны были сравнимы.
+    Возвращает созданных пользователей.
+    """
+    last_id = CustomUser.objects.aggregate(last=Max('id'))['last'] or 0
+    seed_habits(users, habits_per_user, batch_size=batch_size, seed=seed,
+                password=PASSWORD, email_domain=EMAIL_DOMAIN)
+    created = list(CustomUser.objects.filter(id__gt=last_id, email__endswith=f'@{EMAIL_DOMAIN}').order_by('id'))
+    Token.objects.bulk_create(
+        [Token(user=user, key=Token.generate_key()) for user in created], batch_size=batch_size)
+    return created
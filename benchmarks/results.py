@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import django
+import json
+import numpy as np
+import platform
+import subprocess
+import time
+
+
+def measure(func, iterations, setup=None, warmup=1):
+    """
+    Вызывает func iterations раз и возвращает сводку по задержке.
+    setup (если задан) вызывается перед каждым вызовом и в замер не входит;
+    первые warmup вызовов (прогрев соединений и кешей) не замеряются.
+    """
+    for number in range(warmup):
+        if setup is not None:
+            setup(number)
+        func(number)
+    latencies = []
+    for number in range(iterations):
+        if setup is not None:
+            setup(number)
+        start = time.perf_counter()
+        func(number)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def summarize(latencies, items=None):
+    """
+    p50/p99/среднее в миллисекундах и пропускная способность (операций
+    в секунду чистого времени). items — число обработанных элементов
+    (например, сообщений), если оно отличается от числа замеров.
+    """
+    values = np.array(latencies) * 1000
+    total = values.sum() / 1000
+    summary = {
+        'iterations': len(latencies),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'max_ms': round(float(values.max()), 3),
+        'throughput_per_s': round(len(latencies) / total, 2) if total else None,
+    }
+    if items is not None:
+        summary['items'] = items
+        summary['items_per_s'] = round(items / total, 2) if total else None
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Что нужно знать, чтобы сравнивать прогоны между собой."""
+    return {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+    }
+
+
+def write(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+
+# Для этих показателей рост — это ухудшение; для остальных — падение
+LOWER_IS_BETTER = ('p50_ms', 'p99_ms')
+HIGHER_IS_BETTER = ('throughput_per_s', 'items_per_s')
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Сравнивает сценарии, которые есть в обоих прогонах. Возвращает строки
+    (сценарий, показатель, было, стало, изменение, регрессия): регрессия —
+    ухудшение больше чем на долю tolerance.
+    """
+    rows = []
+    for name, stats in current['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        if old is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if not old.get(metric) or stats.get(metric) is None:
+                continue
+            change = stats[metric] / old[metric] - 1
+            worse = change if metric in LOWER_IS_BETTER else -change
+            rows.append((name, metric, old[metric], stats[metric], change, worse > tolerance))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'сценарий':<24}{'показатель':<18}{'было':>12}{'стало':>12}{'изменение':>12}"]
+    for name, metric, old, new, change, regression in rows:
+        mark = '  РЕГРЕССИЯ' if regression else ''
+        lines.append(f'{name:<24}{metric:<18}{old:>12}{new:>12}{change:>+12.1%}{mark}')
+    return '\n'.join(lines)
@@ -0,0 +1,138 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from config.celery import app as celery_app
+from habits.models import Habit
+from telegram_app.tasks import send_reminders
+from telegram_app.testing import FakeBotAPIServer
+from users.views import UserLoginView
+from .data import PASSWORD, seed
+from .results import environment, measure, summarize
+import time
+
+
+class ApiBenchmarks:
+    """Сценарии API: запросы идут через весь стек middleware, как в продакшене."""
+
+    def __init__(self, users, iterations):
+        self.iterations = iterations
+        self.users = users
+        self.tokens = dict(Token.objects.filter(user__in=users).values_list('user_id', 'key'))
+        self.client = APIClient()
+
+    def as_user(self, number):
+        user = self.users[number % len(self.users)]
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[user.id]}')
+        return user
+
+    def get(self, url, expected=200):
+        response = self.client.get(url)
+        assert response.status_code == expected, (url, response.status_code)
+
+    def habits_list(self):
+        return measure(lambda number: self.get('/api/habits/'), self.iterations, setup=self.as_user)
+
+    def habits_create(self):
+        def create(number):
+            response = self.client.post('/api/habits/', {
+                'action': 'Бенчмарк', 'time': '08:30', 'place': 'Дом',
+                'duration': 60, 'frequency': 1, 'reward': 'Чай',
+            }, format='json')
+            assert response.status_code == 201, response.status_code
+
+        return measure(create, self.iterations, setup=self.as_user)
+
+    def public_cold(self):
+        # Кеш ленты сбрасывается перед каждым запросом: замеряется чтение из базы
+        def setup(number):
+            self.client.credentials()
+            cache.clear()
+
+        return measure(lambda number: self.get('/api/habits/public/'), self.iterations, setup=setup)
+
+    def public_warm(self):
+        self.client.credentials()
+        return measure(lambda number: self.get('/api/habits/public/'), self.iterations)
+
+    def login(self):
+        def log_in(number):
+            user = self.users[number % len(self.users)]
+            response = self.client.post(
+                '/api/users/login/', {'email': user.email, 'password': PASSWORD}, format='json')
+            assert response.status_code == 200, response.status_code
+
+        self.client.credentials()
+        # Ограничения частоты входа отключены: иначе замеряются отказы 429
+        with patch.object(UserLoginView, 'throttle_classes', []):
+            # Вход упирается в хеширование пароля, поэтому замеров меньше
+            return measure(log_in, max(5, self.iterations // 10))
+
+
+def benchmark_send_reminders(runs):
+    """
+    send_reminders целиком: выборка, группировка по чатам, задачи доставки
+    (Celery в eager-режиме) и отправка в локальный фейковый Bot API.
+    Лимиты Telegram сняты, чтобы замерялся код, а не ожидание RateLimiter.
+    Перед каждым прогоном все привычки снова попадают в окно рассылки.
+    """
+    eager = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    latencies = []
+    messages = 0
+    try:
+        with FakeBotAPIServer() as server, override_settings(
+                TELEGRAM_API_BASE_URL=server.base_url,
+                TELEGRAM_GLOBAL_RATE_LIMIT=1_000_000, TELEGRAM_PER_CHAT_INTERVAL=0):
+            # Первый прогон — прогрев (импорт telegram, соединения), он не замеряется
+            for run in range(runs + 1):
+                Habit.objects.update(next_reminder=timezone.now() + timedelta(minutes=1))
+                sent = len(server.messages)
+                start = time.perf_counter()
+                send_reminders()
+                if run:
+                    latencies.append(time.perf_counter() - start)
+                    messages += len(server.messages) - sent
+    finally:
+        celery_app.conf.task_always_eager = eager
+    return summarize(latencies, items=messages)
+
+
+SCENARIOS = ('habits-list', 'habits-create', 'public-cold', 'public-warm', 'login', 'send-reminders')
+
+
+def run_benchmarks(users=200, habits_per_user=5, iterations=200, reminder_runs=5, seed_value=0,
+                   only=None):
+    """
+    Заполняет текущую базу синтетическими данными и прогоняет сценарии
+    (only — подмножество SCENARIOS). Возвращает результаты для results.write.
+    """
+    start = time.perf_counter()
+    created = seed(users, habits_per_user, seed_value)
+    seed_seconds = time.perf_counter() - start
+
+    api = ApiBenchmarks(created, iterations)
+    scenarios = {
+        'habits-list': api.habits_list,
+        'habits-create': api.habits_create,
+        'public-cold': api.public_cold,
+        'public-warm': api.public_warm,
+        'login': api.login,
+        'send-reminders': lambda: benchmark_send_reminders(reminder_runs),
+    }
+    benchmarks = {}
+    for name in only or SCENARIOS:
+        cache.clear()
+        benchmarks[name] = scenarios[name]()
+    return {
+        'environment': environment(),
+        'parameters': {
+            'users': users, 'habits_per_user': habits_per_user, 'iterations': iterations,
+            'reminder_runs': reminder_runs, 'seed': seed_value,
+        },
+        'seed_seconds': round(seed_seconds, 3),
+        'benchmarks': benchmarks,
+    }
@@ -0,0 +1,45 @@
+from django.db.models import F
+from django.test import TestCase, override_settings
+from habits.models import Habit
+from users.models import CustomUser
+from benchmarks.results import compare, summarize
+from benchmarks.suite import SCENARIOS, run_benchmarks
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkSuiteTest(TestCase):
+    """Сценарии бенчмарков работают на маленьком наборе данных."""
+
+    def test_all_scenarios_run(self):
+        results = run_benchmarks(users=4, habits_per_user=3, iterations=2, reminder_runs=1)
+
+        self.assertEqual(CustomUser.objects.count(), 4)
+        self.assertGreaterEqual(Habit.objects.count(), 12)
+        self.assertEqual(list(results['benchmarks']), list(SCENARIOS))
+        for stats in results['benchmarks'].values():
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertGreater(results['benchmarks']['send-reminders']['items'], 0)
+
+    def test_synthetic_data_is_consistent(self):
+        run_benchmarks(users=10, habits_per_user=10, iterations=1, reminder_runs=1, only=['public-warm'])
+
+        # Те же правила, что в Habit.clean: у приятных нет связи и награды, у полезных — не обе сразу
+        self.assertFalse(Habit.objects.filter(is_pleasant=True).exclude(linked_habit=None, reward=None).exists())
+        self.assertFalse(Habit.objects.exclude(linked_habit=None).exclude(reward=None).exists())
+        self.assertFalse(Habit.objects.exclude(linked_habit=None).exclude(linked_habit__is_pleasant=True).exists())
+        self.assertFalse(Habit.objects.exclude(linked_habit=None).exclude(linked_habit__user=F('user')).exists())
+        self.assertFalse(Habit.objects.filter(next_reminder=None).exists())
+
+
+class BenchmarkCompareTest(TestCase):
+
+    def test_regressions_are_flagged(self):
+        baseline = {'benchmarks': {'list': summarize([0.010] * 10), 'gone': summarize([0.01])}}
+        current = {'benchmarks': {'list': summarize([0.013] * 10), 'new': summarize([0.01])}}
+
+        rows = compare(baseline, current, tolerance=0.1)
+
+        self.assertEqual({row[0] for row in rows}, {'list'})
+        flagged = {row[1]: row[-1] for row in rows}
+        self.assertEqual(flagged, {'p50_ms': True, 'p99_ms': True, 'throughput_per_s': True})
+        self.assertFalse(any(row[-1] for row in compare(baseline, current, tolerance=0.5)))
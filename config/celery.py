@@ -4,8 +4,8 @@ from celery import Celery
 app = Celery('proj', broker='redis://redis:6379/0')
 
 # Настраиваем Celery на использование асинхронного воркера gevent
+# (число greenlet'ов — CELERY_WORKER_CONCURRENCY в настройках Django)
 app.conf.update(
-    worker_concurrency=1,
     task_always_eager=False,  # Обычные задачи через брокер
     worker_pool='gevent',  # Используем gevent для поддержки асинхронности
 )
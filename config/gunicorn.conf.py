@@ -0,0 +1,18 @@
+# Настройки gunicorn: gunicorn -c config/gunicorn.conf.py config.wsgi
+import os
+
+# Пустые значения из .env означают «не задано». prometheus_client включает
+# многопроцессный режим при импорте по одному наличию переменной
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+from prometheus_client import multiprocess  # noqa: E402
+
+bind = '0.0.0.0:8000'
+workers = int(os.environ.get('GUNICORN_WORKERS') or 3)
+
+
+def child_exit(server, worker):
+    # Метрики завершившегося воркера больше не должны учитываться как живые
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
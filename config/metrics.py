@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess)
+from secrets import compare_digest
+import os
+
+# Метрики Prometheus. Если задана (непустая) переменная окружения PROMETHEUS_MULTIPROC_DIR,
+# каждый процесс (WSGI, воркеры Celery) пишет значения в файлы этого каталога,
+# а /metrics суммирует их по всем процессам. Каталог должен быть общим для
+# процессов и очищаться перед их запуском (сервис metrics-init в Docker Compose).
+
+REQUEST_DURATION = Histogram(
+    'habits_http_request_duration_seconds', 'Время обработки HTTP-запроса',
+    ['route', 'method', 'status'])
+REQUEST_DB_QUERIES = Histogram(
+    'habits_http_db_queries', 'Число запросов к базе на HTTP-запрос',
+    ['route'], buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100, float('inf')))
+REQUEST_DB_DURATION = Histogram(
+    'habits_http_db_duration_seconds', 'Время в базе на HTTP-запрос', ['route'])
+
+REMINDER_BATCH_SIZE = Histogram(
+    'habits_reminder_batch_size', 'Число сообщений в пачке deliver_reminder_batch',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf')))
+REMINDER_QUEUE_LAG = Histogram(
+    'habits_reminder_queue_lag_seconds', 'Задержка доставки напоминания после next_reminder',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, float('inf')))
+
+TELEGRAM_SEND_DURATION = Histogram(
+    'habits_telegram_send_duration_seconds', 'Время одного вызова sendMessage')
+TELEGRAM_MESSAGES = Counter(
+    'habits_telegram_messages', 'Сообщения Telegram по результату отправки (sent, failed)',
+    ['outcome'])
+TELEGRAM_RATE_LIMITED = Counter(
+    'habits_telegram_rate_limited', 'Ответы RetryAfter от Telegram')
+
+
+def route_name(request):
+    """Имя маршрута для меток: сырые пути не используются, чтобы не плодить серии."""
+    match = request.resolver_match
+    return match.view_name if match else 'unmatched'
+
+
+def metrics_allowed(request):
+    """
+    Доступ к метрикам: с адресов METRICS_ALLOWED_IPS (внутренняя сеть)
+    или с токеном METRICS_TOKEN в заголовке Authorization: Bearer <token>.
+    """
+    if settings.METRICS_TOKEN and compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
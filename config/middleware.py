@@ -0,0 +1,131 @@
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+from .metrics import REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_DURATION, route_name
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Статистика запросов к базе по каждому HTTP-запросу: аргументы request и stats
+query_stats_recorded = Signal()
+
+# Списки IN (%s, %s, ...) разной длины считаются одним и тем же запросом
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def fingerprint(sql):
+    """Отпечаток SQL: текст запроса без значений параметров."""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """execute_wrapper, который считает запросы, их время и повторы одинакового SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Одинаковые запросы, выполненные больше одного раза (признак N+1)."""
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает запросы к базе, время в базе и повторяющиеся запросы для каждого
+    эндпоинта. В DEBUG отдает их в заголовках X-DB-Queries, X-DB-Time-Ms
+    и X-DB-Duplicate-Queries; в любом режиме отправляет сигнал query_stats_recorded
+    и пишет предупреждение в лог, если эндпоинт превысил бюджет из QUERY_BUDGETS
+    или повторяет один запрос QUERY_DUPLICATE_THRESHOLD раз и больше.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with self.recording(recorder):
+            response = self.get_response(request)
+
+        if response.streaming and not response.is_async:
+            # Тело потокового ответа (выгрузка серверным курсором) читает базу
+            # уже после выхода из view: запросы учитываются, когда поток дочитан
+            # или закрыт. Заголовки к этому моменту отправлены, поэтому X-DB-* нет
+            response.streaming_content = self.record_stream(
+                request, recorder, response.streaming_content)
+            return response
+
+        stats = self.record(request, recorder)
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(stats['queries'])
+            response['X-DB-Time-Ms'] = str(stats['time_ms'])
+            response['X-DB-Duplicate-Queries'] = str(
+                sum(count - 1 for count in stats['duplicates'].values()))
+        return response
+
+    @staticmethod
+    def recording(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def record_stream(self, request, recorder, content):
+        try:
+            with self.recording(recorder):
+                yield from content
+        finally:
+            self.record(request, recorder)
+
+    def record(self, request, recorder):
+        """Сигнал, метрики и предупреждения по итогам запроса. Возвращает статистику."""
+        match = request.resolver_match
+        duplicates = recorder.duplicates
+        stats = {
+            'view': match.view_name if match else request.path,
+            'queries': recorder.count,
+            'time_ms': round(recorder.duration * 1000, 2),
+            'duplicates': duplicates,
+        }
+        query_stats_recorded.send(sender=self.__class__, request=request, stats=stats)
+        route = route_name(request)
+        REQUEST_DB_QUERIES.labels(route).observe(recorder.count)
+        REQUEST_DB_DURATION.labels(route).observe(recorder.duration)
+
+        budget = settings.QUERY_BUDGETS.get(stats['view'])
+        if budget is not None and stats['queries'] > budget:
+            logger.warning(f"{stats['view']} made {stats['queries']} queries, budget is {budget}")
+        repeated = max(duplicates.values(), default=0)
+        if repeated >= settings.QUERY_DUPLICATE_THRESHOLD:
+            sql = max(duplicates, key=duplicates.get)
+            logger.warning(f"{stats['view']} repeated a query {repeated} times (possible N+1): {sql}")
+        return stats
+
+
+class RequestMetricsMiddleware:
+    """Время обработки запросов по маршрутам для /metrics (config.metrics)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        REQUEST_DURATION.labels(route_name(request), request.method, response.status_code).observe(
+            time.perf_counter() - start)
+        return response
@@ -0,0 +1,13 @@
+from functools import lru_cache
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """
+    Синхронный клиент Redis по REDIS_URL, один на процесс: публикация изменений
+    напоминаний, их прием планировщиком, ограничение частоты запросов.
+    """
+    import redis
+
+    return redis.Redis.from_url(settings.REDIS_URL)
@@ -1,4 +1,4 @@
-from decouple import config
+from decouple import Csv, config
 import os
 
 from celery.schedules import crontab
@@ -6,6 +6,12 @@ from celery.schedules import crontab
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Пустое PROMETHEUS_MULTIPROC_DIR из .env — то же, что не заданное: prometheus_client
+# (импортируется позже, вместе с config.metrics) включает многопроцессный режим
+# по одному наличию переменной. Для gunicorn то же делает config/gunicorn.conf.py
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -38,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первыми, чтобы учитывать время и запросы к базе всех остальных middleware
+    'config.middleware.RequestMetricsMiddleware',
+    'config.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # КОРС
@@ -131,30 +140,173 @@ CELERY_BROKER_URL = 'redis://redis:6379/0'  # ваш брокер для Celery
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'  # хранение результатов задач
 
 
+# Точная рассылка напоминаний отдельным процессом-планировщиком (python manage.py runscheduler);
+# при включенном планировщике периодическая send_reminders не запускается
+REMINDER_SCHEDULER_ENABLED = config('REMINDER_SCHEDULER_ENABLED', default=False, cast=bool)
+
 CELERY_BEAT_SCHEDULE = {
        'send-reminders-every-hour': {
            'task': 'telegram_app.tasks.send_reminders',
            'schedule': crontab(minute=0, hour='*/4'),  # Каждые 4 часа
        },
+       'purge-deleted-habits-daily': {
+           'task': 'habits.tasks.purge_deleted_habits',
+           'schedule': crontab(minute=30, hour=3),
+       },
+       'rollup-daily-stats-nightly': {
+           'task': 'habits.tasks.rollup_daily_stats',
+           'schedule': crontab(minute=15, hour=0),
+       },
    }
 
 
+if REMINDER_SCHEDULER_ENABLED:
+    CELERY_BEAT_SCHEDULE.pop('send-reminders-every-hour')
+
 CELERY_TIMEZONE = 'Europe/Paris'
 
+# Окно рассылки напоминаний должно совпадать с периодом запуска send_reminders
+REMINDER_WINDOW_MINUTES = 4 * 60
+# Сколько привычек читается из базы за одну страницу при рассылке
+REMINDER_BATCH_SIZE = 500
+# Сколько сообщений получает одна задача доставки deliver_reminder_batch
+REMINDER_CHUNK_SIZE = 200
+# Лимит времени задачи доставки и сколько из него пачка ждет слотов общего лимита
+# Telegram (при 30 сообщениях/с это ~2700 сообщений на все параллельные пачки);
+# не дождавшиеся слота сообщения отправляются повторной попыткой задачи
+REMINDER_DELIVERY_TIME_LIMIT = 120
+REMINDER_DELIVERY_SEND_BUDGET = 90
+REMINDER_DELIVERY_RETRY_DELAY = 30
+REMINDER_DELIVERY_MAX_RETRIES = 10
+# Планировщик держит в памяти напоминания на столько секунд вперед и раз в этот
+# период перечитывает их из базы; изменения между перечитываниями приходят через Redis
+REMINDER_SCHEDULER_HORIZON_SECONDS = 15 * 60
+REMINDER_SCHEDULER_CHANNEL = 'habits:reminders'
+# Наибольшая пауза перед повтором шага планировщика после ошибки (растет вдвое с каждой)
+REMINDER_SCHEDULER_MAX_BACKOFF_SECONDS = 60
+
+# Загруженные CSV для импорта пользователей ждут задачу import_users_file здесь;
+# каталог должен быть общим для приложения и воркеров Celery
+USER_IMPORT_DIR = config('USER_IMPORT_DIR', default='') or os.path.join(BASE_DIR, 'imports')
+
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30
+# Greenlet'ов gevent на воркер: пачки доставки ждут сети и лимита Telegram параллельно
+CELERY_WORKER_CONCURRENCY = int(config('CELERY_WORKER_CONCURRENCY', default='') or 8)
 
 TELEGRAM_BOT_TOKEN = config('TELEGRAM_BOT_TOKEN')
+TELEGRAM_API_BASE_URL = config('TELEGRAM_API_BASE_URL', default='https://api.telegram.org/bot')
+
+# Пакетная отправка сообщений в Telegram
+TELEGRAM_SEND_CONCURRENCY = 20  # одновременных запросов к Bot API
+TELEGRAM_GLOBAL_RATE_LIMIT = 30  # сообщений в секунду на бота (лимит Telegram)
+TELEGRAM_PER_CHAT_INTERVAL = 1.0  # секунд между сообщениями в один чат
+TELEGRAM_MAX_RETRIES = 3  # повторов после RetryAfter
+TELEGRAM_RATE_LIMIT_KEY = 'telegram:rate'  # ключ общего лимита отправки в Redis
+
+# Кеш соответствия Telegram username -> пользователь для команды /start
+TELEGRAM_USERNAME_CACHE_TTL = 60 * 60
+TELEGRAM_USERNAME_NOT_FOUND_CACHE_TTL = 30
+
+# Бот запускается отдельным процессом: python manage.py runbot [--webhook]
+TELEGRAM_WEBHOOK_URL = config('TELEGRAM_WEBHOOK_URL', default='')  # публичный URL вебхука
+TELEGRAM_WEBHOOK_SECRET = config('TELEGRAM_WEBHOOK_SECRET', default='')  # X-Telegram-Bot-Api-Secret-Token
+TELEGRAM_WEBHOOK_HOST = config('TELEGRAM_WEBHOOK_HOST', default='0.0.0.0')
+TELEGRAM_WEBHOOK_PORT = config('TELEGRAM_WEBHOOK_PORT', default=8443, cast=int)
+
+
+# Доступ к /metrics: адреса внутренней сети и/или токен (Authorization: Bearer <token>).
+# Пустой список из .env означает «не задано», а не «закрыть всем»
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='', cast=Csv()) or ['127.0.0.1', '::1']
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+REDIS_URL = config('REDIS_URL', default='')
+
+# Кеш в Redis; без REDIS_URL (локальный запуск, тесты) — в памяти процесса
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Лента публичных привычек
+PUBLIC_HABITS_PAGE_SIZE = 20
+PUBLIC_HABITS_CACHE_TIMEOUT = 5 * 60  # секунд
+
+# Максимальный размер страницы при курсорной пагинации списка привычек
+HABITS_MAX_PAGE_SIZE = 100
+
+# Максимальное число привычек в одном запросе массовых операций
+HABITS_BULK_MAX_ITEMS = 500
+
+# Выгрузка привычек (/api/habits/export/, export_habits): строк за одно чтение курсора
+HABITS_EXPORT_CHUNK_SIZE = 2000
+
+# Синхронизация клиентов (/api/habits/changes/)
+HABITS_SYNC_PAGE_SIZE = 500
+HABITS_SYNC_SAFETY_LAG_SECONDS = 2
+# Сколько дней хранятся метки удаленных привычек; более старые токены недействительны
+HABITS_TOMBSTONE_TTL_DAYS = 30
+
+# Статистика выполнения (/api/habits/stats/): период по умолчанию и максимальный, в днях
+HABITS_STATS_DAYS = 365
+HABITS_STATS_MAX_DAYS = 3 * 365
+# Дневные сводки (rollup_daily_stats): сколько дней закрывается в одной транзакции
+HABITS_ROLLUP_DAYS_PER_BATCH = 31
 
 
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 5  # Выводить по 5 привычек на страницу
+    'PAGE_SIZE': 5,  # Выводить по 5 привычек на страницу
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',  # попыток входа с одного IP
+        'login_email': '5/min',  # попыток входа в один аккаунт
+    },
 }
 
+# Сколько перехеширований паролей может ждать фонового потока в одном процессе
+PASSWORD_REHASH_QUEUE_SIZE = 100
+
+# Кеш токенов аутентификации: LRU в памяти процесса перед общим кешем (Redis)
+AUTH_TOKEN_CACHE_TTL = 10 * 60  # секунд в общем кеше
+AUTH_TOKEN_LOCAL_CACHE_TTL = 15  # секунд в памяти процесса
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 1024
+
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Бюджет запросов к базе на один HTTP-запрос по имени эндпоинта (view_name).
+# Превышение пишется в лог, а в тестах (фикстура query_budget) валит тест
+QUERY_BUDGETS = {
+    'habit-list': 3,
+    'habit-detail': 5,
+    'habit-complete': 8,
+    'habit-bulk': 7,
+    'habit-changes': 2,
+    'habit-export': 2,  # с запросами серверного курсора при отдаче потока
+    'habit-stats': 4,
+    'habit-public': 2,
+    'user-registration': 4,
+    'user-login': 5,
+    'user-logout': 3,
+    'user-import': 3,
+}
+# Сколько раз один и тот же SQL может повториться за запрос до предупреждения о N+1
+QUERY_DUPLICATE_THRESHOLD = 5
+
 
 LOGGING = {
     'version': 1,
@@ -174,5 +326,13 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        'config': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'habits': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
     },
 }
@@ -3,6 +3,7 @@ from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from .metrics import metrics_view
 
 
 schema_view = get_schema_view(
@@ -33,4 +34,5 @@ urlpatterns = [
             cache_timeout=0),
         name='schema-redoc'),
     path('api/users/', include('users.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
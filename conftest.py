@@ -0,0 +1,36 @@
+from django.conf import settings
+from config.middleware import query_stats_recorded
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'query_budget(budgets): бюджет запросов к базе {имя эндпоинта: число} поверх QUERY_BUDGETS')
+
+
+@pytest.fixture(autouse=True)
+def query_budget(request):
+    """
+    Валит тест, если какой-либо запрос к API в нем сделал больше запросов
+    к базе, чем объявлено для эндпоинта в QUERY_BUDGETS или в маркере
+    @pytest.mark.query_budget({'habit-list': 2}). Возвращает словарь бюджетов,
+    который тест может дополнить сам.
+    """
+    budgets = dict(settings.QUERY_BUDGETS)
+    marker = request.node.get_closest_marker('query_budget')
+    if marker:
+        budgets.update(*marker.args, **marker.kwargs)
+    exceeded = []
+
+    def check(sender, stats, **kwargs):
+        budget = budgets.get(stats['view'])
+        if budget is not None and stats['queries'] > budget:
+            duplicates = ''.join(f'\n  {count}x {sql}' for sql, count in stats['duplicates'].items())
+            exceeded.append(f"{stats['view']}: {stats['queries']} запросов при бюджете {budget}{duplicates}")
+
+    query_stats_recorded.connect(check)
+    yield budgets
+    query_stats_recorded.disconnect(check)
+    if exceeded:
+        pytest.fail('Превышен бюджет запросов к базе:\n' + '\n'.join(exceeded))
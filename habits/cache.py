@@ -0,0 +1,30 @@
+from hashlib import md5
+from django.core.cache import cache
+
+PUBLIC_HABITS_VERSION_KEY = 'habits:public:version'
+
+
+def public_habits_version():
+    """Текущая версия кеша ленты публичных привычек."""
+    return cache.get_or_set(PUBLIC_HABITS_VERSION_KEY, 1, timeout=None)
+
+
+def public_habits_cache_key(cursor):
+    """
+    Ключ кеша страницы ленты: версия + курсор (проверенный). Остальные
+    параметры запроса на страницу не влияют и в ключ не входят, иначе
+    произвольные параметры плодили бы записи в кеше.
+    """
+    digest = md5((cursor or '').encode()).hexdigest()
+    return f'habits:public:{public_habits_version()}:{digest}'
+
+
+def invalidate_public_habits_cache():
+    """
+    Сбрасывает все закешированные страницы ленты сменой версии:
+    старые ключи просто перестают читаться и истекают по таймауту.
+    """
+    try:
+        cache.incr(PUBLIC_HABITS_VERSION_KEY)
+    except ValueError:
+        cache.set(PUBLIC_HABITS_VERSION_KEY, 1, timeout=None)
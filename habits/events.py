@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import transaction
+from config.redis import get_redis
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def reminder_changes_published():
+    """Публикуются ли изменения напоминаний: включен планировщик и настроен Redis."""
+    return bool(settings.REMINDER_SCHEDULER_ENABLED and settings.REDIS_URL)
+
+
+def encode_change(habit_id, next_reminder):
+    """Сообщение об изменении напоминания; next_reminder=None — напоминания больше нет."""
+    return json.dumps({
+        'id': habit_id,
+        'next_reminder': next_reminder.isoformat() if next_reminder else None,
+    })
+
+
+def publish_reminder_changes(changes):
+    """
+    Сообщает планировщику напоминаний об изменении next_reminder привычек.
+    changes — пары (id привычки, next_reminder или None). Публикуется после
+    коммита транзакции; без планировщика или Redis ничего не делает.
+    Потерянные сообщения не страшны: планировщик перечитывает горизонт из базы.
+    """
+    if not reminder_changes_published():
+        return
+    messages = [encode_change(habit_id, next_reminder) for habit_id, next_reminder in changes]
+    if not messages:
+        return
+
+    def publish():
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            for message in messages:
+                pipeline.publish(settings.REMINDER_SCHEDULER_CHANNEL, message)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to publish reminder changes: {str(e)}")
+
+    transaction.on_commit(publish)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+import csv
+import json
+
+# Поля выгрузки привычек (связанная привычка — по id)
+HABIT_EXPORT_FIELDS = (
+    'id', 'user_id', 'action', 'time', 'place', 'is_pleasant', 'linked_habit_id', 'frequency',
+    'reward', 'duration', 'is_public', 'next_reminder', 'created_at', 'updated_at',
+    'current_streak', 'longest_streak', 'completion_count', 'first_completed_on', 'last_completed_on',
+)
+
+
+def export_rows(queryset, fields=HABIT_EXPORT_FIELDS, chunk_size=None):
+    """
+    Строки выгрузки (словари) в порядке id. На PostgreSQL iterator() читает
+    их серверным курсором пачками по chunk_size, так что в памяти
+    одновременно не больше одной пачки.
+    """
+    chunk_size = chunk_size or settings.HABITS_EXPORT_CHUNK_SIZE
+    return queryset.order_by('id').values(*fields).iterator(chunk_size=chunk_size)
+
+
+class _Line:
+    """Файлоподобный объект для csv.writer: write возвращает строку, а не пишет ее."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields=HABIT_EXPORT_FIELDS):
+    """Строки CSV с заголовком; None выгружается пустым полем."""
+    writer = csv.writer(_Line())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def ndjson_lines(rows):
+    """По одному JSON-объекту на строку (даты в ISO 8601)."""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+# Формат выгрузки: (генератор строк, Content-Type)
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from habits.cache import invalidate_public_habits_cache
+from habits.models import Habit, LocalDate
+from habits.schedule import next_occurrences
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает next_reminder всех привычек по времени выполнения '
+        'в часовом поясе пользователя (пачками по --batch-size)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', type=int, default=None,
+                            help='Только привычки пользователя с этим id')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        queryset = Habit.objects.order_by('id')
+        if options['user'] is not None:
+            queryset = queryset.filter(user_id=options['user'])
+        queryset = queryset.annotate(
+            user_timezone=F('user__timezone'),
+            anchor_day=LocalDate(F('next_reminder'), F('user__timezone')))
+
+        updated = 0
+        last_id = 0
+        while True:
+            # Пагинация по id: каждая пачка читается по первичному ключу
+            batch = list(queryset.filter(id__gt=last_id).only(
+                'id', 'time', 'frequency', 'next_reminder', 'is_public')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            reminders = next_occurrences(
+                [habit.time for habit in batch],
+                [habit.frequency for habit in batch],
+                [habit.user_timezone for habit in batch],
+                [habit.anchor_day for habit in batch],
+                now)
+            changed = []
+            for habit, reminder in zip(batch, reminders):
+                if habit.next_reminder != reminder:
+                    habit.next_reminder = reminder
+                    habit.updated_at = now
+                    changed.append(habit)
+            with transaction.atomic():
+                Habit.objects.bulk_update(changed, ['next_reminder', 'updated_at'])
+            updated += len(changed)
+
+        if updated:
+            invalidate_public_habits_cache()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено напоминаний: {updated}'))
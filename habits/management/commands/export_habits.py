@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from habits.export import EXPORT_FORMATS, export_rows
+from habits.models import Habit
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузка привычек в CSV или NDJSON потоком (серверный курсор, '
+        'память не зависит от числа привычек)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', default=None, help='Файл (по умолчанию stdout)')
+        parser.add_argument('--user', type=int, default=None, help='Только привычки пользователя с этим id')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Строк за одно чтение курсора (по умолчанию HABITS_EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        queryset = Habit.objects.all()
+        if options['user'] is not None:
+            queryset = queryset.filter(user_id=options['user'])
+        lines, _content_type = EXPORT_FORMATS[options['output_format']]
+        lines = lines(export_rows(queryset, chunk_size=options['chunk_size']))
+
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        try:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        except OSError as e:
+            raise CommandError(f"Не удалось записать {options['output']}: {e}")
+        self.stderr.write(self.style.SUCCESS(f"Выгрузка записана в {options['output']}"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from habits.seeding import seed
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетических пользователей и привычки для нагрузочных тестов '
+        'и стендов (загрузка через PostgreSQL COPY пачками по --batch-size пользователей)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, required=True)
+        parser.add_argument('--habits-per-user', type=float, default=5,
+                            help='Среднее число привычек на пользователя')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Пользователей в пачке')
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для повторяемых данных')
+        parser.add_argument('--password', default='password123', help='Пароль всех пользователей')
+        parser.add_argument('--email-domain', default='seed.example.com')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+
+        def progress(users, habits):
+            self.stdout.write(f'{users} пользователей, {habits} привычек ({time.monotonic() - start:.1f} с)')
+
+        users, habits = seed(
+            options['users'], options['habits_per_user'], options['batch_size'], options['seed'],
+            options['password'], options['email_domain'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {users}, привычек: {habits} за {time.monotonic() - start:.1f} с'))
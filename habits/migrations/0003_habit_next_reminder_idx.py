@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0002_alter_habit_duration_alter_habit_frequency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['next_reminder', 'id'], name='habit_next_reminder_idx'),
+        ),
+    ]
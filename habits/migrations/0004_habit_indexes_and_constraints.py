@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Greatest, Least
+
+
+def clamp_invalid_habits(apps, schema_editor):
+    """Приводит старые строки в допустимые границы перед добавлением ограничений."""
+    Habit = apps.get_model('habits', 'Habit')
+    Habit.objects.filter(duration__gt=120).update(duration=120)
+    Habit.objects.exclude(frequency__range=(1, 7)).update(
+        frequency=Least(Greatest('frequency', 1), 7))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0003_habit_next_reminder_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='habit',
+            name='habit_next_reminder_idx',
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['user', 'next_reminder', 'id'], name='habit_user_next_reminder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['next_reminder', 'id'], name='habit_public_next_reminder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('next_reminder__isnull', False)), fields=['next_reminder', 'id'], name='habit_due_reminder_idx'),
+        ),
+        migrations.RunPython(clamp_invalid_habits, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='habit',
+            constraint=models.CheckConstraint(condition=models.Q(('duration__lte', 120)), name='habit_duration_lte_120'),
+        ),
+        migrations.AddConstraint(
+            model_name='habit',
+            constraint=models.CheckConstraint(condition=models.Q(('frequency__gte', 1), ('frequency__lte', 7)), name='habit_frequency_between_1_and_7'),
+        ),
+    ]
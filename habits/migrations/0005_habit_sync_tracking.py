@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0004_habit_indexes_and_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='habit',
+            name='habit_public_next_reminder_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='habit',
+            name='habit_due_reminder_idx',
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Дата и время удаления (метка для синхронизации)', null=True),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Дата и время последнего изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('is_public', True)), fields=['next_reminder', 'id'], name='habit_public_next_reminder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('next_reminder__isnull', False)), fields=['next_reminder', 'id'], name='habit_due_reminder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='habit_user_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_habit_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='completion_count',
+            field=models.PositiveIntegerField(default=0, help_text='Сколько раз привычка выполнена'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='current_streak',
+            field=models.PositiveIntegerField(default=0, help_text='Текущая серия выполнений подряд'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='first_completed_on',
+            field=models.DateField(blank=True, help_text='Дата первого выполнения', null=True),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='last_completed_on',
+            field=models.DateField(blank=True, help_text='Дата последнего выполнения', null=True),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0, help_text='Самая длинная серия выполнений'),
+        ),
+        migrations.CreateModel(
+            name='HabitCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='День выполнения')),
+                ('completed_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Когда отмечено выполнение')),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='habits.habit')),
+            ],
+            options={
+                'verbose_name': 'Выполнение привычки',
+                'verbose_name_plural': 'Выполнения привычек',
+                'ordering': ['habit', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('habit', 'date'), name='habit_completion_habit_date_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0006_habit_completion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('closed_through', models.DateField(help_text='Последний полностью посчитанный день')),
+                ('completions_through', models.DateTimeField(blank=True, help_text='Отметки до этого времени учтены', null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, help_text='Дата и время создания'),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='PlaceDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('due_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Дневная статистика публичных привычек',
+                'verbose_name_plural': 'Дневная статистика публичных привычек',
+                'ordering': ['date', 'place'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'place'), name='place_daily_stats_date_place_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('due_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Дневная статистика пользователя',
+                'verbose_name_plural': 'Дневная статистика пользователей',
+                'ordering': ['user', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='user_daily_stats_user_date_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_monthly_stats(apps, schema_editor):
+    """Заполняет месячные маски по уже накопленному журналу выполнения."""
+    HabitCompletion = apps.get_model('habits', 'HabitCompletion')
+    HabitMonthlyStats = apps.get_model('habits', 'HabitMonthlyStats')
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(HabitMonthlyStats._meta.db_table)} (habit_id, month, completed_days) "
+        f"SELECT habit_id, date_trunc('month', date)::date, bit_or(1 << (extract(day FROM date)::int - 1)) "
+        f"FROM {quote(HabitCompletion._meta.db_table)} GROUP BY 1, 2")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0007_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabitMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Первое число месяца')),
+                ('completed_days', models.PositiveIntegerField(help_text='Битовая маска дней с отметками')),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='habits.habit')),
+            ],
+            options={
+                'verbose_name': 'Месячная статистика привычки',
+                'verbose_name_plural': 'Месячная статистика привычек',
+                'ordering': ['habit', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('habit', 'month'), name='habit_monthly_stats_habit_month_unique')],
+            },
+        ),
+        migrations.RunPython(fill_monthly_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0008_habit_monthly_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('next_reminder__isnull', False)), fields=['next_reminder', 'user', 'id'], name='habit_due_reminder_user_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='habit',
+            name='habit_due_reminder_idx',
+        ),
+    ]
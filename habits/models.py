@@ -1,9 +1,188 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    DateTimeField, DurationField, ExpressionWrapper, F, FloatField, Func, OuterRef, Subquery, Value)
+from django.db.models.functions import Ceil
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
+from zoneinfo import ZoneInfo
 from .validators import validate_duration, validate_frequency  # Импортируем валидаторы
+from .cache import invalidate_public_habits_cache
+from .events import publish_reminder_changes, reminder_changes_published
+from .schedule import next_occurrences
+
+
+class EpochSeconds(Func):
+    """Длительность интервала в секундах (EXTRACT(EPOCH FROM ...) в PostgreSQL)."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+
+class LocalDate(Func):
+    """Местная дата момента времени в часовом поясе tz: (timestamp AT TIME ZONE tz)::date."""
+    template = '(%(expressions)s)::date'
+    arg_joiner = ' AT TIME ZONE '
+    output_field = models.DateField()
+
+
+def frequency_interval():
+    """SQL-выражение frequency * interval '1 day'."""
+    return ExpressionWrapper(F('frequency') * timedelta(days=1), output_field=DurationField())
+
+
+class ShiftInTimeZone(Func):
+    """
+    Сдвиг момента времени на интервал в местном времени часового пояса:
+    ((timestamp AT TIME ZONE tz) + interval) AT TIME ZONE tz.
+    Сдвиг на сутки сохраняет местное время напоминания при переходе на летнее время.
+    """
+    output_field = DateTimeField()
+
+    def __init__(self, timestamp, interval, tz):
+        super().__init__(timestamp, interval, tz)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (timestamp, timestamp_params), (interval, interval_params), (tz, tz_params) = (
+            compiler.compile(expression) for expression in self.source_expressions)
+        sql = f'((({timestamp}) AT TIME ZONE ({tz})) + ({interval})) AT TIME ZONE ({tz})'
+        return sql, [*timestamp_params, *tz_params, *interval_params, *tz_params]
+
+
+class HabitQuerySet(models.QuerySet):
+    def user_timezone(self):
+        """Часовой пояс владельца привычки (подзапрос, годится и для UPDATE)."""
+        user_model = self.model._meta.get_field('user').related_model
+        return Subquery(user_model.objects.filter(pk=OuterRef('user_id')).values('timezone')[:1])
+
+    def due(self, window_start, window_end):
+        """
+        Привычки, напоминание по которым попадает в окно [window_start, window_end)
+        и пользователь которых привязал Telegram.
+        """
+        return self.filter(
+            next_reminder__gte=window_start,
+            next_reminder__lt=window_end,
+            user__telegram_chat_id__isnull=False,
+        )
+
+    def iter_due(self, window_start, window_end, chunk_size):
+        """
+        Постранично отдает пары (id, next_reminder) привычек из окна напоминаний
+        в порядке владельцев. Пагинация по ключу (user_id, id) вместо OFFSET;
+        страница не разрывает привычки одного пользователя (последний
+        пользователь страницы дочитывается целиком), чтобы все они ушли
+        одним сообщением. Окно читается из индекса habit_due_reminder_user_idx
+        без обращения к таблице привычек.
+        """
+        queryset = self.due(window_start, window_end).order_by('user_id', 'id')
+        last_user_id = None
+        while True:
+            page = queryset
+            if last_user_id is not None:
+                page = page.filter(user_id__gt=last_user_id)
+            page = list(page.values_list('id', 'user_id', 'next_reminder')[:chunk_size])
+            if not page:
+                return
+            last_id, last_user_id, _ = page[-1]
+            full = len(page) == chunk_size
+            if full:
+                page += queryset.filter(user_id=last_user_id, id__gt=last_id).values_list(
+                    'id', 'user_id', 'next_reminder')
+            yield [(habit_id, next_reminder) for habit_id, _, next_reminder in page]
+            if not full:
+                return
+
+    def advance_reminders(self):
+        """
+        Сдвигает next_reminder на frequency дней в часовом поясе пользователя
+        одним UPDATE для всех привычек выборки. Кеш ленты сбрасывается, только
+        если среди них есть публичные. Возвращает число обновленных строк.
+        """
+        ids = self.published_reminder_ids()
+        updated = self.update(
+            next_reminder=ShiftInTimeZone(F('next_reminder'), frequency_interval(), self.user_timezone()),
+            updated_at=timezone.now())
+        if updated and self.filter(is_public=True).exists():
+            invalidate_public_habits_cache()
+        self.publish_reminders(ids)
+        return updated
+
+    def reschedule_missed(self, now):
+        """
+        Переносит просроченные напоминания на ближайший цикл не раньше now,
+        сколько бы циклов ни было пропущено. Выполняется одним UPDATE.
+        """
+        lag = ExpressionWrapper(Value(now) - F('next_reminder'), output_field=DurationField())
+        missed_cycles = Ceil(EpochSeconds(lag) / (F('frequency') * 86400.0))
+        shift = ExpressionWrapper(missed_cycles * frequency_interval(), output_field=DurationField())
+        missed = self.filter(next_reminder__lt=now)
+        # После UPDATE строки уже не попадают в выборку, поэтому проверяем заранее
+        public = missed.filter(is_public=True).exists()
+        ids = missed.published_reminder_ids()
+        updated = missed.update(
+            next_reminder=ShiftInTimeZone(F('next_reminder'), shift, self.user_timezone()),
+            updated_at=timezone.now())
+        if updated and public:
+            invalidate_public_habits_cache()
+        self.publish_reminders(ids)
+        return updated
+
+    def published_reminder_ids(self):
+        """
+        id привычек выборки, о новых напоминаниях которых надо сообщить
+        планировщику после массового UPDATE (пусто, если он выключен).
+        """
+        if not reminder_changes_published():
+            return []
+        return list(self.values_list('id', flat=True))
+
+    def publish_reminders(self, ids):
+        """Сообщает планировщику новые next_reminder привычек ids после массового UPDATE."""
+        if ids:
+            publish_reminder_changes(
+                self.model.objects.filter(id__in=ids).values_list('id', 'next_reminder'))
+
+    def reschedule(self, now=None):
+        """
+        Пересчитывает next_reminder привычек выборки по их времени, периодичности
+        и текущему часовому поясу владельца (после смены пояса), сохраняя фазу
+        цикла. Возвращает число привычек с изменившимся напоминанием.
+        """
+        now = now or timezone.now()
+        habits = list(self.select_related('user'))
+        changed = []
+        for habit, reminder in zip(habits, Habit.upcoming_reminders(habits, now)):
+            if habit.next_reminder != reminder:
+                habit.next_reminder = reminder
+                habit.updated_at = now
+                changed.append(habit)
+        Habit.objects.bulk_update(changed, ['next_reminder', 'updated_at'])
+        if any(habit.is_public for habit in changed):
+            invalidate_public_habits_cache()
+        publish_reminder_changes((habit.id, habit.next_reminder) for habit in changed)
+        return len(changed)
+
+    def soft_delete(self):
+        """
+        Помечает привычки удаленными вместо удаления строк, чтобы клиенты
+        синхронизации узнали об удалении. Ссылки на них обнуляются, как при SET_NULL.
+        """
+        now = timezone.now()
+        ids = list(self.values_list('id', flat=True))
+        Habit.all_objects.filter(linked_habit_id__in=ids).update(linked_habit=None, updated_at=now)
+        updated = Habit.all_objects.filter(id__in=ids).update(deleted_at=now, updated_at=now)
+        if updated:
+            invalidate_public_habits_cache()
+        publish_reminder_changes((habit_id, None) for habit_id in ids)
+        return updated
+
+
+class HabitManager(models.Manager.from_queryset(HabitQuerySet)):
+    """Менеджер по умолчанию: только неудаленные привычки."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Habit(models.Model):
@@ -41,9 +220,64 @@ class Habit(models.Model):
         default=False, help_text="Привычка публичная?")
     next_reminder = models.DateTimeField(
         null=True, blank=True, help_text="Дата и время следующего напоминания")
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="Дата и время создания")
+    updated_at = models.DateTimeField(
+        auto_now=True, help_text="Дата и время последнего изменения")
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, help_text="Дата и время удаления (метка для синхронизации)")
+    # Счетчики выполнения обновляются вместе с записью HabitCompletion,
+    # чтобы серия и процент выполнения читались без обхода истории
+    current_streak = models.PositiveIntegerField(
+        default=0, help_text="Текущая серия выполнений подряд")
+    longest_streak = models.PositiveIntegerField(
+        default=0, help_text="Самая длинная серия выполнений")
+    completion_count = models.PositiveIntegerField(
+        default=0, help_text="Сколько раз привычка выполнена")
+    first_completed_on = models.DateField(
+        null=True, blank=True, help_text="Дата первого выполнения")
+    last_completed_on = models.DateField(
+        null=True, blank=True, help_text="Дата последнего выполнения")
+
+    objects = HabitManager()
+    all_objects = HabitQuerySet.as_manager()  # включая удаленные
+
+    # Была ли привычка публичной в базе (нужно для сброса кеша ленты)
+    was_public = False
 
     class Meta:
         ordering = ['next_reminder']
+        indexes = [
+            # Список привычек пользователя, отсортированный по next_reminder
+            models.Index(
+                fields=['user', 'next_reminder', 'id'],
+                name='habit_user_next_reminder_idx'),
+            # Лента публичных привычек
+            models.Index(
+                fields=['next_reminder', 'id'],
+                condition=models.Q(is_public=True, deleted_at__isnull=True),
+                name='habit_public_next_reminder_idx'),
+            # Выборка привычек для рассылки напоминаний по окну времени (iter_due):
+            # диапазон next_reminder читается только из индекса вместе с user_id и id,
+            # по которым страницы сортируются и разбиваются
+            models.Index(
+                fields=['next_reminder', 'user', 'id'],
+                condition=models.Q(next_reminder__isnull=False, deleted_at__isnull=True),
+                name='habit_due_reminder_user_idx'),
+            # Лента изменений для синхронизации клиентов
+            models.Index(
+                fields=['user', 'updated_at', 'id'],
+                name='habit_user_updated_at_idx'),
+        ]
+        constraints = [
+            # Те же ограничения, что и в validate_duration / validate_frequency
+            models.CheckConstraint(
+                condition=models.Q(duration__lte=120),
+                name='habit_duration_lte_120'),
+            models.CheckConstraint(
+                condition=models.Q(frequency__gte=1, frequency__lte=7),
+                name='habit_frequency_between_1_and_7'),
+        ]
         verbose_name = 'Привычка'
         verbose_name_plural = 'Привычки'
 
@@ -73,21 +307,256 @@ class Habit(models.Model):
 
     def calculate_next_reminder(self):
         """
-        Вычисляет и устанавливает дату следующего напоминания
-        на основе текущей даты и времени выполнения привычки.
+        Вычисляет и устанавливает дату следующего напоминания: следующий цикл
+        после текущего напоминания во времени выполнения привычки
+        в часовом поясе пользователя.
         """
-        now = timezone.now()
-        next_reminder_date = now + timedelta(days=self.frequency)
-        self.next_reminder = timezone.make_aware(
-            timezone.datetime.combine(next_reminder_date, self.time)
-        )
+        self.next_reminder = self.next_occurrence(after=self.next_reminder or timezone.now())
         self.save()
 
+    def next_occurrence(self, after=None):
+        """Ближайшее после after напоминание по расписанию привычки (см. next_occurrences)."""
+        return self.upcoming_reminders([self], after)[0]
+
+    @staticmethod
+    def upcoming_reminders(habits, after=None):
+        """
+        Ближайшие после after напоминания для списка привычек одним вызовом
+        next_occurrences. Цикл отсчитывается от местной даты текущего
+        next_reminder, поэтому смена времени или пояса не сдвигает фазу цикла.
+        """
+        time_field = Habit._meta.get_field('time')
+        return next_occurrences(
+            [time_field.to_python(habit.time) for habit in habits],
+            [habit.frequency for habit in habits],
+            [habit.user.timezone for habit in habits],
+            [
+                timezone.localtime(habit.next_reminder, ZoneInfo(habit.user.timezone)).date()
+                if habit.next_reminder else None
+                for habit in habits
+            ],
+            after or timezone.now())
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Если поле не загружено, считаем привычку публичной, чтобы не пропустить сброс кеша
+        instance.was_public = instance.__dict__.get('is_public', True)
+        instance.loaded_schedule = instance.schedule()
+        return instance
+
+    def schedule(self):
+        """Время и периодичность привычки (только загруженные поля)."""
+        return (
+            self._meta.get_field('time').to_python(self.__dict__.get('time')),
+            self.__dict__.get('frequency'))
+
+    def schedule_changed(self):
+        """Изменились ли время или периодичность с загрузки из базы."""
+        loaded = getattr(self, 'loaded_schedule', None)
+        return loaded is not None and loaded != self.schedule()
+
+    @staticmethod
+    def initial_next_reminders(habits):
+        """
+        Первые напоминания для новых привычек (одним вызовом для всего списка):
+        ближайшее время выполнения в часовом поясе пользователя.
+        """
+        time_field = Habit._meta.get_field('time')
+        return next_occurrences(
+            [time_field.to_python(habit.time) for habit in habits],
+            [habit.frequency for habit in habits],
+            [habit.user.timezone for habit in habits],
+            [None] * len(habits),
+            timezone.now())
+
+    def soft_delete(self):
+        """Помечает привычку удаленной (см. HabitQuerySet.soft_delete)."""
+        Habit.all_objects.filter(id=self.id).soft_delete()
+        self.deleted_at = timezone.now()
+
+    def local_today(self):
+        """Сегодняшняя дата в часовом поясе владельца привычки."""
+        return timezone.localdate(timezone=ZoneInfo(self.user.timezone))
+
+    def active_streak(self, today=None):
+        """
+        Текущая серия на дату today (по умолчанию сегодня у владельца): если
+        с последнего выполнения прошло больше frequency дней, серия прервана.
+        """
+        today = today or self.local_today()
+        if self.last_completed_on is None or (today - self.last_completed_on).days > self.frequency:
+            return 0
+        return self.current_streak
+
+    def completion_rate(self, today=None):
+        """Доля выполненных циклов с первого выполнения (от 0 до 1)."""
+        today = today or self.local_today()
+        if self.first_completed_on is None:
+            return 0.0
+        expected = (today - self.first_completed_on).days // self.frequency + 1
+        return round(min(1.0, self.completion_count / expected), 3)
+
+    def apply_completion(self, day):
+        """Обновляет счетчики выполнения новой отметкой за day (не раньше последней)."""
+        if self.last_completed_on is None:
+            self.current_streak = 1
+            self.first_completed_on = day
+        elif (day - self.last_completed_on).days <= self.frequency:
+            self.current_streak += 1
+        else:
+            self.current_streak = 1
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+        self.completion_count += 1
+        self.last_completed_on = day
+
+    def mark_done(self, day=None):
+        """
+        Отмечает выполнение привычки за день day (по умолчанию сегодня
+        в часовом поясе владельца).
+        Запись в журнале и счетчики на привычке меняются в одной транзакции
+        под блокировкой строки привычки. Повторная отметка за тот же день
+        ничего не меняет. Возвращает (отметка, создана ли она).
+        """
+        day = day or self.local_today()
+        with transaction.atomic():
+            habit = Habit.objects.select_for_update().get(pk=self.pk)
+            completion = HabitCompletion.objects.filter(habit=habit, date=day).first()
+            if completion is not None:
+                created = False
+            else:
+                if habit.last_completed_on and day < habit.last_completed_on:
+                    raise ValidationError(
+                        'Нельзя отметить выполнение раньше последней отметки.')
+                completion = HabitCompletion.objects.create(habit=habit, date=day)
+                created = True
+                habit.apply_completion(day)
+                habit.save(update_fields=[*COMPLETION_FIELDS, 'updated_at'])
+        for field in COMPLETION_FIELDS:
+            setattr(self, field, getattr(habit, field))
+        return completion, created
+
     def save(self, *args, **kwargs):
-        """Логика для расчета первого напоминания"""
+        """
+        Первое напоминание считается при создании; после смены времени или
+        периодичности напоминание пересчитывается, иначе оно осталось бы старым.
+        """
+        update_fields = kwargs.get('update_fields')
         if not self.next_reminder:
-            self.next_reminder = timezone.now() + timezone.timedelta(days=self.frequency)
+            self.next_reminder = self.initial_next_reminders([self])[0]
+        elif self.schedule_changed() and (
+                update_fields is None or {'time', 'frequency'} & set(update_fields)):
+            self.next_reminder = self.next_occurrence()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'next_reminder'}
         super().save(*args, **kwargs)
+        self.was_public = self.is_public
+        self.loaded_schedule = self.schedule()
 
     def __str__(self):
         return f'{self.action} ({self.user})'
+
+
+# Поля Habit, которые меняются при отметке выполнения
+COMPLETION_FIELDS = [
+    'current_streak', 'longest_streak', 'completion_count',
+    'first_completed_on', 'last_completed_on',
+]
+
+
+class HabitCompletion(models.Model):
+    """Отметка о выполнении привычки: не больше одной на привычку в день."""
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name='completions')
+    date = models.DateField(help_text="День выполнения")
+    completed_at = models.DateTimeField(
+        default=timezone.now, help_text="Когда отмечено выполнение")
+
+    class Meta:
+        ordering = ['habit', 'date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['habit', 'date'],
+                name='habit_completion_habit_date_unique'),
+        ]
+        verbose_name = 'Выполнение привычки'
+        verbose_name_plural = 'Выполнения привычек'
+
+    def __str__(self):
+        return f'{self.habit_id} — {self.date}'
+
+
+class UserDailyStats(models.Model):
+    """
+    Дневная сводка по пользователю: сколько привычек было запланировано
+    и сколько выполнено. Заполняется ночной задачей rollup_daily_stats.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_stats')
+    date = models.DateField()
+    due_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['user', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='user_daily_stats_user_date_unique'),
+        ]
+        verbose_name = 'Дневная статистика пользователя'
+        verbose_name_plural = 'Дневная статистика пользователей'
+
+
+class PlaceDailyStats(models.Model):
+    """Дневная сводка по публичным привычкам в разрезе места выполнения."""
+    place = models.CharField(max_length=255)
+    date = models.DateField()
+    due_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'place']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'place'], name='place_daily_stats_date_place_unique'),
+        ]
+        verbose_name = 'Дневная статистика публичных привычек'
+        verbose_name_plural = 'Дневная статистика публичных привычек'
+
+
+class HabitMonthlyStats(models.Model):
+    """
+    Дни выполнения привычки за месяц одной битовой маской (бит 0 — 1-е число).
+    Заполняется ночной задачей rollup_daily_stats; по этим строкам считается
+    статистика привычек вместо чтения журнала выполнения по дню на строку.
+    """
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name='monthly_stats')
+    month = models.DateField(help_text="Первое число месяца")
+    completed_days = models.PositiveIntegerField(help_text="Битовая маска дней с отметками")
+
+    class Meta:
+        ordering = ['habit', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['habit', 'month'], name='habit_monthly_stats_habit_month_unique'),
+        ]
+        verbose_name = 'Месячная статистика привычки'
+        verbose_name_plural = 'Месячная статистика привычек'
+
+
+class RollupWatermark(models.Model):
+    """
+    Докуда обработаны данные для дневных сводок: последний закрытый день
+    и время, до которого учтены отметки выполнения.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    closed_through = models.DateField(help_text="Последний полностью посчитанный день")
+    completions_through = models.DateTimeField(
+        null=True, blank=True, help_text="Отметки до этого времени учтены")
+
+    def __str__(self):
+        return f'{self.name}: {self.closed_through}'
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PublicHabitCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация ленты публичных привычек.
+    Порядок (next_reminder, id) совпадает с частичным индексом
+    habit_public_next_reminder_idx, поэтому каждая страница читается по индексу.
+    """
+    ordering = ('next_reminder', 'id')
+    page_size = settings.PUBLIC_HABITS_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset, request, view)
+        # Ссылки на страницы — без посторонних параметров: страницы кешируются по курсору
+        self.base_url = request.build_absolute_uri(request.path)
+        return page
+
+
+class HabitCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация списка привычек пользователя без COUNT(*) и OFFSET.
+    Включается параметром ?pagination=cursor; размер страницы задается
+    через ?page_size= не больше HABITS_MAX_PAGE_SIZE.
+    """
+    ordering = ('next_reminder', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.HABITS_MAX_PAGE_SIZE
+
+    @staticmethod
+    def is_requested(request):
+        params = request.query_params
+        return params.get('pagination') == 'cursor' or CursorPagination.cursor_query_param in params
@@ -0,0 +1,209 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from users.models import CustomUser
+from .models import (
+    Habit, HabitCompletion, HabitMonthlyStats, PlaceDailyStats, RollupWatermark, UserDailyStats)
+
+WATERMARK_NAME = 'daily'
+
+
+# Привычка запланирована на день (местная дата владельца), если она уже создана
+# и еще не удалена, а день отстоит от дня следующего напоминания на кратное
+# frequency число дней. Итоги по пользователям и по местам публичных привычек
+# считаются одним проходом по привычкам и сразу пишутся в сводки.
+INSERT_DUE_COUNTS_SQL = """
+WITH due AS (
+    SELECT h.user_id, h.place, d.day::date AS day, COUNT(*) AS due,
+           COUNT(*) FILTER (WHERE h.is_public) AS public_due, GROUPING(h.user_id) AS by_place
+    FROM {habit} h
+    JOIN {user} u ON u.id = h.user_id
+    CROSS JOIN LATERAL (
+        SELECT (h.created_at AT TIME ZONE u.timezone)::date AS created_day,
+               (h.deleted_at AT TIME ZONE u.timezone)::date AS deleted_day,
+               (h.next_reminder AT TIME ZONE u.timezone)::date AS reminder_day
+    ) local
+    JOIN generate_series(%(first)s::date, %(last)s::date, interval '1 day') AS d(day)
+      ON d.day::date >= local.created_day
+     AND (local.deleted_day IS NULL OR d.day::date < local.deleted_day)
+     AND (d.day::date - local.reminder_day) %% h.frequency = 0
+    WHERE h.next_reminder IS NOT NULL
+      AND h.created_at < %(created_before)s
+      AND (h.deleted_at IS NULL OR h.deleted_at >= %(deleted_after)s)
+    GROUP BY GROUPING SETS ((h.user_id, d.day), (h.place, d.day))
+), by_user AS (
+    INSERT INTO {user_stats} (user_id, date, due_count, completed_count)
+    SELECT user_id, day, due, 0 FROM due WHERE by_place = 0
+)
+INSERT INTO {place_stats} (place, date, due_count, completed_count)
+SELECT place, day, public_due, 0 FROM due WHERE by_place = 1 AND public_due > 0
+"""
+
+
+# Дни выполнения каждой привычки за месяц собираются в битовую маску
+INSERT_HABIT_MONTHS_SQL = """
+INSERT INTO {habit_stats} (habit_id, month, completed_days)
+SELECT habit_id, date_trunc('month', date)::date AS month,
+       bit_or(1 << (extract(day FROM date)::int - 1))
+FROM {completion}
+WHERE date >= %(first)s AND date < %(after_last)s
+  AND date_trunc('month', date)::date = ANY(%(months)s)
+GROUP BY habit_id, month
+"""
+
+
+def insert_due_counts(days):
+    """
+    Записывает в сводки число запланированных привычек за дни days
+    (строк за эти дни в сводках еще нет). Считается в базе: в память
+    не загружаются ни привычки, ни итоги.
+    """
+    quote = connection.ops.quote_name
+    sql = INSERT_DUE_COUNTS_SQL.format(
+        habit=quote(Habit._meta.db_table), user=quote(CustomUser._meta.db_table),
+        user_stats=quote(UserDailyStats._meta.db_table), place_stats=quote(PlaceDailyStats._meta.db_table))
+    # Местная дата отличается от даты по UTC не больше чем на сутки
+    first = datetime.combine(days[0], time.min, dt_timezone.utc)
+    last = datetime.combine(days[-1], time.min, dt_timezone.utc)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            'first': days[0], 'last': days[-1],
+            'created_before': last + timedelta(days=2), 'deleted_after': first - timedelta(days=1),
+        })
+
+
+def count_completed(dates):
+    """Число выполнений по дням: {(user_id, день): n} и {(место, день): n} для публичных."""
+    completions = HabitCompletion.objects.filter(date__in=dates)
+    by_user = {
+        (row['habit__user_id'], row['date']): row['count']
+        for row in completions.values('habit__user_id', 'date').annotate(count=Count('id'))
+    }
+    by_place = {
+        (row['habit__place'], row['date']): row['count']
+        for row in completions.filter(habit__is_public=True)
+        .values('habit__place', 'date').annotate(count=Count('id'))
+    }
+    return by_user, by_place
+
+
+def close_days(days):
+    """
+    Полностью пересчитывает сводки за закрытые дни days (по возрастанию):
+    старые строки за эти дни заменяются новыми.
+    """
+    UserDailyStats.objects.filter(date__range=(days[0], days[-1])).delete()
+    PlaceDailyStats.objects.filter(date__range=(days[0], days[-1])).delete()
+    insert_due_counts(days)
+    refresh_completed(days)
+
+
+def refresh_completed(dates):
+    """
+    Обновляет только число выполнений за дни dates, остальные поля сводок
+    не меняются. Маски привычек пересчитываются за месяцы этих дней.
+    """
+    refresh_habit_months(dates)
+    completed_by_user, completed_by_place = count_completed(dates)
+    UserDailyStats.objects.bulk_create(
+        [UserDailyStats(user_id=user_id, date=day, completed_count=count)
+         for (user_id, day), count in completed_by_user.items()],
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=['completed_count'])
+    PlaceDailyStats.objects.bulk_create(
+        [PlaceDailyStats(place=place, date=day, completed_count=count)
+         for (place, day), count in completed_by_place.items()],
+        update_conflicts=True,
+        unique_fields=['date', 'place'],
+        update_fields=['completed_count'])
+
+
+def refresh_habit_months(dates):
+    """
+    Пересчитывает месячные маски дней выполнения привычек за месяцы,
+    в которые попадают дни dates: строки за эти месяцы заменяются новыми.
+    """
+    months = sorted({day.replace(day=1) for day in dates})
+    HabitMonthlyStats.objects.filter(month__in=months).delete()
+    quote = connection.ops.quote_name
+    sql = INSERT_HABIT_MONTHS_SQL.format(
+        habit_stats=quote(HabitMonthlyStats._meta.db_table),
+        completion=quote(HabitCompletion._meta.db_table))
+    after_last = (months[-1] + timedelta(days=31)).replace(day=1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'first': months[0], 'after_last': after_last, 'months': months})
+
+
+def first_tracked_day():
+    """Самый ранний день, с которого есть данные для сводок."""
+    created = Habit.all_objects.aggregate(day=Min(TruncDate('created_at')))['day']
+    completed = HabitCompletion.objects.aggregate(day=Min('date'))['day']
+    return min((day for day in (created, completed) if day), default=None)
+
+
+def run_rollup(now=None):
+    """
+    Инкрементальное обновление дневных сводок:
+    - закрывает дни после последнего закрытого до вчерашнего включительно
+      (пачками по HABITS_ROLLUP_DAYS_PER_BATCH, водяной знак сдвигается после каждой);
+    - пересчитывает число выполнений за дни, в которые с прошлого запуска
+      появились отметки (в том числе задним числом и за сегодня).
+    Возвращает число закрытых и обновленных дней.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    # Отметки последних секунд могут быть еще не видны (незакоммиченные транзакции)
+    completions_until = now - timedelta(seconds=settings.HABITS_SYNC_SAFETY_LAG_SECONDS)
+
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    if watermark is None:
+        first_day = first_tracked_day() or today
+        watermark = RollupWatermark(name=WATERMARK_NAME, closed_through=first_day - timedelta(days=1))
+
+    pending = [
+        watermark.closed_through + timedelta(days=offset)
+        for offset in range(1, (today - watermark.closed_through).days)
+    ]
+    batch = settings.HABITS_ROLLUP_DAYS_PER_BATCH
+    for start in range(0, len(pending), batch):
+        days = pending[start:start + batch]
+        with transaction.atomic():
+            close_days(days)
+            watermark.closed_through = days[-1]
+            watermark.save()
+
+    completions = HabitCompletion.objects.filter(completed_at__lt=completions_until)
+    if watermark.completions_through:
+        completions = completions.filter(completed_at__gte=watermark.completions_through)
+    changed = set(completions.values_list('date', flat=True).distinct())
+    # Дни, закрытые в этом запуске, уже посчитаны целиком
+    changed -= set(pending)
+    with transaction.atomic():
+        if changed:
+            refresh_completed(sorted(changed))
+        watermark.completions_through = completions_until
+        watermark.save()
+    return {'closed': len(pending), 'refreshed': len(changed)}
+
+
+def user_daily_series(user, start, end):
+    """Запланировано/выполнено по дням из сводок пользователя."""
+    return list(
+        UserDailyStats.objects
+        .filter(user=user, date__range=(start, end))
+        .order_by('date')
+        .values('date', 'due_count', 'completed_count'))
+
+
+def public_rollup(start, end):
+    """Сводка по публичным привычкам за период: по дням и по местам."""
+    rows = PlaceDailyStats.objects.filter(date__range=(start, end))
+    totals = {'due_count': Sum('due_count'), 'completed_count': Sum('completed_count')}
+    return {
+        'daily': list(rows.values('date').annotate(**totals).order_by('date')),
+        'places': list(rows.values('place').annotate(**totals).order_by('-completed_count', 'place')),
+    }
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def next_occurrences(times, frequencies, timezones, anchor_days, after):
+    """
+    Ближайшие после after напоминания для многих привычек сразу.
+
+    Привычка выполняется в местное время times[i] в часовом поясе timezones[i]
+    раз в frequencies[i] дней; цикл отсчитывается от местной даты anchor_days[i]
+    (обычно дата текущего next_reminder, None — от сегодняшнего дня).
+    Дата напоминания — первый день цикла, в который местное время еще не наступило.
+    Перевод в UTC учитывает переход на летнее время: местное время каждого
+    уникального (пояс, дата, время) переводится один раз, поэтому число обращений
+    к zoneinfo не зависит от числа привычек.
+
+    Возвращает список aware datetime в UTC в порядке входных привычек.
+    """
+    if not len(times):
+        return []
+    zones, zone_rows = np.unique(np.array(timezones, dtype=object), return_inverse=True)
+    zone_infos = [ZoneInfo(name) for name in zones]
+
+    # Местные дата и время момента after в каждом поясе
+    local_after = [after.astimezone(zone) for zone in zone_infos]
+    today = np.array([moment.date() for moment in local_after], dtype='datetime64[D]')[zone_rows]
+    now_seconds = np.array(
+        [moment.hour * 3600 + moment.minute * 60 + moment.second for moment in local_after])[zone_rows]
+
+    seconds = np.array([time.hour * 3600 + time.minute * 60 + time.second for time in times])
+    # Периодичность меньше дня запрещена (validate_frequency, ограничение в базе);
+    # несохраненную привычку с такой считаем ежедневной, чтобы не делить на ноль
+    frequency = np.maximum(np.array(frequencies, dtype=np.int64), 1)
+    anchor = np.array(anchor_days, dtype='datetime64[D]')
+    anchor = np.where(np.isnat(anchor), today, anchor)
+
+    # Первый день цикла не раньше сегодняшнего; если время уже прошло — следующий цикл
+    day = today + (anchor - today).astype(np.int64) % frequency
+    passed = (day == today) & (seconds <= now_seconds)
+    day = day + np.where(passed, frequency, 0)
+
+    local = day.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+    keys, key_rows = np.unique(
+        np.stack([zone_rows, local.astype(np.int64)]), axis=1, return_inverse=True)
+    converted = [
+        datetime.fromtimestamp(int(timestamp), dt_timezone.utc).replace(tzinfo=zone_infos[zone])
+        .astimezone(dt_timezone.utc)
+        for zone, timestamp in keys.T
+    ]
+    return [converted[row] for row in key_rows.ravel()]
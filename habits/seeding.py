@@ -0,0 +1,114 @@
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from users.models import CustomUser
+from .cache import invalidate_public_habits_cache
+from .models import Habit
+from .synthetic import synthetic_habit_columns, synthetic_habit_counts, synthetic_user_columns
+import csv
+import io
+import numpy as np
+
+USER_COLUMNS = (
+    'id', 'password', 'is_superuser', 'email', 'telegram_chat_id', 'timezone',
+    'is_active', 'is_staff', 'date_joined',
+)
+HABIT_COLUMNS = (
+    'id', 'user_id', 'action', 'time', 'place', 'is_pleasant', 'linked_habit_id', 'frequency',
+    'reward', 'duration', 'is_public', 'next_reminder', 'created_at', 'updated_at',
+    'current_streak', 'longest_streak', 'completion_count',
+)
+
+
+def reserve_ids(cursor, model, count):
+    """
+    Резервирует count подряд идущих значений последовательности первичного
+    ключа, чтобы связи между строками можно было проставить до загрузки,
+    а вставки через ORM после загрузки не получили занятые id. Блокировка
+    таблицы до конца транзакции не дает параллельным вставкам взять id
+    из резервируемого диапазона.
+    """
+    if not count:
+        return np.empty(0, dtype=np.int64)
+    table = model._meta.db_table
+    cursor.execute(f'LOCK TABLE {connection.ops.quote_name(table)} IN SHARE ROW EXCLUSIVE MODE')
+    cursor.execute(
+        "SELECT setval(seq, nextval(seq) + %s - 1) FROM pg_get_serial_sequence(%s, 'id') AS seq",
+        [count, table])
+    last = cursor.fetchone()[0]
+    return np.arange(last - count + 1, last + 1, dtype=np.int64)
+
+
+def copy_rows(cursor, model, columns, rows):
+    """Загружает строки в таблицу модели одной командой COPY ... FROM STDIN (CSV)."""
+    buffer = io.StringIO()
+    # None пишется пустым полем без кавычек — в формате CSV это NULL
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    cursor.copy_expert(
+        f"COPY {quote(model._meta.db_table)} ({', '.join(quote(column) for column in columns)}) "
+        f"FROM STDIN WITH (FORMAT csv)",
+        buffer)
+
+
+def column_rows(columns, names):
+    """Строки для COPY из словаря столбцов (массивов numpy или списков)."""
+    return zip(*(
+        columns[name].tolist() if isinstance(columns[name], np.ndarray) else columns[name]
+        for name in names))
+
+
+def seed_batch(cursor, users, per_user, rng, now, password_hash, email_domain):
+    """Генерирует и загружает одну пачку пользователей с их привычками. Возвращает число привычек."""
+    user_ids = reserve_ids(cursor, CustomUser, users)
+    user_columns = synthetic_user_columns(user_ids, rng, now, email_domain)
+    user_columns.update({
+        'id': user_ids,
+        'password': [password_hash] * users,
+        'is_superuser': [False] * users,
+        'is_active': [True] * users,
+        'is_staff': [False] * users,
+    })
+    copy_rows(cursor, CustomUser, USER_COLUMNS, column_rows(user_columns, USER_COLUMNS))
+
+    counts = synthetic_habit_counts(rng, users, per_user)
+    total = int(counts.sum())
+    habit_columns = synthetic_habit_columns(reserve_ids(cursor, Habit, total), counts, user_columns, rng, now)
+    for counter in ('current_streak', 'longest_streak', 'completion_count'):
+        habit_columns[counter] = [0] * total
+    copy_rows(cursor, Habit, HABIT_COLUMNS, column_rows(habit_columns, HABIT_COLUMNS))
+    return total
+
+
+def seed(users, per_user, batch_size=10000, seed=None, password='password123',
+         email_domain='seed.example.com', progress=None):
+    """
+    Создает users пользователей и в среднем по per_user привычек на каждого
+    потоковой загрузкой через COPY, минуя save() и сигналы. Каждая пачка
+    из batch_size пользователей — отдельная транзакция с отложенной проверкой
+    внешних ключей (связи проверяются один раз при коммите). Пароль у всех
+    пользователей один, он хешируется один раз.
+    progress(пользователей, привычек) вызывается после каждой пачки.
+    Возвращает (пользователей, привычек).
+    """
+    rng = np.random.default_rng(seed)
+    password_hash = make_password(password)
+    now = timezone.now()
+    created_users = created_habits = 0
+    while created_users < users:
+        count = min(batch_size, users - created_users)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+            # Потеря последних пачек при сбое сервера не страшна: их можно догенерировать
+            cursor.execute('SET LOCAL synchronous_commit TO OFF')
+            created_habits += seed_batch(cursor, count, per_user, rng, now, password_hash, email_domain)
+        created_users += count
+        if progress is not None:
+            progress(created_users, created_habits)
+
+    # Статистика для планировщика после массовой загрузки
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {CustomUser._meta.db_table}, {Habit._meta.db_table}')
+    invalidate_public_habits_cache()
+    return created_users, created_habits
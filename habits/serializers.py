@@ -1,8 +1,96 @@
+from django.utils import timezone
 from rest_framework import serializers
+from .cache import invalidate_public_habits_cache
+from .events import publish_reminder_changes
 from .models import Habit
 
 
+class LinkedHabitField(serializers.PrimaryKeyRelatedField):
+    """
+    Связанная привычка. При массовых операциях все связанные привычки
+    загружаются заранее одним запросом и передаются в context['linked_habits'],
+    чтобы не делать запрос на каждый элемент списка.
+    """
+
+    def to_internal_value(self, data):
+        linked_habits = self.context.get('linked_habits')
+        if linked_habits is None:
+            return super().to_internal_value(data)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        habit = linked_habits.get(pk)
+        if habit is None:
+            self.fail('does_not_exist', pk_value=data)
+        return habit
+
+
+class HabitListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор для массового создания и обновления привычек.
+    Для обновления instance — словарь {id: привычка} уже проверенных
+    на принадлежность пользователю привычек.
+    """
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+        habit = self.instance.get(data.get('id')) if isinstance(data, dict) else None
+        if habit is None:
+            raise serializers.ValidationError({'id': ['Привычка не найдена.']})
+        self.child.instance = habit
+        validated = super().run_child_validation(data)
+        validated['id'] = habit.id
+        return validated
+
+    def create(self, validated_data):
+        habits = [Habit(**attrs) for attrs in validated_data]
+        unscheduled = [habit for habit in habits if not habit.next_reminder]
+        for habit, reminder in zip(unscheduled, Habit.initial_next_reminders(unscheduled)):
+            habit.next_reminder = reminder
+        Habit.objects.bulk_create(habits)
+        if any(habit.is_public for habit in habits):
+            invalidate_public_habits_cache()
+        # bulk_create не отправляет сигналы — планировщику сообщаем сами
+        publish_reminder_changes((habit.id, habit.next_reminder) for habit in habits)
+        return habits
+
+    def update(self, instance, validated_data):
+        habits = []
+        fields = set()
+        invalidate = False
+        for attrs in validated_data:
+            habit = instance[attrs.pop('id')]
+            invalidate = invalidate or habit.is_public
+            for field, value in attrs.items():
+                setattr(habit, field, value)
+            fields.update(attrs)
+            invalidate = invalidate or habit.is_public
+            habits.append(habit)
+        # bulk_update не заполняет auto_now, а без updated_at клиенты не увидят изменений
+        now = timezone.now()
+        for habit in habits:
+            habit.updated_at = now
+        # Новое время или периодичность — новое расписание (как в Habit.save)
+        rescheduled = [habit for habit in habits if habit.schedule_changed()]
+        for habit, reminder in zip(rescheduled, Habit.upcoming_reminders(rescheduled, now)):
+            habit.next_reminder = reminder
+            fields.add('next_reminder')
+        Habit.objects.bulk_update(habits, sorted(fields | {'updated_at'}))
+        if invalidate:
+            invalidate_public_habits_cache()
+        if 'next_reminder' in fields:
+            publish_reminder_changes((habit.id, habit.next_reminder) for habit in habits)
+        return habits
+
+
 class HabitSerializer(serializers.ModelSerializer):
+    linked_habit = LinkedHabitField(
+        queryset=Habit.objects.all(), allow_null=True, required=False)
+    current_streak = serializers.SerializerMethodField()
+    completion_rate = serializers.SerializerMethodField()
+
     class Meta:
         model = Habit
         fields = [
@@ -16,11 +104,24 @@ class HabitSerializer(serializers.ModelSerializer):
             'reward',
             'duration',
             'is_public',
-            'next_reminder']
-        read_only_fields = ['user']  # Поле user будет только для чтения
+            'next_reminder',
+            'current_streak',
+            'longest_streak',
+            'completion_count',
+            'completion_rate',
+            'last_completed_on']
+        read_only_fields = [
+            'user', 'longest_streak', 'completion_count', 'last_completed_on']
+        list_serializer_class = HabitListSerializer
+
+    def get_current_streak(self, habit):
+        return habit.active_streak()
+
+    def get_completion_rate(self, habit):
+        return habit.completion_rate()
 
     def validate(self, data):
-        if data['is_pleasant'] and (
+        if data.get('is_pleasant') and (
                 data.get('linked_habit') or data.get('reward')):
             raise serializers.ValidationError(
                 "Приятная привычка не может иметь связанной привычки или вознаграждения.")
@@ -30,7 +131,20 @@ class HabitSerializer(serializers.ModelSerializer):
         if data['duration'] > 120:
             raise serializers.ValidationError(
                 "Время выполнения не может превышать 120 секунд.")
-        if data['frequency'] < 1 or data['frequency'] > 7:
+        if data.get('frequency', 1) < 1 or data.get('frequency', 1) > 7:
             raise serializers.ValidationError(
                 "Привычка должна повторяться не реже 1 раза в 7 дней.")
         return data
+
+
+class HabitCompletionSerializer(serializers.Serializer):
+    """
+    Отметка выполнения: день по умолчанию — сегодня, будущие дни запрещены.
+    «Сегодня» — в часовом поясе владельца привычки из context['habit'].
+    """
+    date = serializers.DateField(required=False)
+
+    def validate_date(self, value):
+        if value > self.context['habit'].local_today():
+            raise serializers.ValidationError("Нельзя отметить выполнение в будущем.")
+        return value
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_public_habits_cache
+from .events import publish_reminder_changes
+from users.models import CustomUser
+from .models import Habit
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def habit_changed(sender, instance, **kwargs):
+    # Ленту трогают только публичные привычки (или ставшие приватными)
+    if instance.is_public or instance.was_public:
+        invalidate_public_habits_cache()
+
+
+@receiver(post_save, sender=Habit)
+def habit_saved(sender, instance, update_fields=None, **kwargs):
+    # Отметка выполнения и другие частичные сохранения расписание не меняют
+    if update_fields is None or 'next_reminder' in update_fields:
+        next_reminder = None if instance.deleted_at else instance.next_reminder
+        publish_reminder_changes([(instance.id, next_reminder)])
+
+
+@receiver(post_delete, sender=Habit)
+def habit_deleted(sender, instance, **kwargs):
+    publish_reminder_changes([(instance.id, None)])
+
+
+@receiver(post_save, sender=CustomUser)
+def user_timezone_changed(sender, instance, created, **kwargs):
+    # Напоминания приходят по местному времени: новый пояс — новое расписание
+    loaded = getattr(instance, 'loaded_timezone', None)
+    if created or loaded is None or loaded == instance.timezone:
+        return
+    Habit.objects.filter(user=instance).reschedule()
+    instance.loaded_timezone = instance.timezone
@@ -0,0 +1,174 @@
+from datetime import timedelta
+from django.db.models import Exists, IntegerField, Q, Subquery, Value
+from django.utils import timezone
+import numpy as np
+from .models import HabitCompletion, HabitMonthlyStats, RollupWatermark
+from .rollups import WATERMARK_NAME
+
+# 1970-01-01 — четверг: день недели для datetime64[D] считается от этого сдвига
+EPOCH_WEEKDAY = 3
+
+
+def load_completions(habit_ids, start, end):
+    """
+    Дни выполнения привычек habit_ids за [start, end] одним запросом:
+    месячные маски из сводок HabitMonthlyStats и из журнала выполнения
+    только отметки, сделанные после последнего обновления сводок.
+    Возвращает массивы (id привычки, номер дня от начала эпохи) без повторов.
+    """
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME, completions_through__isnull=False)
+    months = (
+        HabitMonthlyStats.objects
+        .filter(habit_id__in=habit_ids, month__range=(start.replace(day=1), end))
+        .values_list('habit_id', 'month', 'completed_days'))
+    # Отметка из журнала — строка с пустой маской: день выполнения вместо месяца
+    recent = (
+        HabitCompletion.objects
+        .filter(habit_id__in=habit_ids, date__range=(start, end))
+        .filter(Q(completed_at__gte=Subquery(watermark.values('completions_through'))) | ~Exists(watermark))
+        .annotate(completed_days=Value(0, output_field=IntegerField()))
+        .values_list('habit_id', 'date', 'completed_days'))
+    rows = list(months.union(recent, all=True))
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    ids, dates, masks = zip(*rows)
+    ids = np.array(ids, dtype=np.int64)
+    dates = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    masks = np.array(masks, dtype=np.int64)
+
+    single = masks == 0
+    mask_rows, offsets = np.nonzero((masks[:, None] >> np.arange(31)) & 1)
+    ids = np.concatenate([ids[single], ids[mask_rows]])
+    days = np.concatenate([dates[single], dates[mask_rows] + offsets])
+    start_day, end_day = np.array([start, end], dtype='datetime64[D]').astype(np.int64)
+    in_period = (days >= start_day) & (days <= end_day)
+    # Отметка могла попасть и в маску, и в свежие строки журнала
+    ids, days = np.unique(np.stack([ids[in_period], days[in_period]]), axis=1)
+    return ids, days
+
+
+def compute_stats(habits, start, end):
+    """
+    Статистика по привычкам за период [start, end] без циклов по дням:
+    число выполнений, процент выполнения и соблюдение периодичности (доля циклов
+    по frequency дней хотя бы с одной отметкой) с первой отметки в периоде,
+    самая длинная и текущая серия (перерыв не больше frequency дней)
+    и распределение выполнений по дням недели.
+
+    habits — список пар (id, frequency). Возвращает словарь массивов,
+    упорядоченных так же, как habits.
+    """
+    count = len(habits)
+    ids = np.array([habit_id for habit_id, _frequency in habits], dtype=np.int64)
+    frequency = np.array([frequency for _habit_id, frequency in habits], dtype=np.int64)
+    result = {
+        'completion_count': np.zeros(count, dtype=np.int64),
+        'completion_rate': np.zeros(count),
+        'adherence': np.zeros(count),
+        'longest_streak': np.zeros(count, dtype=np.int64),
+        'current_streak': np.zeros(count, dtype=np.int64),
+        'weekdays': np.zeros((count, 7), dtype=np.int64),
+    }
+    if not count:
+        return result
+
+    habit_ids, days = load_completions(ids.tolist(), start, end)
+    if not len(days):
+        return result
+
+    # Строка привычки для каждой отметки; отметки сортируются по (привычка, день)
+    order = np.argsort(ids)
+    rows = order[np.searchsorted(ids, habit_ids, sorter=order)]
+    events = np.lexsort((days, rows))
+    rows, days = rows[events], days[events]
+    end_day = np.datetime64(end, 'D').astype(np.int64)
+
+    completion_count = np.bincount(rows, minlength=count)
+    has_completions = completion_count > 0
+    first_day = np.full(count, end_day)
+    np.minimum.at(first_day, rows, days)
+    expected = (end_day - first_day) // frequency + 1
+
+    # Циклы по frequency дней, в которых привычка выполнялась хотя бы раз
+    cycles = (days - first_day[rows]) // frequency[rows]
+    hit_rows = np.unique(np.stack([rows, cycles]), axis=1)[0]
+    cycles_hit = np.bincount(hit_rows, minlength=count)
+
+    # Серии: новая начинается на первой отметке привычки или после перерыва > frequency
+    new_streak = np.ones(len(days), dtype=bool)
+    new_streak[1:] = (rows[1:] != rows[:-1]) | (np.diff(days) > frequency[rows[1:]])
+    streak_ids = np.cumsum(new_streak) - 1
+    streak_lengths = np.bincount(streak_ids)
+    streak_rows = rows[new_streak]
+    longest = np.zeros(count, dtype=np.int64)
+    np.maximum.at(longest, streak_rows, streak_lengths)
+
+    # Текущая серия — последняя серия привычки, если она не прервана к концу периода
+    last_event = np.flatnonzero(np.append(rows[1:] != rows[:-1], True))
+    last_rows = rows[last_event]
+    current = np.zeros(count, dtype=np.int64)
+    alive = end_day - days[last_event] <= frequency[last_rows]
+    current[last_rows[alive]] = streak_lengths[streak_ids[last_event]][alive]
+
+    weekdays = np.zeros((count, 7), dtype=np.int64)
+    np.add.at(weekdays, (rows, (days + EPOCH_WEEKDAY) % 7), 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(has_completions, completion_count / expected, 0.0)
+        adherence = np.where(has_completions, cycles_hit / expected, 0.0)
+    result.update({
+        'completion_count': completion_count,
+        'completion_rate': np.minimum(rate, 1.0).round(3),
+        'adherence': np.minimum(adherence, 1.0).round(3),
+        'longest_streak': longest,
+        'current_streak': current,
+        'weekdays': weekdays,
+    })
+    return result
+
+
+def stats_period(days):
+    """Период [start, end] из days последних дней, включая сегодня."""
+    end = timezone.localdate()
+    return end - timedelta(days=days - 1), end
+
+
+def habits_stats(queryset, days, per_habit=True):
+    """
+    Статистика по привычкам выборки за последние days дней: сводка по всем
+    сразу и, если per_habit, показатели каждой привычки.
+    """
+    start, end = stats_period(days)
+    habits = list(queryset.order_by('id').values_list('id', 'frequency'))
+    stats = compute_stats(habits, start, end)
+    data = {'start': start, 'end': end, 'summary': summarize(stats)}
+    if per_habit:
+        data['habits'] = [
+            {
+                'id': habit_id,
+                'completion_count': int(stats['completion_count'][index]),
+                'completion_rate': float(stats['completion_rate'][index]),
+                'adherence': float(stats['adherence'][index]),
+                'longest_streak': int(stats['longest_streak'][index]),
+                'current_streak': int(stats['current_streak'][index]),
+                'weekdays': stats['weekdays'][index].tolist(),
+            }
+            for index, (habit_id, _frequency) in enumerate(habits)
+        ]
+    return data
+
+
+def summarize(stats):
+    """Сводка по набору привычек: суммы и средние по всем привычкам."""
+    count = len(stats['completion_count'])
+    if not count:
+        return {'habits': 0, 'completion_count': 0, 'completion_rate': 0.0,
+                'adherence': 0.0, 'longest_streak': 0, 'weekdays': [0] * 7}
+    return {
+        'habits': count,
+        'completion_count': int(stats['completion_count'].sum()),
+        'completion_rate': round(float(stats['completion_rate'].mean()), 3),
+        'adherence': round(float(stats['adherence'].mean()), 3),
+        'longest_streak': int(stats['longest_streak'].max()),
+        'weekdays': stats['weekdays'].sum(axis=0).tolist(),
+    }
@@ -0,0 +1,55 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import Habit
+
+
+class InvalidSyncToken(ValueError):
+    """Токен синхронизации поврежден или устарел."""
+
+
+def encode_token(updated_at, habit_id):
+    """Токен — позиция в ленте изменений: (updated_at, id) последней отданной записи."""
+    raw = f'{updated_at.isoformat()}|{habit_id}'
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        raw = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        updated_at, habit_id = raw.split('|')
+        return datetime.fromisoformat(updated_at), int(habit_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidSyncToken('Некорректный токен синхронизации.') from e
+
+
+def changes_since(user, token=None, limit=None):
+    """
+    Привычки пользователя (включая удаленные), измененные после позиции token,
+    в порядке (updated_at, id). Возвращает (привычки, следующий токен, есть ли еще).
+
+    Последние HABITS_SYNC_SAFETY_LAG_SECONDS секунд не отдаются: транзакция,
+    начатая раньше, может закоммитить запись с более ранним updated_at.
+    """
+    limit = limit or settings.HABITS_SYNC_PAGE_SIZE
+    now = timezone.now()
+    queryset = Habit.all_objects.select_related('user').filter(
+        user=user,
+        updated_at__lte=now - timedelta(seconds=settings.HABITS_SYNC_SAFETY_LAG_SECONDS),
+    )
+    if token:
+        updated_at, habit_id = decode_token(token)
+        if updated_at < now - timedelta(days=settings.HABITS_TOMBSTONE_TTL_DAYS):
+            raise InvalidSyncToken('Токен синхронизации устарел, нужна полная синхронизация.')
+        later = Q(updated_at__gt=updated_at)
+        same_time = Q(updated_at=updated_at, id__gt=habit_id)
+        queryset = queryset.filter(later | same_time)
+
+    habits = list(queryset.order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(habits) > limit
+    habits = habits[:limit]
+    if habits:
+        token = encode_token(habits[-1].updated_at, habits[-1].id)
+    return habits, token, has_more
@@ -0,0 +1,122 @@
+from datetime import time, timezone as dt_timezone
+from .schedule import SECONDS_PER_DAY, next_occurrences
+import numpy as np
+
+# Словари и распределения для синтетических данных (seed_habits, бенчмарки)
+ACTIONS = (
+    'Сделать зарядку', 'Выпить стакан воды', 'Пройти 10 000 шагов', 'Почитать книгу',
+    'Помедитировать', 'Выучить 10 слов', 'Сделать растяжку', 'Написать план на день',
+    'Прибраться на столе', 'Позвонить родителям', 'Полить цветы', 'Сделать планку',
+)
+PLEASANT_ACTIONS = (
+    'Выпить кофе', 'Послушать музыку', 'Посмотреть серию', 'Принять ванну',
+    'Съесть десерт', 'Поиграть в игру',
+)
+PLACES = ('Дом', 'Работа', 'Парк', 'Спортзал', 'Кафе', 'Улица')
+REWARDS = ('Шоколадка', 'Прогулка', 'Час отдыха', 'Новая книга')
+TIMEZONES = {
+    'Europe/Paris': 30, 'Europe/Moscow': 30, 'Europe/London': 10,
+    'America/New_York': 10, 'Asia/Tokyo': 10, 'Asia/Yekaterinburg': 10,
+}
+# Чаще всего привычки ежедневные или еженедельные
+FREQUENCIES = {1: 60, 2: 10, 3: 8, 4: 3, 5: 3, 6: 1, 7: 15}
+# Утренний и вечерний пики
+HOURS = {
+    6: 6, 7: 14, 8: 12, 9: 8, 10: 4, 11: 3, 12: 4, 13: 4, 14: 3, 15: 3,
+    16: 3, 17: 4, 18: 6, 19: 8, 20: 8, 21: 7, 22: 4,
+}
+PLEASANT_SHARE = 0.2
+LINKED_SHARE = 0.5  # доля полезных привычек со связанной приятной (остальные с вознаграждением)
+PUBLIC_SHARE = 0.3
+TELEGRAM_SHARE = 0.7  # доля пользователей с привязанным Telegram
+JOINED_WITHIN_DAYS = 2 * 365  # пользователи зарегистрированы за последние два года
+MAX_HABITS_PER_USER = 50
+
+
+def _pick(rng, weights, size):
+    """size случайных значений из словаря {значение: вес}."""
+    values = np.array(list(weights), dtype=object)
+    p = np.array(list(weights.values()), dtype=float)
+    return values[rng.choice(len(values), size, p=p / p.sum())]
+
+
+def _utc64(moment):
+    return np.datetime64(moment.astimezone(dt_timezone.utc).replace(tzinfo=None), 'us')
+
+
+def _timestamps(moments):
+    """Моменты datetime64 (UTC) в виде строк для COPY."""
+    return np.datetime_as_string(moments, unit='us', timezone='UTC').tolist()
+
+
+def synthetic_user_columns(ids, rng, now, email_domain):
+    """
+    Столбцы пользователей с заданными id для потоковой загрузки (COPY):
+    email, timezone, telegram_chat_id, date_joined (строки) и date_joined_at
+    (datetime64, нужен для дат создания привычек).
+    rng — numpy.random.Generator.
+    """
+    count = len(ids)
+    age = rng.random(count) * JOINED_WITHIN_DAYS * SECONDS_PER_DAY * 1e6
+    joined = _utc64(now) - age.astype('timedelta64[us]')
+    has_telegram = rng.random(count) < TELEGRAM_SHARE
+    return {
+        'email': [f'user{user_id}@{email_domain}' for user_id in ids.tolist()],
+        'timezone': _pick(rng, TIMEZONES, count),
+        'telegram_chat_id': np.where(has_telegram, (ids + 1_000_000_000).astype(str).astype(object), None),
+        'date_joined': _timestamps(joined),
+        'date_joined_at': joined,
+    }
+
+
+def synthetic_habit_counts(rng, users, per_user):
+    """Число привычек у каждого пользователя: в среднем per_user (распределение Пуассона)."""
+    return np.minimum(rng.poisson(per_user, users), MAX_HABITS_PER_USER)
+
+
+def synthetic_habit_columns(ids, counts, users, rng, now):
+    """
+    Столбцы привычек для COPY. ids — зарезервированные id привычек,
+    counts — число привычек у каждого пользователя, users — столбцы
+    synthetic_user_columns с добавленным 'id'. Привычки одного пользователя
+    идут подряд, первые из них — приятные; часть полезных связана
+    с приятной привычкой того же пользователя, остальные — с вознаграждением.
+    next_reminder считается векторно, как при создании через API.
+    """
+    total = len(ids)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    block_start = (np.cumsum(counts) - counts)[owners]
+    pleasant_counts = rng.binomial(counts, PLEASANT_SHARE)[owners]
+    pleasant = np.arange(total) - block_start < pleasant_counts
+    linked = ~pleasant & (pleasant_counts > 0) & (rng.random(total) < LINKED_SHARE)
+    linked_rows = block_start + (rng.random(total) * pleasant_counts).astype(np.int64)
+
+    hours = _pick(rng, HOURS, total)
+    minutes = rng.choice((0, 15, 30, 45), total)
+    times = [time(hour, minute) for hour, minute in zip(hours.tolist(), minutes.tolist())]
+    frequencies = _pick(rng, FREQUENCIES, total)
+    timezones = users['timezone'][owners]
+
+    # Привычка создана между регистрацией владельца и текущим моментом
+    joined = users['date_joined_at'][owners]
+    age = (_utc64(now) - joined).astype(np.float64) * rng.random(total)
+    created = _timestamps(joined + age.astype('timedelta64[us]'))
+
+    return {
+        'id': ids,
+        'user_id': users['id'][owners],
+        'action': np.where(
+            pleasant, _pick(rng, dict.fromkeys(PLEASANT_ACTIONS, 1), total),
+            _pick(rng, dict.fromkeys(ACTIONS, 1), total)),
+        'time': [value.isoformat() for value in times],
+        'place': _pick(rng, dict.fromkeys(PLACES, 1), total),
+        'is_pleasant': pleasant,
+        'linked_habit_id': np.where(linked, ids[linked_rows].astype(object), None),
+        'frequency': frequencies,
+        'reward': np.where(~pleasant & ~linked, _pick(rng, dict.fromkeys(REWARDS, 1), total), None),
+        'duration': rng.integers(1, 13, total) * 10,
+        'is_public': rng.random(total) < PUBLIC_SHARE,
+        'next_reminder': next_occurrences(times, frequencies.tolist(), timezones.tolist(), [None] * total, now),
+        'created_at': created,
+        'updated_at': created,
+    }
@@ -1,17 +1,37 @@
-'''from celery import shared_task
+from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
+from datetime import timedelta
 from habits.models import Habit
+from habits.rollups import run_rollup
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Задача для обновления данных о привычках (например, обновление даты следующего напоминания)
+
+# Задача для обновления данных о привычках: переносит просроченные напоминания
+# на ближайший цикл набором UPDATE вместо сохранения каждой привычки
 @shared_task
 def update_habits_data():
-    habits = Habit.objects.all()
-    for habit in habits:
-        # Логика обновления данных о привычках
-        habit.next_reminder = timezone.now() + timezone.timedelta(hours=24)
-        habit.save()
-        logger.info(f"Updated next reminder date for habit: {habit.action}")
-'''
\ No newline at end of file
+    updated = Habit.objects.reschedule_missed(timezone.now())
+    logger.info(f"Rescheduled next reminder date for {updated} habits")
+    return updated
+
+
+# Окончательно удаляет привычки, помеченные удаленными дольше HABITS_TOMBSTONE_TTL_DAYS
+@shared_task
+def purge_deleted_habits():
+    cutoff = timezone.now() - timedelta(days=settings.HABITS_TOMBSTONE_TTL_DAYS)
+    deleted, _ = Habit.all_objects.filter(deleted_at__lt=cutoff).delete()
+    logger.info(f"Purged {deleted} deleted habits")
+    return deleted
+
+
+# Ночное обновление дневных сводок: закрывает прошедшие дни и досчитывает
+# выполнения, отмеченные с прошлого запуска. Первый запуск считает всю историю,
+# поэтому лимит времени больше общего CELERY_TASK_TIME_LIMIT
+@shared_task(time_limit=60 * 60)
+def rollup_daily_stats():
+    result = run_rollup()
+    logger.info(f"Daily stats rollup: {result['closed']} days closed, {result['refreshed']} days refreshed")
+    return result
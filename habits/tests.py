@@ -1,6 +1,7 @@
 from django.test import TestCase, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from habits.models import Habit
+from habits.models import Habit, HabitCompletion, HabitMonthlyStats, PlaceDailyStats, UserDailyStats
 from users.models import CustomUser
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
@@ -8,6 +9,31 @@ from .validators import validate_duration, validate_frequency
 from django.core.exceptions import ValidationError
 from config import wsgi, asgi
 from rest_framework import status
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+import csv
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+import tempfile
+from django.core.management import call_command
+from zoneinfo import ZoneInfo
+from django.db import IntegrityError, connection, transaction
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from unittest.mock import patch
+from django.test import override_settings
+from django.conf import settings
+from habits.pagination import HabitCursorPagination, PublicHabitCursorPagination
+from habits.sync import encode_token
+from habits.tasks import purge_deleted_habits
+from habits.stats import compute_stats
+from habits.rollups import refresh_habit_months, run_rollup
+from habits.schedule import next_occurrences
+from config.middleware import fingerprint, query_stats_recorded
+from prometheus_client import REGISTRY
 
 User = get_user_model()
 
@@ -134,3 +160,1139 @@ class HabitValidatorTest(TestCase):
         with self.assertRaises(ValidationError):
             validate_frequency(8)  # Больше допустимого лимита
 
+
+class HabitBulkRescheduleTest(TestCase):
+    """
+    Тесты для пакетного переноса напоминаний
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.now = timezone.now().replace(microsecond=0)
+
+    def create_habit(self, frequency, next_reminder):
+        return Habit.objects.create(
+            user=self.user,
+            action="Зарядка",
+            time=self.now.time(),
+            place="Дом",
+            frequency=frequency,
+            duration=60,
+            next_reminder=next_reminder)
+
+    def shift_local(self, moment, delta):
+        """Сдвиг по местному времени пользователя, как в advance_reminders"""
+        zone = ZoneInfo(self.user.timezone)
+        return (moment.astimezone(zone).replace(tzinfo=None) + delta).replace(tzinfo=zone)
+
+    def test_advance_reminders(self):
+        """Каждая привычка сдвигается на свою периодичность"""
+        daily = self.create_habit(1, self.now)
+        weekly = self.create_habit(7, self.now)
+
+        # UPDATE и проверка, есть ли среди привычек публичные (для кеша ленты)
+        with self.assertNumQueries(2):
+            updated = Habit.objects.filter(id__in=[daily.id, weekly.id]).advance_reminders()
+
+        self.assertEqual(updated, 2)
+        daily.refresh_from_db()
+        weekly.refresh_from_db()
+        self.assertEqual(daily.next_reminder, self.shift_local(self.now, timedelta(days=1)))
+        self.assertEqual(weekly.next_reminder, self.shift_local(self.now, timedelta(days=7)))
+
+    def test_advance_keeps_local_time_across_dst(self):
+        """При переходе на летнее время напоминание остается в 07:00 по местному времени"""
+        paris = ZoneInfo('Europe/Paris')
+        habit = self.create_habit(1, datetime(2026, 3, 28, 7, 0, tzinfo=paris))
+
+        Habit.objects.filter(id=habit.id).advance_reminders()
+
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_reminder, datetime(2026, 3, 29, 7, 0, tzinfo=paris))
+        self.assertEqual(habit.next_reminder.utcoffset(), timedelta(0))
+        self.assertEqual(habit.next_reminder, datetime(2026, 3, 29, 5, 0, tzinfo=dt_timezone.utc))
+
+    def test_reschedule_missed_several_cycles(self):
+        """Пропущенные циклы пропускаются, фаза расписания сохраняется"""
+        stale = self.create_habit(3, self.now - timedelta(days=7, hours=1))
+        future = self.create_habit(2, self.now + timedelta(hours=5))
+
+        updated = Habit.objects.reschedule_missed(self.now)
+
+        self.assertEqual(updated, 1)
+        stale.refresh_from_db()
+        future.refresh_from_db()
+        # -7д1ч -> -4д1ч -> -1д1ч -> +1д23ч (сдвиг на 9 дней по местному времени)
+        self.assertEqual(
+            stale.next_reminder, self.shift_local(self.now - timedelta(days=7, hours=1), timedelta(days=9)))
+        self.assertEqual(future.next_reminder, self.now + timedelta(hours=5))
+
+
+class HabitIndexUsageTest(TestCase):
+    """
+    Проверяет по EXPLAIN, что горячие запросы идут по индексам
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123', telegram_chat_id='555')
+        now = timezone.now()
+        for number in range(20):
+            Habit.objects.create(
+                user=self.user,
+                action=f"Привычка {number}",
+                time=now.time(),
+                place="Дом",
+                duration=60,
+                is_public=number % 2 == 0,
+                next_reminder=now + timedelta(hours=number))
+        # На маленькой таблице планировщик предпочел бы Seq Scan или Bitmap Scan; статистика
+        # пересчитывается, чтобы не зависеть от данных, оставшихся от других тестов
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE habits_habit')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'Index Scan using {index_name}', plan, plan)
+
+    def test_user_list_uses_composite_index(self):
+        self.assertUsesIndex(
+            Habit.objects.filter(user=self.user).order_by('next_reminder', 'id')[:5],
+            'habit_user_next_reminder_idx')
+
+    def test_public_feed_uses_partial_index(self):
+        self.assertUsesIndex(
+            Habit.objects.filter(is_public=True).order_by('next_reminder', 'id')[:5],
+            'habit_public_next_reminder_idx')
+
+    def test_due_window_uses_partial_index(self):
+        """EXPLAIN запросов, которые выполняет сам iter_due при рассылке."""
+        now = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            pages = list(Habit.objects.iter_due(now, now + timedelta(hours=4), settings.REMINDER_BATCH_SIZE))
+        self.assertEqual([len(page) for page in pages], [4])
+        self.assertEqual(len(queries), 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queries[0]['sql']}")
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertRegex(plan, r'Index (Only )?Scan using habit_due_reminder_user_idx')
+
+
+class HabitConstraintTest(TestCase):
+    """
+    Ограничения на уровне базы данных
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+
+    def create_habit(self, **fields):
+        return Habit.objects.create(
+            user=self.user, action="Зарядка", time=timezone.now().time(), place="Дом", **fields)
+
+    def test_duration_constraint(self):
+        with self.assertRaises(IntegrityError):
+            self.create_habit(duration=121)
+
+    def test_frequency_constraint(self):
+        for frequency in (0, 8):
+            with self.subTest(frequency=frequency):
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    self.create_habit(duration=60, frequency=frequency)
+
+
+class PublicHabitsFeedTest(APITestCase):
+    """
+    Лента публичных привычек: курсорная пагинация и кеш
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        now = timezone.now()
+        self.habits = [
+            Habit.objects.create(
+                user=self.user,
+                action=f"Привычка {number}",
+                time=now.time(),
+                place="Дом",
+                duration=60,
+                is_public=True,
+                next_reminder=now + timedelta(hours=number))
+            for number in range(3)
+        ]
+        Habit.objects.create(
+            user=self.user, action="Личная", time=now.time(), place="Дом", duration=60)
+        self.url = '/api/habits/public/'
+
+    def test_cursor_pagination(self):
+        with patch.object(PublicHabitCursorPagination, 'page_size', 2):
+            first = self.client.get(self.url)
+            second = self.client.get(first.data['next'])
+        self.assertEqual(
+            [habit['action'] for habit in first.data['results']], ["Привычка 0", "Привычка 1"])
+        self.assertEqual([habit['action'] for habit in second.data['results']], ["Привычка 2"])
+        self.assertIsNone(second.data['next'])
+
+    def test_cached_page_does_not_touch_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_cache_invalidated_on_save_and_delete(self):
+        self.client.get(self.url)
+
+        habit = self.habits[0]
+        habit.action = "Обновленная"
+        habit.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['action'], "Обновленная")
+
+        habit.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_cache_invalidated_when_habit_becomes_private(self):
+        self.client.get(self.url)
+
+        habit = Habit.objects.get(id=self.habits[1].id)
+        habit.is_public = False
+        habit.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_private_habit_does_not_invalidate_cache(self):
+        self.client.get(self.url)
+        Habit.objects.create(
+            user=self.user, action="Еще личная", time=timezone.now().time(),
+            place="Дом", duration=60)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_cache_key_ignores_extra_query_params(self):
+        with patch.object(PublicHabitCursorPagination, 'page_size', 2):
+            first = self.client.get(self.url, {'utm_source': 'feed'})
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url, {'nonce': '1'})
+        self.assertEqual(response.data, first.data)
+        self.assertNotIn('utm_source', first.data['next'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reminder_updates_invalidate_only_public_habits(self):
+        private = Habit.objects.get(action="Личная")
+        self.client.get(self.url)
+
+        Habit.objects.filter(id=private.id).advance_reminders()
+        Habit.objects.filter(id=private.id).reschedule_missed(timezone.now() + timedelta(days=30))
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        Habit.objects.filter(id=self.habits[0].id).advance_reminders()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][-1]['id'], self.habits[0].id)
+
+
+class HabitListCursorPaginationTest(APITestCase):
+    """
+    Курсорная пагинация списка привычек пользователя
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        other = CustomUser.objects.create_user(
+            email='other@example.com', password='password123')
+        now = timezone.now()
+        for number in range(7):
+            Habit.objects.create(
+                user=self.user, action=f"Привычка {number}", time=now.time(),
+                place="Дом", duration=60, next_reminder=now + timedelta(hours=number))
+        Habit.objects.create(
+            user=other, action="Чужая", time=now.time(), place="Дом", duration=60)
+        self.client.force_authenticate(user=self.user)
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get('/api/habits/')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_walk_whole_list_by_cursor(self):
+        actions = []
+        url = '/api/habits/?pagination=cursor&page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            actions += [habit['action'] for habit in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(actions, [f"Привычка {number}" for number in range(7)])
+
+    def test_max_page_size(self):
+        with patch.object(HabitCursorPagination, 'max_page_size', 4):
+            response = self.client.get('/api/habits/?pagination=cursor&page_size=1000')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_cursor_page_has_no_count_query(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/habits/?pagination=cursor')
+
+
+class HabitBulkApiTest(APITestCase):
+    """
+    Массовое создание, обновление и удаление привычек
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.other = CustomUser.objects.create_user(
+            email='other@example.com', password='password123')
+        self.pleasant = Habit.objects.create(
+            user=self.user, action="Съесть яблоко", time="08:00", place="Кухня",
+            duration=60, is_pleasant=True)
+        self.foreign = Habit.objects.create(
+            user=self.other, action="Чужая", time="08:00", place="Дом", duration=60)
+        self.url = '/api/habits/bulk/'
+        self.client.force_authenticate(user=self.user)
+
+    def habit_data(self, number, **fields):
+        data = {
+            'action': f"Привычка {number}",
+            'time': "07:00",
+            'place': "Парк",
+            'duration': 60,
+            'frequency': 2,
+        }
+        data.update(fields)
+        return data
+
+    def test_bulk_create(self):
+        items = [self.habit_data(number, linked_habit=self.pleasant.id) for number in range(20)]
+        # SELECT связанных привычек + INSERT (+ SAVEPOINT/RELEASE транзакции)
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 20)
+        habits = Habit.objects.filter(user=self.user, linked_habit=self.pleasant)
+        self.assertEqual(habits.count(), 20)
+        self.assertFalse(habits.filter(next_reminder__isnull=True).exists())
+
+    def test_bulk_create_errors_per_item(self):
+        items = [
+            self.habit_data(0),
+            self.habit_data(1, duration=500),
+            self.habit_data(2, linked_habit=self.foreign.id),
+        ]
+        response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data), 3)
+        self.assertFalse(response.data[0])
+        self.assertIn('duration', response.data[1])
+        self.assertIn('linked_habit', response.data[2])
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_update(self):
+        habits = [
+            Habit.objects.create(user=self.user, action=f"Старая {number}", time="07:00",
+                                 place="Дом", duration=60)
+            for number in range(3)
+        ]
+        items = [self.habit_data(number, id=habit.id, place="Сад")
+                 for number, habit in enumerate(habits)]
+
+        response = self.client.put(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(Habit.objects.filter(id__in=[h.id for h in habits]).values_list('place', flat=True)),
+            ["Сад"] * 3)
+
+    def test_bulk_update_foreign_habit(self):
+        items = [self.habit_data(0, id=self.foreign.id)]
+
+        response = self.client.put(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data[0])
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.action, "Чужая")
+
+    def test_bulk_delete(self):
+        habits = [
+            Habit.objects.create(user=self.user, action="Удалить", time="07:00",
+                                 place="Дом", duration=60)
+            for _ in range(3)
+        ]
+        response = self.client.delete(self.url, [h.id for h in habits], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Habit.objects.filter(id__in=[h.id for h in habits]).exists())
+
+    def test_bulk_delete_foreign_habit(self):
+        own = Habit.objects.create(
+            user=self.user, action="Своя", time="07:00", place="Дом", duration=60)
+
+        response = self.client.delete(self.url, [own.id, self.foreign.id], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{}, {'id': ['Привычка не найдена.']}])
+        self.assertEqual(Habit.objects.filter(id__in=[own.id, self.foreign.id]).count(), 2)
+
+
+class HabitSyncTest(APITestCase):
+    """
+    Лента изменений для синхронизации клиентов
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.other = CustomUser.objects.create_user(
+            email='other@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/habits/changes/'
+        # Изменения последних секунд не отдаются, в тестах задержка не нужна
+        lag = override_settings(HABITS_SYNC_SAFETY_LAG_SECONDS=0)
+        lag.enable()
+        self.addCleanup(lag.disable)
+
+    def create_habit(self, user=None, **fields):
+        return Habit.objects.create(
+            user=user or self.user, action=fields.pop('action', "Зарядка"),
+            time="07:00", place="Дом", duration=60, **fields)
+
+    def test_initial_sync_returns_all_own_habits(self):
+        habits = [self.create_habit(action=f"Привычка {n}") for n in range(3)]
+        self.create_habit(user=self.other)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['id'] for c in response.data['changes']], [h.id for h in habits])
+        self.assertFalse(response.data['has_more'])
+        self.assertTrue(response.data['next_token'])
+
+    def test_only_changes_since_token_are_returned(self):
+        unchanged = self.create_habit(action="Без изменений")
+        updated = self.create_habit(action="Будет изменена")
+        deleted = self.create_habit(action="Будет удалена")
+        token = self.client.get(self.url).data['next_token']
+
+        updated.action = "Изменена"
+        updated.save()
+        self.client.delete(f'/api/habits/{deleted.id}/')
+        created = self.create_habit(action="Новая")
+
+        response = self.client.get(self.url, {'since': token})
+
+        changes = {change['id']: change for change in response.data['changes']}
+        self.assertNotIn(unchanged.id, changes)
+        self.assertEqual(changes[updated.id]['action'], "Изменена")
+        self.assertEqual(changes[deleted.id], {'id': deleted.id, 'deleted': True})
+        self.assertFalse(changes[created.id]['deleted'])
+
+        # Повторный запрос с новым токеном ничего не возвращает
+        again = self.client.get(self.url, {'since': response.data['next_token']})
+        self.assertEqual(again.data['changes'], [])
+        self.assertEqual(again.data['next_token'], response.data['next_token'])
+
+    @override_settings(HABITS_SYNC_PAGE_SIZE=2)
+    def test_changes_are_paged(self):
+        for number in range(5):
+            self.create_habit(action=f"Привычка {number}")
+        seen = []
+        token = None
+        while True:
+            data = self.client.get(self.url, {'since': token} if token else {}).data
+            seen += [change['id'] for change in data['changes']]
+            token = data['next_token']
+            if not data['has_more']:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_deleted_habit_is_hidden_but_kept_as_tombstone(self):
+        pleasant = self.create_habit(action="Приятная", is_pleasant=True)
+        linked = self.create_habit(action="Полезная", linked_habit=pleasant)
+
+        response = self.client.delete(f'/api/habits/{pleasant.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Habit.objects.filter(id=pleasant.id).exists())
+        self.assertTrue(Habit.all_objects.filter(id=pleasant.id, deleted_at__isnull=False).exists())
+        linked.refresh_from_db()
+        self.assertIsNone(linked.linked_habit)
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(
+            self.client.get(self.url, {'since': 'garbage'}).status_code, status.HTTP_410_GONE)
+        expired = encode_token(timezone.now() - timedelta(days=365), 1)
+        self.assertEqual(
+            self.client.get(self.url, {'since': expired}).status_code, status.HTTP_410_GONE)
+
+    def test_purge_deleted_habits(self):
+        old = self.create_habit()
+        recent = self.create_habit()
+        Habit.all_objects.filter(id=old.id).update(deleted_at=timezone.now() - timedelta(days=60))
+        recent.soft_delete()
+
+        self.assertEqual(purge_deleted_habits(), 1)
+        self.assertFalse(Habit.all_objects.filter(id=old.id).exists())
+        self.assertTrue(Habit.all_objects.filter(id=recent.id).exists())
+
+
+class HabitCompletionTest(APITestCase):
+    """
+    Журнал выполнения и счетчики серий на привычке
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user, action="Зарядка", time="07:00", place="Дом", duration=60)
+        self.today = timezone.localdate()
+
+    def test_counters_are_updated_incrementally(self):
+        for days_ago in (5, 4, 3, 1):
+            self.habit.mark_done(self.today - timedelta(days=days_ago))
+
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.completions.count(), 4)
+        self.assertEqual(self.habit.completion_count, 4)
+        self.assertEqual(self.habit.current_streak, 1)
+        self.assertEqual(self.habit.longest_streak, 3)
+        self.assertEqual(self.habit.first_completed_on, self.today - timedelta(days=5))
+        self.assertEqual(self.habit.completion_rate(self.today), round(4 / 6, 3))
+
+    def test_streak_respects_frequency(self):
+        self.habit.frequency = 3
+        self.habit.save()
+        for days_ago in (9, 6, 3):
+            self.habit.mark_done(self.today - timedelta(days=days_ago))
+
+        self.assertEqual(self.habit.active_streak(self.today), 3)
+        # Пропущен цикл — серия прервана без обращения к истории
+        with self.assertNumQueries(0):
+            self.assertEqual(self.habit.active_streak(self.today + timedelta(days=1)), 0)
+
+    def test_same_day_is_idempotent_and_past_is_rejected(self):
+        _completion, created = self.habit.mark_done()
+        self.assertTrue(created)
+        _completion, created = self.habit.mark_done()
+        self.assertFalse(created)
+        self.assertEqual(self.habit.completion_count, 1)
+        with self.assertRaises(ValidationError):
+            self.habit.mark_done(self.today - timedelta(days=1))
+
+    def test_complete_endpoint(self):
+        url = f'/api/habits/{self.habit.id}/complete/'
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['current_streak'], 1)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+
+        future = {'date': str(self.today + timedelta(days=1))}
+        self.assertEqual(self.client.post(url, future).status_code, status.HTTP_400_BAD_REQUEST)
+        past = {'date': str(self.today - timedelta(days=1))}
+        self.assertEqual(self.client.post(url, past).status_code, status.HTTP_400_BAD_REQUEST)
+
+        data = self.client.get(f'/api/habits/{self.habit.id}/').data
+        self.assertEqual(data['completion_count'], 1)
+        self.assertEqual(data['current_streak'], 1)
+
+    def test_today_is_in_owner_timezone(self):
+        # 12:00 UTC: в Париже (часовой пояс сервера) 10 марта, у владельца уже 11 марта
+        self.user.timezone = 'Pacific/Kiritimati'
+        self.user.save()
+        self.habit.refresh_from_db()
+        url = f'/api/habits/{self.habit.id}/complete/'
+        owner_today = date(2026, 3, 11)
+
+        with patch('django.utils.timezone.now', return_value=datetime(2026, 3, 10, 12, tzinfo=dt_timezone.utc)):
+            response = self.client.post(url, {'date': str(owner_today)})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.habit.mark_done()[0].date, owner_today)
+            self.habit.refresh_from_db()
+            self.assertEqual(self.habit.active_streak(), 1)
+            self.assertEqual(self.habit.completion_rate(), 1.0)
+            future = {'date': str(owner_today + timedelta(days=1))}
+            self.assertEqual(self.client.post(url, future).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cannot_complete_foreign_habit(self):
+        other = CustomUser.objects.create_user(email='other@example.com', password='password123')
+        self.client.force_authenticate(user=other)
+
+        response = self.client.post(f'/api/habits/{self.habit.id}/complete/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(self.habit.completions.exists())
+
+
+class HabitStatsTest(APITestCase):
+    """
+    Векторная статистика по журналу выполнения
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.localdate()
+        self.daily = self.create_habit([9, 8, 7, 5, 4, 1, 0], frequency=1)
+        self.every_three_days = self.create_habit([9, 6, 1], frequency=3, is_public=True)
+        self.never = self.create_habit([], frequency=2)
+
+    def create_habit(self, days_ago, **fields):
+        habit = Habit.objects.create(
+            user=self.user, action="Зарядка", time="07:00", place="Дом", duration=60, **fields)
+        HabitCompletion.objects.bulk_create(
+            HabitCompletion(habit=habit, date=self.today - timedelta(days=days)) for days in days_ago)
+        return habit
+
+    def test_compute_stats(self):
+        habits = [(habit.id, habit.frequency)
+                  for habit in (self.daily, self.every_three_days, self.never)]
+
+        with self.assertNumQueries(1):
+            stats = compute_stats(habits, self.today - timedelta(days=9), self.today)
+
+        self.assertEqual(stats['completion_count'].tolist(), [7, 3, 0])
+        self.assertEqual(stats['completion_rate'].tolist(), [0.7, 0.75, 0.0])
+        self.assertEqual(stats['adherence'].tolist(), [0.7, 0.75, 0.0])
+        self.assertEqual(stats['longest_streak'].tolist(), [3, 2, 0])
+        self.assertEqual(stats['current_streak'].tolist(), [2, 1, 0])
+        weekdays = [0] * 7
+        for days in [9, 8, 7, 5, 4, 1, 0]:
+            weekdays[(self.today - timedelta(days=days)).weekday()] += 1
+        self.assertEqual(stats['weekdays'][0].tolist(), weekdays)
+        self.assertEqual(stats['weekdays'][2].tolist(), [0] * 7)
+
+    def test_period_limits_history(self):
+        stats = compute_stats([(self.daily.id, 1)], self.today - timedelta(days=4), self.today)
+
+        self.assertEqual(stats['completion_count'].tolist(), [3])
+        self.assertEqual(stats['longest_streak'].tolist(), [2])
+
+    def test_stats_endpoint(self):
+        response = self.client.get('/api/habits/stats/', {'days': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        by_id = {item['id']: item for item in response.data['habits']}
+        self.assertEqual(by_id[self.daily.id]['longest_streak'], 3)
+        self.assertEqual(by_id[self.every_three_days.id]['completion_rate'], 0.75)
+        self.assertEqual(response.data['summary']['completion_count'], 10)
+
+        self.assertEqual(
+            self.client.get('/api/habits/stats/', {'days': 'year'}).status_code,
+            status.HTTP_400_BAD_REQUEST)
+
+
+class HabitDailyRollupTest(APITestCase):
+    """
+    Дневные сводки и их инкрементальное обновление
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.localdate()
+        reminder = timezone.make_aware(
+            timezone.datetime.combine(self.today + timedelta(days=1), timezone.datetime.min.time()))
+        self.daily = Habit.objects.create(
+            user=self.user, action="Зарядка", time="07:00", place="Парк", duration=60,
+            is_public=True, next_reminder=reminder + timedelta(hours=7))
+        self.every_other_day = Habit.objects.create(
+            user=self.user, action="Чтение", time="21:00", place="Дом", duration=60,
+            frequency=2, next_reminder=reminder + timedelta(hours=21))
+        Habit.objects.update(created_at=timezone.now() - timedelta(days=5))
+        for days in (3, 1):
+            self.daily.mark_done(self.today - timedelta(days=days))
+        HabitCompletion.objects.update(completed_at=timezone.now() - timedelta(hours=1))
+
+    def user_rows(self):
+        return {
+            (self.today - row.date).days: (row.due_count, row.completed_count)
+            for row in UserDailyStats.objects.filter(user=self.user)
+        }
+
+    def test_first_run_closes_history(self):
+        self.assertEqual(run_rollup(), {'closed': 5, 'refreshed': 0})
+
+        self.assertEqual(self.user_rows(), {
+            5: (2, 0), 4: (1, 0), 3: (2, 1), 2: (1, 0), 1: (2, 1)})
+        self.assertEqual(
+            list(PlaceDailyStats.objects.order_by().values_list('place', flat=True).distinct()), ['Парк'])
+        self.assertEqual(PlaceDailyStats.objects.aggregate(n=Count('id'))['n'], 5)
+
+    def test_next_runs_touch_only_changed_days(self):
+        run_rollup()
+        # Отметка задним числом и отметка за сегодня
+        HabitCompletion.objects.create(habit=self.every_other_day, date=self.today - timedelta(days=3))
+        self.daily.mark_done(self.today)
+
+        result = run_rollup(timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(result, {'closed': 0, 'refreshed': 2})
+        rows = self.user_rows()
+        self.assertEqual(rows[3], (2, 2))
+        self.assertEqual(rows[0], (0, 1))
+
+        # На следующий день закрывается только вчерашний (сегодняшний) день
+        self.assertEqual(run_rollup(timezone.now() + timedelta(days=1)), {'closed': 1, 'refreshed': 0})
+        self.assertEqual(self.user_rows()[0], (1, 1))
+
+    def test_due_days_follow_owner_timezone(self):
+        """Дни по расписанию считаются по местной дате владельца, а не сервера."""
+        owner = CustomUser.objects.create_user(
+            email='ny@example.com', password='password123', timezone='America/New_York')
+        # 21:00 в Нью-Йорке — это уже следующий день в Париже
+        reminder = datetime.combine(self.today + timedelta(days=1), time(21), ZoneInfo('America/New_York'))
+        Habit.objects.create(
+            user=owner, action="Чтение", time="21:00", place="Дом", duration=60,
+            frequency=2, next_reminder=reminder)
+        Habit.objects.filter(user=owner).update(created_at=timezone.now() - timedelta(days=5))
+
+        run_rollup()
+
+        rows = {
+            (self.today - row.date).days: row.due_count
+            for row in UserDailyStats.objects.filter(user=owner)
+        }
+        self.assertEqual({days: rows.get(days) for days in range(1, 5)}, {1: 1, 2: None, 3: 1, 4: None})
+
+    def test_closed_days_are_not_recomputed(self):
+        """Смена периодичности не переписывает уже закрытые дни."""
+        run_rollup()
+        closed = self.user_rows()
+        Habit.objects.filter(id=self.daily.id).update(frequency=3)
+
+        run_rollup(timezone.now() + timedelta(days=1))
+
+        rows = self.user_rows()
+        self.assertEqual({days: rows[days] for days in closed}, closed)
+
+    def test_stats_endpoint_reads_rollups(self):
+        run_rollup()
+
+        with self.assertNumQueries(4):
+            public = self.client.get('/api/habits/stats/', {'days': 10, 'scope': 'public'}).data
+        self.assertEqual(public['places'], [{'place': 'Парк', 'due_count': 5, 'completed_count': 2}])
+        self.assertEqual(len(public['daily']), 5)
+        self.assertEqual(public['summary']['habits'], 1)
+        self.assertEqual(public['summary']['completion_count'], 2)
+        self.assertEqual(public['summary']['longest_streak'], 1)
+        self.assertNotIn('habits', public)
+
+        data = self.client.get('/api/habits/stats/', {'days': 10}).data
+        self.assertEqual(
+            [(row['due_count'], row['completed_count']) for row in data['daily']],
+            [(2, 0), (1, 0), (2, 1), (1, 0), (2, 1)])
+
+    def test_habit_stats_read_monthly_rollups(self):
+        run_rollup()
+
+        expected = {}
+        for days in (3, 1):
+            day = self.today - timedelta(days=days)
+            expected[day.replace(day=1)] = expected.get(day.replace(day=1), 0) | 1 << (day.day - 1)
+        self.assertEqual(
+            dict(HabitMonthlyStats.objects.filter(habit=self.daily).values_list('month', 'completed_days')),
+            expected)
+
+        # Отметка после обновления сводок читается из журнала и не считается дважды
+        self.daily.mark_done(self.today)
+        refresh_habit_months([self.today])
+        # Прошлые дни берутся из сводок, а не из журнала
+        HabitCompletion.objects.filter(date__lt=self.today).delete()
+
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/habits/stats/', {'days': 10}).data
+        by_id = {item['id']: item for item in data['habits']}
+        self.assertEqual(by_id[self.daily.id]['completion_count'], 3)
+        self.assertEqual(by_id[self.daily.id]['current_streak'], 2)
+        self.assertEqual(by_id[self.every_other_day.id]['completion_count'], 0)
+
+
+class HabitScheduleTest(APITestCase):
+    """
+    Расписание напоминаний в часовом поясе пользователя
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123', timezone='Asia/Tokyo')
+
+    def test_next_occurrences(self):
+        after = datetime(2026, 3, 28, 22, 0, tzinfo=dt_timezone.utc)
+
+        reminders = next_occurrences(
+            [time(7), time(7), time(21), time(2, 30)],
+            [1, 1, 3, 1],
+            ['Europe/Paris', 'Asia/Tokyo', 'America/New_York', 'Europe/Paris'],
+            [None, None, date(2026, 3, 20), date(2026, 3, 29)],
+            after)
+
+        self.assertEqual(reminders, [
+            # Первое утро после перехода Парижа на летнее время
+            datetime(2026, 3, 29, 5, 0, tzinfo=dt_timezone.utc),
+            # В Токио 07:00 уже наступило — следующий день
+            datetime(2026, 3, 29, 22, 0, tzinfo=dt_timezone.utc),
+            # Цикл в 3 дня от 20 марта: 23, 26, 29 марта
+            datetime(2026, 3, 30, 1, 0, tzinfo=dt_timezone.utc),
+            # 02:30 в Париже в ночь перехода не существует — сдвигается на 03:30
+            datetime(2026, 3, 29, 1, 30, tzinfo=dt_timezone.utc),
+        ])
+
+    def test_invalid_frequency_does_not_divide_by_zero(self):
+        after = datetime(2026, 3, 28, 22, 0, tzinfo=dt_timezone.utc)
+        with np.errstate(all='raise'):
+            reminders = next_occurrences([time(7)], [0], ['Europe/Paris'], [None], after)
+        self.assertEqual(reminders, [datetime(2026, 3, 29, 5, 0, tzinfo=dt_timezone.utc)])
+
+    def test_new_habit_is_scheduled_in_user_timezone(self):
+        habit = Habit.objects.create(
+            user=self.user, action="Зарядка", time="07:00", place="Дом", duration=60)
+
+        local = habit.next_reminder.astimezone(ZoneInfo('Asia/Tokyo'))
+        self.assertEqual(local.time(), time(7))
+        self.assertGreater(habit.next_reminder, timezone.now())
+        self.assertLessEqual(habit.next_reminder, timezone.now() + timedelta(days=1))
+
+    def create_habit(self, **fields):
+        return Habit.objects.create(
+            user=self.user, action="Зарядка", time="08:00", place="Дом", duration=60, **fields)
+
+    def local(self, habit):
+        habit.refresh_from_db()
+        return habit.next_reminder.astimezone(ZoneInfo(self.user.timezone))
+
+    def test_time_change_reschedules(self):
+        habit = self.create_habit()
+        self.client.force_authenticate(user=self.user)
+
+        data = {'action': "Зарядка", 'time': '20:00', 'place': "Дом", 'duration': 60, 'reward': "Чай"}
+        response = self.client.put(f'/api/habits/{habit.id}/', data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.local(habit).time(), time(20))
+        self.assertLessEqual(habit.next_reminder, timezone.now() + timedelta(days=1))
+
+    def test_frequency_change_reschedules(self):
+        habit = self.create_habit(frequency=1)
+        first = habit.next_reminder
+        # Напоминание через неделю: при переходе на ежедневное расписание оно должно приблизиться
+        Habit.objects.filter(id=habit.id).update(next_reminder=first + timedelta(days=7))
+        habit.refresh_from_db()
+
+        habit.frequency = 2
+        habit.save(update_fields=['frequency'])
+
+        self.assertLess(self.local(habit), first.astimezone(ZoneInfo('Asia/Tokyo')) + timedelta(days=7))
+        self.assertEqual(self.local(habit).time(), time(8))
+
+    def test_unrelated_change_keeps_reminder(self):
+        habit = self.create_habit()
+        reminder = habit.next_reminder + timedelta(days=1)
+        Habit.objects.filter(id=habit.id).update(next_reminder=reminder)
+        habit.refresh_from_db()
+
+        habit.place = "Парк"
+        habit.save()
+
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_reminder, reminder)
+
+    def test_bulk_time_change_reschedules(self):
+        habits = [self.create_habit(), self.create_habit()]
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.put('/api/habits/bulk/', [
+            {'id': habits[0].id, 'action': "Зарядка", 'time': '21:15', 'place': "Дом", 'duration': 60},
+            {'id': habits[1].id, 'action': "Бег", 'time': '08:00', 'place': "Дом", 'duration': 60},
+        ], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.local(habits[0]).time(), time(21, 15))
+        self.assertEqual(self.local(habits[1]).time(), time(8))
+
+    def test_timezone_change_reschedules(self):
+        habit = self.create_habit()
+        user = CustomUser.objects.get(id=self.user.id)
+
+        with patch('habits.models.publish_reminder_changes') as mock_publish:
+            user.timezone = 'Europe/Paris'
+            user.save()
+
+        habit.refresh_from_db()
+        self.assertEqual(timezone.localtime(habit.next_reminder, ZoneInfo('Europe/Paris')).time(), time(8))
+        mock_publish.assert_called_once()
+        self.assertEqual(list(mock_publish.call_args.args[0]), [(habit.id, habit.next_reminder)])
+
+    def test_backfill_fixes_drifted_reminders(self):
+        tokyo = ZoneInfo('Asia/Tokyo')
+        # Напоминание уехало на 13:37; цикл раз в неделю сохраняет день
+        day = timezone.localtime(timezone.now(), tokyo).date() + timedelta(days=3)
+        drifted = [
+            Habit.objects.create(
+                user=self.user, action="Зарядка", time="07:00", place="Дом", duration=60,
+                frequency=7, next_reminder=datetime.combine(day, time(13, 37), tzinfo=tokyo))
+            for _ in range(3)
+        ]
+
+        call_command('backfill_next_reminders', batch_size=2, stdout=StringIO())
+
+        for habit in drifted:
+            habit.refresh_from_db()
+            self.assertEqual(habit.next_reminder, datetime.combine(day, time(7), tzinfo=tokyo))
+
+
+class HabitQueryBudgetTest(APITestCase):
+    """
+    Учет запросов к базе по эндпоинтам (config.middleware)
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123')
+        self.habit = Habit.objects.create(
+            user=self.user, action="Зарядка", time="07:00", place="Дом", duration=60)
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.client.get('/api/habits/')
+        self.assertEqual(int(response['X-DB-Queries']), 2)
+        self.assertGreaterEqual(float(response['X-DB-Time-Ms']), 0)
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+
+    @override_settings(DEBUG=False)
+    def test_no_headers_without_debug(self):
+        response = self.client.get('/api/habits/')
+        self.assertNotIn('X-DB-Queries', response)
+
+    def test_in_lists_share_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'))
+
+    def test_duplicates_and_budget_are_logged(self):
+        stats = []
+
+        def receiver(sender, **kwargs):
+            stats.append(kwargs['stats'])
+
+        query_stats_recorded.connect(receiver)
+        self.addCleanup(query_stats_recorded.disconnect, receiver)
+        with override_settings(QUERY_BUDGETS={'habit-list': 1}, QUERY_DUPLICATE_THRESHOLD=2), \
+                patch('habits.views.HabitViewSet.get_queryset',
+                      lambda view: [Habit.objects.select_related('user').get(id=self.habit.id)
+                                    for _ in range(2)]), \
+                self.assertLogs('config.middleware', 'WARNING') as logs:
+            self.client.get('/api/habits/')
+        self.assertEqual(stats[0]['view'], 'habit-list')
+        self.assertEqual(list(stats[0]['duplicates'].values()), [2])
+        self.assertIn('budget is 1', logs.output[0])
+        self.assertIn('possible N+1', logs.output[1])
+
+    def test_detail_endpoints_do_not_refetch(self):
+        url = f'/api/habits/{self.habit.id}/'
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(4):
+            self.client.delete(url)
+        self.assertTrue(Habit.all_objects.get(id=self.habit.id).deleted_at)
+
+    def test_foreign_habit_is_not_found(self):
+        other = CustomUser.objects.create_user(email='other@example.com', password='password123')
+        self.client.force_authenticate(user=other)
+        url = f'/api/habits/{self.habit.id}/'
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.patch(url, {'place': 'Парк'}).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MetricsEndpointTest(APITestCase):
+    """
+    Метрики Prometheus по HTTP-запросам и эндпоинт /metrics
+    """
+    def test_request_metrics_are_exported(self):
+        user = CustomUser.objects.create_user(email='test@example.com', password='password123')
+        self.client.force_authenticate(user=user)
+        labels = {'route': 'habit-list', 'method': 'GET', 'status': '200'}
+        before = REGISTRY.get_sample_value('habits_http_request_duration_seconds_count', labels) or 0
+
+        self.client.get('/api/habits/')
+
+        self.assertEqual(
+            REGISTRY.get_sample_value('habits_http_request_duration_seconds_count', labels), before + 1)
+        self.assertGreaterEqual(
+            REGISTRY.get_sample_value('habits_http_db_queries_count', {'route': 'habit-list'}), 1)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('text/plain', response['Content-Type'])
+        self.assertIn(b'habits_http_request_duration_seconds_bucket', response.content)
+
+    def test_metrics_are_internal_only(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            wrong = self.client.get(
+                '/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer other')
+            allowed = self.client.get(
+                '/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(wrong.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(allowed.status_code, status.HTTP_200_OK)
+
+    def test_empty_env_values_mean_defaults(self):
+        """Пустые значения из .env.example не ломают запуск и не меняют поведение по умолчанию."""
+        code = (
+            'import runpy, django; django.setup(); '
+            'from django.conf import settings; '
+            'from prometheus_client import values; '
+            'from config import metrics; '
+            'print(settings.METRICS_ALLOWED_IPS, settings.USER_IMPORT_DIR.endswith("imports"), '
+            'settings.CELERY_WORKER_CONCURRENCY, values.ValueClass is values.MutexValue, '
+            'runpy.run_path("config/gunicorn.conf.py")["workers"])'
+        )
+        empty = dict.fromkeys([
+            'PROMETHEUS_MULTIPROC_DIR', 'METRICS_ALLOWED_IPS', 'GUNICORN_WORKERS',
+            'USER_IMPORT_DIR', 'CELERY_WORKER_CONCURRENCY'], '')
+        result = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+            env={**os.environ, **empty, 'DJANGO_SETTINGS_MODULE': 'config.settings'})
+        self.assertEqual(result.stdout.strip(), "['127.0.0.1', '::1'] True 8 True 3")
+
+
+class HabitSeedCommandTest(TestCase):
+    """
+    Генерация синтетических данных через COPY (seed_habits)
+    """
+    def test_seed_users_and_habits(self):
+        out = StringIO()
+        call_command('seed_habits', users=25, habits_per_user=4, batch_size=10, seed=1, stdout=out)
+
+        users = CustomUser.objects.filter(email__endswith='@seed.example.com')
+        self.assertEqual(users.count(), 25)
+        habits = Habit.objects.filter(user__in=users)
+        self.assertIn(f'привычек: {habits.count()}', out.getvalue())
+        self.assertGreater(habits.count(), 0)
+        # Те же правила, что в Habit.clean
+        self.assertFalse(habits.filter(is_pleasant=True).exclude(linked_habit=None, reward=None).exists())
+        self.assertFalse(habits.exclude(linked_habit=None).exclude(reward=None).exists())
+        self.assertFalse(habits.exclude(linked_habit=None).exclude(linked_habit__is_pleasant=True).exists())
+        self.assertFalse(habits.exclude(linked_habit=None).exclude(linked_habit__user=F('user')).exists())
+        self.assertTrue(habits.exclude(linked_habit=None).exists())
+        self.assertFalse(habits.filter(next_reminder__lte=timezone.now()).exists())
+        self.assertFalse(habits.filter(created_at__lt=F('user__date_joined')).exists())
+        user = users.first()
+        self.assertTrue(user.check_password('password123'))
+
+    def test_orm_inserts_after_seeding_get_fresh_ids(self):
+        call_command('seed_habits', users=5, seed=2, stdout=StringIO())
+
+        user = CustomUser.objects.create_user(email='new@example.com', password='password123')
+        habit = Habit.objects.create(user=user, action="Зарядка", time="07:00", place="Дом", duration=60)
+        self.assertGreater(user.id, CustomUser.objects.exclude(id=user.id).aggregate(Max('id'))['id__max'])
+        self.assertGreater(habit.id, Habit.objects.exclude(id=habit.id).aggregate(Max('id'))['id__max'])
+
+    def test_same_seed_gives_same_data(self):
+        call_command('seed_habits', users=5, seed=3, email_domain='a.example.com', stdout=StringIO())
+        call_command('seed_habits', users=5, seed=3, email_domain='b.example.com', stdout=StringIO())
+
+        def snapshot(domain):
+            return list(Habit.objects.filter(user__email__endswith=domain).order_by('id').values_list(
+                'action', 'time', 'frequency', 'is_public', 'is_pleasant'))
+        self.assertEqual(snapshot('@a.example.com'), snapshot('@b.example.com'))
+
+
+class HabitExportTest(APITestCase):
+    """
+    Потоковая выгрузка привычек в CSV и NDJSON
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='test@example.com', password='password123')
+        other = CustomUser.objects.create_user(email='other@example.com', password='password123')
+        self.pleasant = Habit.objects.create(
+            user=self.user, action="Кофе", time="08:00", place="Кафе", duration=30, is_pleasant=True)
+        self.habits = [self.pleasant] + [
+            Habit.objects.create(
+                user=self.user, action=f"Привычка {number}", time="07:00", place="Дом", duration=60,
+                linked_habit=self.pleasant)
+            for number in range(3)
+        ]
+        Habit.objects.create(user=other, action="Чужая", time="07:00", place="Дом", duration=60)
+        Habit.objects.create(
+            user=self.user, action="Удаленная", time="07:00", place="Дом", duration=60).soft_delete()
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(HABITS_EXPORT_CHUNK_SIZE=1)
+    def test_csv_export(self):
+        response = self.client.get('/api/habits/export/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('habits.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual([int(row['id']) for row in rows], [habit.id for habit in self.habits])
+        self.assertEqual(rows[0]['linked_habit_id'], '')
+        self.assertEqual(rows[1]['linked_habit_id'], str(self.pleasant.id))
+        self.assertEqual(rows[1]['action'], "Привычка 0")
+
+    def test_ndjson_export(self):
+        response = self.client.get('/api/habits/export/?output=ndjson')
+
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [habit.id for habit in self.habits])
+        self.assertEqual(rows[0]['time'], '08:00:00')
+        self.assertEqual(
+            datetime.fromisoformat(rows[0]['next_reminder']),
+            Habit.objects.get(id=self.pleasant.id).next_reminder)
+
+    @override_settings(HABITS_EXPORT_CHUNK_SIZE=1)
+    def test_streamed_queries_are_counted(self):
+        stats = []
+
+        def receiver(sender, **kwargs):
+            stats.append(kwargs['stats'])
+
+        query_stats_recorded.connect(receiver)
+        self.addCleanup(query_stats_recorded.disconnect, receiver)
+        with override_settings(QUERY_BUDGETS={'habit-export': 0}), \
+                self.assertLogs('config.middleware', 'WARNING') as logs:
+            response = self.client.get('/api/habits/export/')
+            # Выгрузка читает базу при отдаче тела, а не во view
+            self.assertEqual(stats, [])
+            self.read(response)
+
+        self.assertEqual(stats[0]['view'], 'habit-export')
+        self.assertGreaterEqual(stats[0]['queries'], 1)
+        self.assertIn('budget is 0', logs.output[0])
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get('/api/habits/export/?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_habits', output_format='ndjson', chunk_size=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'habits.csv')
+            call_command('export_habits', user=self.user.id, output=path, stderr=StringIO())
+            with open(path, encoding='utf-8', newline='') as export:
+                rows = list(csv.DictReader(export))
+        self.assertEqual([int(row['id']) for row in rows], [habit.id for habit in self.habits])
@@ -1,10 +1,23 @@
 from rest_framework import viewsets, permissions
+from django.core.exceptions import ValidationError
 from .models import Habit
-from .serializers import HabitSerializer
+from .serializers import HabitCompletionSerializer, HabitSerializer
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.core.cache import cache
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from .cache import public_habits_cache_key
+from .export import EXPORT_FORMATS, export_rows
+from .pagination import HabitCursorPagination, PublicHabitCursorPagination
+from .rollups import public_rollup, user_daily_series
+from .stats import habits_stats
+from .sync import InvalidSyncToken, changes_since
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class HabitViewSet(viewsets.ModelViewSet):
@@ -13,38 +26,193 @@ class HabitViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        # Пользователь видит только свои привычки
-        return Habit.objects.filter(user=self.request.user)
+        # Пользователь видит только свои привычки; владелец нужен для даты
+        # «сегодня» в его часовом поясе (серии, процент выполнения)
+        return Habit.objects.filter(user=self.request.user).select_related('user')
+
+    @property
+    def paginator(self):
+        # Клиент может выбрать курсорную пагинацию вместо постраничной
+        if not hasattr(self, '_paginator') and self.action == 'list':
+            if HabitCursorPagination.is_requested(self.request):
+                self._paginator = HabitCursorPagination()
+        return super().paginator
 
     def perform_create(self, serializer):
-        print(f'Creating habit for user: {self.request.user}')
+        logger.info(f'Creating habit for user: {self.request.user.id}')
         serializer.save(user=self.request.user)
 
     def perform_update(self, serializer):
-        habit = serializer.instance
-        if habit.user != self.request.user:
-            return Response({"detail": "Вы не можете редактировать чужие привычки."}, status=status.HTTP_403_FORBIDDEN)
-        print(f'Updating habit for user: {self.request.user}')
+        # Чужие привычки сюда не попадают: get_object ищет в get_queryset
+        logger.info(f'Updating habit {serializer.instance.id} for user: {self.request.user.id}')
         serializer.save(user=self.request.user)
 
     def perform_destroy(self, instance):
-        habit = get_object_or_404(Habit, id=instance.id)
-        if habit.user != self.request.user:
-            return Response({"detail": "Вы не можете удалять чужие привычки."}, status=status.HTTP_403_FORBIDDEN)
-        habit.delete()
-
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if instance.user != request.user:
-            return Response({"detail": "Вы не можете просматривать чужие привычки."}, status=status.HTTP_403_FORBIDDEN)
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
-
-    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+        instance.soft_delete()
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """
+        Отметка выполнения привычки за день (поле date, по умолчанию сегодня).
+        Повторная отметка за тот же день не меняет счетчики.
+        """
+        habit = self.get_object()
+        serializer = HabitCompletionSerializer(data=request.data, context={'habit': habit})
+        serializer.is_valid(raise_exception=True)
+        try:
+            completion, created = habit.mark_done(serializer.validated_data.get('date'))
+        except ValidationError as e:
+            return Response({"detail": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'date': completion.date,
+            'created': created,
+            'current_streak': habit.active_streak(),
+            'longest_streak': habit.longest_streak,
+            'completion_count': habit.completion_count,
+            'completion_rate': habit.completion_rate(),
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny],
+            pagination_class=PublicHabitCursorPagination)
     def public(self, request):
         """
         Эндпоинт для получения списка публичных привычек.
+        Страницы отдаются по курсору и кешируются до изменения публичных привычек.
+        """
+        cursor = request.query_params.get(self.paginator.cursor_query_param)
+        if cursor:
+            # Невалидный курсор отклоняется (404) до обращения к кешу
+            self.paginator.decode_cursor(request)
+        cache_key = public_habits_cache_key(cursor)
+        data = cache.get(cache_key)
+        if data is None:
+            public_habits = Habit.objects.filter(is_public=True).select_related('user')
+            page = self.paginate_queryset(public_habits)
+            serializer = self.get_serializer(page, many=True)
+            data = self.get_paginated_response(serializer.data).data
+            cache.set(cache_key, data, settings.PUBLIC_HABITS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Статистика выполнения за последние ?days= дней: процент выполнения,
+        соблюдение периодичности, серии и распределение по дням недели
+        по каждой своей привычке, а также запланировано/выполнено по дням.
+        С ?scope=public — сводка по всем публичным привычкам, в том числе
+        по дням и местам. Данные читаются из сводок rollup_daily_stats,
+        а из журнала выполнения — только отметки после их обновления.
+        """
+        try:
+            days = int(request.query_params.get('days', settings.HABITS_STATS_DAYS))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= settings.HABITS_STATS_MAX_DAYS:
+            return Response(
+                {"detail": f"days должно быть от 1 до {settings.HABITS_STATS_MAX_DAYS}."},
+                status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('scope') == 'public':
+            data = habits_stats(Habit.objects.filter(is_public=True), days, per_habit=False)
+            data.update(public_rollup(data['start'], data['end']))
+            return Response(data)
+        data = habits_stats(self.get_queryset(), days)
+        data['daily'] = user_daily_series(request.user, data['start'], data['end'])
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
         """
-        public_habits = Habit.objects.filter(is_public=True)
-        serializer = self.get_serializer(public_habits, many=True)
-        return Response(serializer.data)
+        Лента изменений для синхронизации клиентов: привычки, созданные,
+        измененные или удаленные после токена ?since=. Без токена — все привычки.
+        """
+        try:
+            habits, token, has_more = changes_since(request.user, request.query_params.get('since'))
+        except InvalidSyncToken as e:
+            return Response({"detail": str(e)}, status=status.HTTP_410_GONE)
+        changes = []
+        for habit in habits:
+            if habit.deleted_at:
+                changes.append({'id': habit.id, 'deleted': True})
+            else:
+                changes.append({**self.get_serializer(habit).data, 'deleted': False})
+        return Response({
+            'changes': changes,
+            'next_token': token or request.query_params.get('since'),
+            'has_more': has_more,
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Выгрузка всех своих привычек одним потоком: ?output=csv (по умолчанию)
+        или ?output=ndjson. Строки читаются серверным курсором пачками
+        по HABITS_EXPORT_CHUNK_SIZE и сразу отдаются клиенту, поэтому память
+        не зависит от числа привычек. (Параметр format занят DRF.)
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"output должен быть одним из: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST)
+        lines, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(lines(export_rows(self.get_queryset())), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="habits.{output}"'
+        return response
+
+    @action(detail=False, methods=['post', 'put', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Массовые операции с привычками: POST — создание, PUT — обновление
+        (каждый элемент с id), DELETE — удаление (список id).
+        Все связанные и изменяемые привычки пользователя загружаются одним
+        запросом; ошибки возвращаются по каждому элементу, и при любой ошибке
+        ничего не записывается.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Ожидается список привычек."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.HABITS_BULK_MAX_ITEMS:
+            return Response(
+                {"detail": f"Не больше {settings.HABITS_BULK_MAX_ITEMS} привычек за запрос."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'DELETE':
+            return self.bulk_destroy(items)
+
+        ids = set()
+        for item in items:
+            if isinstance(item, dict):
+                for key in ('id', 'linked_habit'):
+                    if isinstance(item.get(key), int):
+                        ids.add(item[key])
+        # Проверка принадлежности одним запросом: чужие id просто не найдутся
+        owned = Habit.objects.filter(user=request.user).select_related('user').in_bulk(ids)
+
+        context = self.get_serializer_context()
+        context['linked_habits'] = owned
+        instance = None
+        if request.method == 'PUT':
+            instance = {item['id']: owned[item['id']] for item in items
+                        if isinstance(item, dict) and item.get('id') in owned}
+        serializer = self.get_serializer(instance, data=items, many=True, context=context)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, dict):
+                # Новые версии DRF отдают ошибки словарем {индекс: ошибки}
+                errors = [errors.get(index, {}) for index in range(len(items))]
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            serializer.save(user=request.user)
+        response_status = status.HTTP_201_CREATED if instance is None else status.HTTP_200_OK
+        return Response(serializer.data, status=response_status)
+
+    def bulk_destroy(self, ids):
+        owned = set(
+            Habit.objects.filter(user=self.request.user, id__in=[i for i in ids if isinstance(i, int)])
+            .values_list('id', flat=True))
+        errors = [{} if habit_id in owned else {'id': ['Привычка не найдена.']} for habit_id in ids]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            Habit.objects.filter(id__in=owned).soft_delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
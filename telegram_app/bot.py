@@ -1,41 +1,142 @@
+from hmac import compare_digest
+from urllib.parse import urlsplit
+import asyncio
 import logging
 from telegram import Update
-from telegram.ext import Application, CommandHandler
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from users.models import CustomUser
+from habits.models import Habit
+from .linking import link_chat
+from .messages import DONE_CALLBACK_PREFIX
 
 # Логирование
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
 
 # Функция для команды /start
 async def start(update: Update, context):
     chat_id = update.message.chat_id
     telegram_username = update.message.from_user.username
 
-    # Сохраняем chat_id
-    # Найдите пользователя по Telegram username
-    user = CustomUser.objects.filter(
-        telegram_username=telegram_username).first()
-    if user:
-        user.telegram_chat_id = chat_id
-        user.save()
-        await update.message.reply_text(f"Привет, {user.email}! Ваш Telegram-чат ID сохранен.")
+    # Сохраняем chat_id пользователю с таким Telegram username
+    email = await link_chat(telegram_username, chat_id)
+    if email:
+        await update.message.reply_text(f"Привет, {email}! Ваш Telegram-чат ID сохранен.")
     else:
         await update.message.reply_text("Пользователь с таким Telegram username не найден.")
 
 
-# Настройка бота
-async def setup_bot():
-    # Получаем токен бота из настроек
-    token = settings.TELEGRAM_BOT_TOKEN
+def complete_from_chat(habit_id, chat_id):
+    """
+    Отмечает выполнение привычки, если она принадлежит владельцу чата
+    (день — сегодня в часовом поясе владельца).
+    Возвращает привычку с обновленными счетчиками или None.
+    """
+    habit = Habit.objects.select_related('user').filter(
+        pk=habit_id, user__telegram_chat_id=str(chat_id)).first()
+    if habit is None:
+        return None
+    habit.mark_done()
+    return habit
+
 
-    # Настраиваем приложение бота
-    application = Application.builder().token(token).build()
+# Кнопка "Выполнено" под напоминанием
+async def done(update: Update, context):
+    query = update.callback_query
+    habit_id = int(query.data.removeprefix(DONE_CALLBACK_PREFIX))
+
+    # Транзакция с блокировкой строки — синхронный ORM в отдельном потоке
+    habit = await sync_to_async(complete_from_chat)(habit_id, query.message.chat_id)
+    if habit is None:
+        await query.answer("Привычка не найдена.")
+    else:
+        await query.answer(f"Отмечено! Серия: {habit.active_streak()}")
+
+
+# Настройка бота
+def build_application(webhook=False):
+    """
+    Приложение бота с обработчиками. Обработчики выполняются конкурентно;
+    в режиме вебхука встроенный Updater не нужен — обновления кладет
+    в очередь aiohttp-сервер.
+    """
+    builder = (
+        Application.builder()
+        .token(settings.TELEGRAM_BOT_TOKEN)
+        .base_url(settings.TELEGRAM_API_BASE_URL)
+        .concurrent_updates(True)
+    )
+    if webhook:
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Обработчик для команды /start
     application.add_handler(CommandHandler("start", start))
+    # Обработчик кнопок "Выполнено" под напоминаниями
+    application.add_handler(CallbackQueryHandler(done, pattern=rf'^{DONE_CALLBACK_PREFIX}\d+$'))
+    return application
+
+
+def run_polling():
+    """Запуск бота в режиме polling (запрос обновлений)."""
+    application = build_application()
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+def create_webhook_app(application, path, secret_token):
+    """
+    aiohttp-приложение, принимающее обновления от Telegram на path.
+    Запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются; без
+    секрета отклоняются все: иначе поддельный /start привязал бы чужой чат к аккаунту.
+    """
+    from aiohttp import web
+
+    async def handle_update(request):
+        header = request.headers.get(SECRET_TOKEN_HEADER, '')
+        if not secret_token or not compare_digest(header.encode(), secret_token.encode()):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return web.Response()
+
+    async def health(request):
+        return web.Response(text='ok')
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get('/healthz', health)
+    return app
+
+
+async def serve_webhook(webhook_url, host, port, secret_token):
+    """
+    Запуск бота в режиме вебхука: регистрирует webhook_url в Telegram
+    и принимает обновления aiohttp-сервером на host:port до остановки процесса.
+    """
+    from aiohttp import web
 
-    # Запуск polling (запрос обновлений) с использованием метода run_polling()
-    await application.run_polling()
+    application = build_application(webhook=True)
+    path = urlsplit(webhook_url).path or '/'
+    runner = web.AppRunner(create_webhook_app(application, path, secret_token))
+    async with application:
+        await application.bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Webhook server listening on {host}:{port}{path}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await application.stop()
@@ -0,0 +1,231 @@
+from datetime import timedelta
+from telegram import Bot, InlineKeyboardMarkup
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+from django.conf import settings
+from config.metrics import TELEGRAM_MESSAGES, TELEGRAM_RATE_LIMITED, TELEGRAM_SEND_DURATION
+import logging
+import asyncio
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Ограничитель скорости отправки с учетом лимитов Telegram:
+    общий лимит сообщений в секунду на бота и минимальный интервал
+    между сообщениями в один чат. Общий лимит считается в памяти процесса,
+    поэтому годится только для одного отправителя (см. RedisRateLimiter).
+    """
+
+    def __init__(self, global_rate, per_chat_interval):
+        self.global_interval = 1.0 / global_rate
+        self.per_chat_interval = per_chat_interval
+        self._global_next = 0.0
+        self._chat_next = {}
+
+    async def pause(self, seconds):
+        """Приостанавливает все отправки (после ответа RetryAfter)."""
+        now = asyncio.get_running_loop().time()
+        self._global_next = max(self._global_next, now + seconds)
+
+    async def reserve(self, delay, max_wait=None):
+        """
+        Резервирует ближайший слот общего лимита не раньше чем через delay
+        секунд и возвращает, сколько секунд до него ждать. Если ждать
+        пришлось бы дольше max_wait, слот не резервируется и возвращается None.
+        """
+        now = asyncio.get_running_loop().time()
+        at = max(now + delay, self._global_next)
+        if max_wait is not None and at - now > max_wait:
+            return None
+        self._global_next = at + self.global_interval
+        return at - now
+
+    async def acquire(self, chat_id, max_wait=None):
+        """
+        Резервирует ближайший свободный слот для чата и ждет его. Возвращает
+        False без ожидания, если слот освободится позже чем через max_wait секунд.
+        """
+        now = asyncio.get_running_loop().time()
+        chat_at = max(now, self._chat_next.get(chat_id, 0.0))
+        wait = await self.reserve(chat_at - now, max_wait)
+        if wait is None:
+            return False
+        self._chat_next[chat_id] = chat_at + self.per_chat_interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Общий лимит Telegram в Redis: слоты резервируют все воркеры доставки,
+    поэтому параллельные пачки вместе не превышают TELEGRAM_GLOBAL_RATE_LIMIT.
+    В ключе хранится время ближайшего свободного слота (микросекунды по часам
+    Redis); интервал между сообщениями в один чат считается локально — сообщения
+    одного чата попадают в одну пачку. Если Redis недоступен, лимит считается
+    в памяти процесса.
+    """
+
+    # KEYS[1] — ключ лимита; ARGV — задержка, интервал и наибольшее ожидание (-1 — без
+    # ограничения), мкс. Возвращает ожидание, мкс, или -1, если слот слишком далеко
+    RESERVE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local at = math.max(now + tonumber(ARGV[1]), tonumber(redis.call('GET', KEYS[1]) or 0))
+if tonumber(ARGV[3]) >= 0 and at - now > tonumber(ARGV[3]) then
+    return -1
+end
+local next_at = at + tonumber(ARGV[2])
+redis.call('SET', KEYS[1], string.format('%d', next_at), 'PX', math.ceil((next_at - now) / 1000) + 1000)
+return at - now
+"""
+    # KEYS[1] — ключ лимита; ARGV[1] — пауза, мкс
+    PAUSE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local at = now + tonumber(ARGV[1])
+if at > tonumber(redis.call('GET', KEYS[1]) or 0) then
+    redis.call('SET', KEYS[1], string.format('%d', at), 'PX', math.ceil(tonumber(ARGV[1]) / 1000) + 1000)
+end
+return 0
+"""
+
+    def __init__(self, client, global_rate, per_chat_interval, key):
+        super().__init__(global_rate, per_chat_interval)
+        self.client = client
+        self.key = key
+
+    async def pause(self, seconds):
+        await super().pause(seconds)
+        try:
+            await self.client.eval(self.PAUSE_SCRIPT, 1, self.key, int(seconds * 1e6))
+        except Exception as e:
+            logger.warning(f"Failed to pause shared rate limit: {str(e)}")
+
+    async def reserve(self, delay, max_wait=None):
+        try:
+            wait = int(await self.client.eval(
+                self.RESERVE_SCRIPT, 1, self.key, int(delay * 1e6), int(self.global_interval * 1e6),
+                -1 if max_wait is None else int(max(max_wait, 0) * 1e6)))
+        except Exception as e:
+            logger.warning(f"Shared rate limit is unavailable, limiting locally: {str(e)}")
+            return await super().reserve(delay, max_wait)
+        return None if wait < 0 else wait / 1e6
+
+
+def create_rate_limiter():
+    """
+    Ограничитель для пачки: общий для всех воркеров через Redis, если задан
+    REDIS_URL, иначе локальный. Возвращает (ограничитель, клиент Redis или None).
+    """
+    if not settings.REDIS_URL:
+        limiter = RateLimiter(settings.TELEGRAM_GLOBAL_RATE_LIMIT, settings.TELEGRAM_PER_CHAT_INTERVAL)
+        return limiter, None
+    from redis.asyncio import Redis
+
+    client = Redis.from_url(settings.REDIS_URL)
+    limiter = RedisRateLimiter(
+        client, settings.TELEGRAM_GLOBAL_RATE_LIMIT, settings.TELEGRAM_PER_CHAT_INTERVAL,
+        settings.TELEGRAM_RATE_LIMIT_KEY)
+    return limiter, client
+
+
+def _retry_after_seconds(error):
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def create_bot(pool_size=None):
+    """Бот с общим пулом HTTP-соединений на всю пачку сообщений."""
+    pool_size = pool_size or settings.TELEGRAM_SEND_CONCURRENCY
+    return Bot(
+        token=settings.TELEGRAM_BOT_TOKEN,
+        base_url=settings.TELEGRAM_API_BASE_URL,
+        request=HTTPXRequest(connection_pool_size=pool_size),
+    )
+
+
+async def async_send_batch(messages, bot=None, budget=None):
+    """
+    Отправляет пачку сообщений [(chat_id, text[, reply_markup]), ...] через один клиент.
+    reply_markup — inline-клавиатура в виде словаря Bot API.
+    Одновременных запросов не больше TELEGRAM_SEND_CONCURRENCY, лимиты
+    Telegram соблюдаются вместе с параллельными пачками (см. create_rate_limiter),
+    на RetryAfter отправка ставится на паузу и повторяется.
+    budget — сколько секунд пачка может ждать слотов лимита: сообщения, слот
+    для которых освободится позже, не отправляются и попадают в deferred.
+    Возвращает статистику: сколько отправлено, какие чаты не получили сообщение,
+    номера отложенных сообщений и сколько раз сработал лимит Telegram.
+    """
+    semaphore = asyncio.Semaphore(settings.TELEGRAM_SEND_CONCURRENCY)
+    limiter, redis_client = create_rate_limiter()
+    loop = asyncio.get_running_loop()
+    stop_at = None
+    result = {'sent': 0, 'failed': [], 'deferred': [], 'rate_limited': 0}
+
+    async def send(index, chat_id, text, reply_markup=None):
+        if reply_markup is not None:
+            reply_markup = InlineKeyboardMarkup.de_json(reply_markup, bot)
+        async with semaphore:
+            for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+                max_wait = None if stop_at is None else stop_at - loop.time()
+                if not await limiter.acquire(chat_id, max_wait):
+                    result['deferred'].append(index)
+                    return
+                start = time.perf_counter()
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+                    result['sent'] += 1
+                    TELEGRAM_MESSAGES.labels('sent').inc()
+                    return
+                except RetryAfter as e:
+                    result['rate_limited'] += 1
+                    TELEGRAM_RATE_LIMITED.inc()
+                    seconds = _retry_after_seconds(e)
+                    logger.warning(f"Rate limited while sending to {chat_id}, retry in {seconds}s")
+                    await limiter.pause(seconds)
+                except Exception as e:
+                    logger.error(f"Failed to send message to {chat_id}: {str(e)}")
+                    break
+                finally:
+                    TELEGRAM_SEND_DURATION.observe(time.perf_counter() - start)
+            result['failed'].append(chat_id)
+            TELEGRAM_MESSAGES.labels('failed').inc()
+
+    own_bot = bot is None
+    if own_bot:
+        bot = create_bot()
+    try:
+        if own_bot:
+            await bot.initialize()
+        # Бюджет ожидания считается с начала отправки, без подключения клиента
+        if budget is not None:
+            stop_at = loop.time() + budget
+        await asyncio.gather(*(send(index, *message) for index, message in enumerate(messages)))
+    finally:
+        if own_bot:
+            await bot.shutdown()
+        if redis_client is not None:
+            await redis_client.aclose()
+    logger.info(
+        f"Batch delivered: {result['sent']} sent, {len(result['failed'])} failed, "
+        f"{len(result['deferred'])} deferred, {result['rate_limited']} rate limited")
+    return result
+
+
+def send_telegram_batch(messages, budget=None):
+    """
+    Синхронная обертка: одна event loop на всю пачку сообщений. Сообщения
+    без chat_id пропускаются; deferred — номера сообщений в исходном списке.
+    """
+    indexes = [index for index, message in enumerate(messages) if message[0] is not None]
+    if not indexes:
+        return {'sent': 0, 'failed': [], 'deferred': [], 'rate_limited': 0}
+    result = asyncio.run(async_send_batch([messages[index] for index in indexes], budget=budget))
+    result['deferred'] = sorted(indexes[index] for index in result['deferred'])
+    return result
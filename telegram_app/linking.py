@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from users.models import CustomUser
+
+# Нет пользователя с таким username: кешируется ненадолго, чтобы повторные /start
+# не ходили в базу, но только что зарегистрированный пользователь быстро нашелся
+NOT_FOUND = 'not-found'
+
+
+def telegram_username_cache_key(telegram_username):
+    return f'telegram:username:{telegram_username}'
+
+
+async def find_user_by_telegram_username(telegram_username):
+    """
+    (id, email) пользователя по Telegram username: сначала кеш, затем база
+    через асинхронный ORM, чтобы не блокировать event loop бота.
+    """
+    if not telegram_username:
+        return None
+    key = telegram_username_cache_key(telegram_username)
+    cached = await cache.aget(key)
+    if cached == NOT_FOUND:
+        return None
+    if cached is not None:
+        return cached
+
+    user = await CustomUser.objects.filter(
+        telegram_username=telegram_username).values_list('id', 'email').afirst()
+    if user is None:
+        await cache.aset(key, NOT_FOUND, settings.TELEGRAM_USERNAME_NOT_FOUND_CACHE_TTL)
+        return None
+    await cache.aset(key, user, settings.TELEGRAM_USERNAME_CACHE_TTL)
+    return user
+
+
+async def link_chat(telegram_username, chat_id):
+    """Сохраняет chat_id пользователю; возвращает его email или None."""
+    user = await find_user_by_telegram_username(telegram_username)
+    if user is None:
+        return None
+    user_id, email = user
+    updated = await CustomUser.objects.filter(
+        id=user_id, telegram_username=telegram_username).aupdate(telegram_chat_id=str(chat_id))
+    if not updated:
+        # В кеше устаревшая запись (username сменили) — ищем заново в базе
+        await cache.adelete(telegram_username_cache_key(telegram_username))
+        user = await find_user_by_telegram_username(telegram_username)
+        if user is None:
+            return None
+        user_id, email = user
+        await CustomUser.objects.filter(id=user_id).aupdate(telegram_chat_id=str(chat_id))
+    return email
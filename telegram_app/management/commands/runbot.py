@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import asyncio
+
+
+class Command(BaseCommand):
+    help = 'Запуск Telegram-бота отдельным процессом (polling или вебхук)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--webhook', action='store_true',
+                            help='Принимать обновления через вебхук вместо polling')
+        parser.add_argument('--webhook-url', default=settings.TELEGRAM_WEBHOOK_URL,
+                            help='Публичный URL вебхука (по умолчанию TELEGRAM_WEBHOOK_URL)')
+        parser.add_argument('--host', default=settings.TELEGRAM_WEBHOOK_HOST)
+        parser.add_argument('--port', type=int, default=settings.TELEGRAM_WEBHOOK_PORT)
+
+    def handle(self, *args, **options):
+        from telegram_app import bot
+
+        if not options['webhook']:
+            self.stdout.write('Бот запущен в режиме polling')
+            bot.run_polling()
+            return
+
+        if not options['webhook_url']:
+            raise CommandError('Не задан URL вебхука (--webhook-url или TELEGRAM_WEBHOOK_URL)')
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            # Без секрета любой, кто знает URL, может прислать поддельное обновление
+            raise CommandError('Не задан TELEGRAM_WEBHOOK_SECRET: вебхук без секрета не запускается')
+        self.stdout.write(f"Бот запущен в режиме вебхука: {options['webhook_url']}")
+        try:
+            asyncio.run(bot.serve_webhook(
+                options['webhook_url'],
+                options['host'],
+                options['port'],
+                secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+            ))
+        except KeyboardInterrupt:
+            pass
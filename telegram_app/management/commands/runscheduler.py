@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from telegram_app.scheduler import ReminderScheduler
+import signal
+import threading
+
+
+class Command(BaseCommand):
+    help = (
+        'Запуск планировщика напоминаний: отправляет напоминания в момент next_reminder '
+        '(только при REMINDER_SCHEDULER_ENABLED=True)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=None,
+                            help='Горизонт в секундах (по умолчанию REMINDER_SCHEDULER_HORIZON_SECONDS)')
+
+    def handle(self, *args, **options):
+        # Без флага напоминания рассылает send_reminders, и планировщик продублировал бы их
+        if not settings.REMINDER_SCHEDULER_ENABLED:
+            raise CommandError(
+                'REMINDER_SCHEDULER_ENABLED выключен: напоминания рассылает задача send_reminders')
+        stop_event = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop_event.set())
+
+        self.stdout.write('Планировщик напоминаний запущен')
+        ReminderScheduler(horizon=options['horizon']).run(stop_event)
+        self.stdout.write('Планировщик напоминаний остановлен')
@@ -0,0 +1,38 @@
+from functools import lru_cache
+from django.template import engines
+
+# Данные кнопки "Выполнено" под напоминанием: done:<id привычки>
+DONE_CALLBACK_PREFIX = 'done:'
+
+# Текст напоминания: все привычки пользователя из окна в одном сообщении
+REMINDER_TEMPLATE = """{% autoescape off %}Не забудьте выполнить {% if habits|length > 1 %}свои привычки{% else %}свою привычку{% endif %}!
+{% for habit in habits %}
+• {{ habit.time|time:"H:i" }} — {{ habit.action }} ({{ habit.place }}){% if habit.linked_habit %}
+  Затем: {{ habit.linked_habit.action }}{% elif habit.reward %}
+  Награда: {{ habit.reward }}{% endif %}{% endfor %}{% endautoescape %}"""
+
+
+@lru_cache(maxsize=None)
+def get_reminder_template():
+    """Шаблон компилируется один раз на процесс."""
+    return engines['django'].from_string(REMINDER_TEMPLATE)
+
+
+def render_reminder(habits):
+    """
+    Текст напоминания по списку привычек одного пользователя.
+    linked_habit должен быть загружен заранее (select_related), иначе
+    на каждую привычку уйдет отдельный запрос.
+    """
+    return get_reminder_template().render({'habits': habits})
+
+
+def reminder_keyboard(habits):
+    """
+    Inline-клавиатура с кнопкой "Выполнено" для каждой привычки из напоминания.
+    Возвращается словарем, чтобы ее можно было передать в задачу Celery.
+    """
+    return {'inline_keyboard': [
+        [{'text': f'✅ {habit.action}'[:64], 'callback_data': f'{DONE_CALLBACK_PREFIX}{habit.id}'}]
+        for habit in habits
+    ]}
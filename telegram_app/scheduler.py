@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from heapq import heapify, heappop, heappush
+from django.conf import settings
+from django.db import close_old_connections
+from config.redis import get_redis
+from django.utils import timezone
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """
+    Планировщик напоминаний: держит в памяти кучу (время, id привычки)
+    с напоминаниями на горизонт REMINDER_SCHEDULER_HORIZON_SECONDS вперед
+    и отдает наступившие в Celery (send_habit_reminders) в пределах секунд.
+
+    Раз в горизонт куча перечитывается из базы одним потоковым запросом,
+    между перечитываниями изменения привычек приходят через Redis pub/sub
+    (habits.events). Устаревшие записи кучи не удаляются, а пропускаются:
+    актуальное время каждой привычки хранится в scheduled.
+    """
+
+    def __init__(self, dispatch=None, horizon=None):
+        self.dispatch = dispatch or self.send_to_celery
+        self.horizon = timedelta(seconds=horizon or settings.REMINDER_SCHEDULER_HORIZON_SECONDS)
+        self.heap = []
+        self.scheduled = {}
+        self.loaded_until = None
+
+    @staticmethod
+    def send_to_celery(habit_ids):
+        from .tasks import send_habit_reminders
+
+        send_habit_reminders.delay(habit_ids)
+
+    def reload(self, now):
+        """Перечитывает из базы все напоминания до now + горизонт (и просроченные)."""
+        from habits.models import Habit
+
+        self.loaded_until = now + self.horizon
+        rows = (
+            Habit.objects
+            .filter(next_reminder__lt=self.loaded_until, user__telegram_chat_id__isnull=False)
+            .values_list('id', 'next_reminder')
+            .iterator(chunk_size=2000))
+        self.scheduled = {habit_id: reminder.timestamp() for habit_id, reminder in rows}
+        self.heap = [(timestamp, habit_id) for habit_id, timestamp in self.scheduled.items()]
+        heapify(self.heap)
+        logger.info(f"Loaded {len(self.heap)} reminders until {self.loaded_until}")
+
+    def update(self, habit_id, next_reminder):
+        """Изменение напоминания привычки (None — напоминания больше нет)."""
+        if next_reminder is None or self.loaded_until is None or next_reminder >= self.loaded_until:
+            # За горизонтом привычку подхватит следующее перечитывание
+            self.scheduled.pop(habit_id, None)
+            return
+        timestamp = next_reminder.timestamp()
+        self.scheduled[habit_id] = timestamp
+        heappush(self.heap, (timestamp, habit_id))
+
+    def handle_message(self, data):
+        try:
+            change = json.loads(data)
+            next_reminder = change['next_reminder']
+            self.update(
+                int(change['id']),
+                datetime.fromisoformat(next_reminder) if next_reminder else None)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Skipping malformed reminder change {data!r}: {str(e)}")
+
+    def pop_due(self, now):
+        """Снимает с кучи все наступившие напоминания; устаревшие записи пропускаются."""
+        limit = now.timestamp()
+        due = []
+        while self.heap and self.heap[0][0] <= limit:
+            timestamp, habit_id = heappop(self.heap)
+            if self.scheduled.get(habit_id) == timestamp:
+                del self.scheduled[habit_id]
+                due.append(habit_id)
+        return due
+
+    def tick(self, now):
+        """Один шаг: перечитать горизонт, если он закончился, и отправить наступившие."""
+        if self.loaded_until is None or now >= self.loaded_until:
+            self.reload(now)
+        due = self.pop_due(now)
+        if due:
+            self.dispatch(due)
+            logger.info(f"Dispatched {len(due)} reminders")
+        return due
+
+    def seconds_until_next(self, now):
+        """Сколько можно ждать до следующего напоминания или перечитывания."""
+        deadline = self.loaded_until.timestamp()
+        if self.heap:
+            deadline = min(deadline, self.heap[0][0])
+        return max(0.0, deadline - now.timestamp())
+
+    def run(self, stop_event=None, max_wait=1.0):
+        """
+        Основной цикл процесса. Ждет следующего события не дольше max_wait
+        секунд, слушая канал изменений в Redis (если он настроен). Ошибка шага
+        (база, Redis, брокер) не останавливает процесс: шаг повторяется
+        с растущей паузой, а горизонт перечитывается заново.
+        """
+        stop_event = stop_event or threading.Event()
+        pubsub = None
+        if settings.REDIS_URL:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.REMINDER_SCHEDULER_CHANNEL)
+        else:
+            logger.warning("REDIS_URL is not set: changes are picked up only on reload")
+
+        failures = 0
+        try:
+            while not stop_event.is_set():
+                try:
+                    self.step(pubsub, max_wait)
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    delay = min(max_wait * 2 ** failures, settings.REMINDER_SCHEDULER_MAX_BACKOFF_SECONDS)
+                    logger.exception(
+                        f"Reminder scheduler step failed ({failures} in a row), retrying in {delay:.0f}s: {str(e)}")
+                    # Пропущенные за время сбоя изменения и наступившие напоминания
+                    # подхватит перечитывание горизонта из базы
+                    self.loaded_until = None
+                    close_old_connections()
+                    stop_event.wait(delay)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+    def step(self, pubsub, max_wait):
+        """Шаг цикла: отправить наступившие и дождаться следующего события или изменений."""
+        self.tick(timezone.now())
+        timeout = min(self.seconds_until_next(timezone.now()), max_wait)
+        if pubsub is None:
+            time.sleep(timeout)
+            return
+        message = pubsub.get_message(timeout=timeout)
+        while message is not None:
+            self.handle_message(message['data'])
+            message = pubsub.get_message(timeout=0)
@@ -1,11 +1,19 @@
-from telegram import Bot
 from django.conf import settings
-from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+from celery import shared_task, group
+from datetime import datetime, timedelta, timezone as dt_timezone
 import logging
 import asyncio
+import time
+from config.metrics import REMINDER_BATCH_SIZE, REMINDER_QUEUE_LAG
+from .messages import render_reminder, reminder_keyboard
 
 logger = logging.getLogger(__name__)
 
+# Насколько раньше срока планировщик может прислать привычку на отправку
+REMINDER_DISPATCH_TOLERANCE = timedelta(minutes=1)
+
 
 # Асинхронная функция для отправки сообщений
 async def async_send_telegram_notification(telegram_chat_id, message):
@@ -13,6 +21,9 @@ async def async_send_telegram_notification(telegram_chat_id, message):
         logger.error("Telegram chat ID is missing. Cannot send message.")
         return
 
+    # telegram импортируется лениво, чтобы воркеры не загружали его при старте
+    from telegram import Bot
+
     logger.info(f"Attempting to send message to {telegram_chat_id}")
     bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
     try:
@@ -35,18 +46,163 @@ def send_telegram_notification(telegram_chat_id, message):
 
 
 
+# Celery задача доставки одной пачки напоминаний. Пачка ждет слотов общего
+# лимита Telegram не дольше REMINDER_DELIVERY_SEND_BUDGET, чтобы уложиться
+# в свой time_limit; остаток уходит повторной попыткой задачи
+@shared_task(bind=True, time_limit=settings.REMINDER_DELIVERY_TIME_LIMIT,
+             max_retries=settings.REMINDER_DELIVERY_MAX_RETRIES)
+def deliver_reminder_batch(self, messages, due=None):
+    """
+    Отправляет пачку [(chat_id, message[, reply_markup]), ...] через один клиент Telegram
+    и возвращает статистику доставки этой пачки. due — время напоминания
+    (unix timestamp) для каждого сообщения: по нему считается задержка доставки.
+    Сообщения, не получившие слот лимита вовремя, отправляются повторной
+    попыткой через REMINDER_DELIVERY_RETRY_DELAY секунд; уже отправленные не повторяются.
+    """
+    from .delivery import send_telegram_batch
+
+    REMINDER_BATCH_SIZE.observe(len(messages))
+    result = send_telegram_batch(messages, budget=settings.REMINDER_DELIVERY_SEND_BUDGET)
+    deferred = result['deferred']
+    if due:
+        failed = set(result['failed'])
+        skipped = set(deferred)
+        delivered_at = time.time()
+        for index, ((chat_id, *_), due_at) in enumerate(zip(messages, due)):
+            if chat_id not in failed and index not in skipped:
+                REMINDER_QUEUE_LAG.observe(max(0.0, delivered_at - due_at))
+    result['total'] = len(messages)
+    if deferred:
+        later = [messages[index] for index in deferred]
+        later_due = [due[index] for index in deferred] if due else None
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Rate limit budget exhausted, retrying {len(later)} reminders later")
+            raise self.retry(args=(later, later_due), countdown=settings.REMINDER_DELIVERY_RETRY_DELAY)
+        logger.error(f"Dropping {len(later)} reminders after {self.max_retries} delivery retries")
+    return result
+
+
+def chunked(items, size):
+    """Разбивает список на части не длиннее size."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def queue_reminders(habits):
+    """
+    Группирует привычки по чатам (одно сообщение на пользователя со всеми
+    его привычками и кнопками для отметки выполнения) и раздает отправку
+    воркерам группой задач deliver_reminder_batch по REMINDER_CHUNK_SIZE
+    сообщений. Возвращает число сообщений.
+    """
+    habits_by_chat = {}
+    for habit in habits:
+        habits_by_chat.setdefault(habit.user.telegram_chat_id, []).append(habit)
+    messages = [
+        (chat_id, render_reminder(chat_habits), reminder_keyboard(chat_habits))
+        for chat_id, chat_habits in habits_by_chat.items()
+    ]
+    # Время самого раннего напоминания в сообщении — для метрики задержки доставки
+    due = [
+        min(habit.next_reminder for habit in chat_habits).timestamp()
+        for chat_habits in habits_by_chat.values()
+    ]
+    if messages:
+        size = settings.REMINDER_CHUNK_SIZE
+        group(
+            deliver_reminder_batch.s(chunk, due_chunk)
+            for chunk, due_chunk in zip(chunked(messages, size), chunked(due, size))
+        ).apply_async()
+    return len(messages)
+
+
+# Celery задача, которая собирает сообщения по странице напоминаний
+@shared_task
+def queue_reminder_page(reminders):
+    """
+    Собирает сообщения по странице привычек из send_reminders и раздает их
+    на доставку (см. queue_reminders). reminders — пары (id привычки, время
+    напоминания unix timestamp): next_reminder в базе к этому моменту уже
+    перенесен на следующий цикл. Возвращает число сообщений.
+    """
+    from habits.models import Habit
+
+    due = dict(reminders)
+    habits = list(Habit.objects.select_related('user', 'linked_habit').filter(id__in=due))
+    for habit in habits:
+        # Время отправляемого напоминания, а не следующего — для метрики задержки доставки
+        habit.next_reminder = datetime.fromtimestamp(due[habit.id], dt_timezone.utc)
+    habits.sort(key=lambda habit: (habit.next_reminder, habit.id))
+    return queue_reminders(habits)
+
+
 # Синхронная Celery задача для отправки напоминаний
 @shared_task
 def send_reminders():
-    from users.models import CustomUser
-    users = CustomUser.objects.filter(telegram_chat_id__isnull=False)
+    """
+    Рассылает напоминания только по тем привычкам, у которых next_reminder
+    попадает в текущее окно (интервал между запусками beat).
+    Привычки читаются страницами по REMINDER_BATCH_SIZE (только id, в порядке
+    владельцев). Каждая страница под блокировкой переносится на следующий цикл
+    и сразу передается задаче queue_reminder_page, которая собирает сообщения —
+    по одному на пользователя со всеми его привычками. Если задачу прервать,
+    повторный запуск не отправит уже поставленные в очередь страницы.
+    Возвращает число привычек, по которым поставлены напоминания.
+    """
+    from habits.models import Habit
+
     logger.info("Task send_reminders has started.")
-    # Ваша логика отправки напоминаний
-    logger.info("Task send_reminders has finished.")
-
-    logger.info(f"Found {len(users)} users to send reminders to.")
-    for user in users:
-        message = "Не забудьте выполнить свою привычку!"
-        logger.info(f"Preparing to send reminder to user: {user.email}, telegram_chat_id: {user.telegram_chat_id}")
-        send_telegram_notification(telegram_chat_id=user.telegram_chat_id, message=message)
-    logger.info("All reminders have been processed.")
+    window_start = timezone.now()
+    window_end = window_start + timedelta(minutes=settings.REMINDER_WINDOW_MINUTES)
+
+    # Пропущенные циклы переносим на ближайшее время, чтобы они попали в окно
+    rescheduled = Habit.objects.reschedule_missed(window_start)
+    logger.info(f"Rescheduled {rescheduled} habits with missed reminders.")
+
+    queued = pages = 0
+    for page in Habit.objects.iter_due(window_start, window_end, settings.REMINDER_BATCH_SIZE):
+        due = dict(page)
+        with transaction.atomic():
+            # Привычки, которые уже перенесены или заняты параллельным запуском, пропускаются
+            ids = list(
+                Habit.objects.select_for_update(skip_locked=True)
+                .filter(id__in=due, next_reminder__gte=window_start, next_reminder__lt=window_end)
+                .values_list('id', flat=True))
+            Habit.objects.filter(id__in=ids).advance_reminders()
+        if ids:
+            queue_reminder_page.delay([(habit_id, due[habit_id].timestamp()) for habit_id in ids])
+        queued += len(ids)
+        pages += 1
+    logger.info(
+        f"Queued reminders for {queued} habits in {pages} pages "
+        f"in window {window_start} - {window_end}.")
+    return queued
+
+
+# Задача планировщика напоминаний (python manage.py runscheduler)
+@shared_task
+def send_habit_reminders(habit_ids):
+    """
+    Отправляет напоминания по привычкам, время которых наступило, и переносит
+    их на следующий цикл. Строки блокируются на время переноса, а привычки,
+    которые уже перенесены (повторная отправка той же пачки) или заняты другой
+    задачей, пропускаются, поэтому напоминание не уходит дважды.
+    """
+    from habits.models import Habit
+
+    now = timezone.now()
+    with transaction.atomic():
+        habits = list(
+            Habit.objects.select_related('user', 'linked_habit')
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(
+                id__in=habit_ids,
+                next_reminder__lte=now + REMINDER_DISPATCH_TOLERANCE,
+                user__telegram_chat_id__isnull=False))
+        due = Habit.objects.filter(id__in=[habit.id for habit in habits])
+        due.advance_reminders()
+        # Если циклы были пропущены, переносим сразу на ближайший будущий
+        due.reschedule_missed(now)
+    queued = queue_reminders(habits)
+    logger.info(f"Queued {queued} reminders for {len(habits)} of {len(habit_ids)} scheduled habits.")
+    return queued
@@ -0,0 +1,112 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import itertools
+import threading
+import json
+import time
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Бот открывает до TELEGRAM_SEND_CONCURRENCY соединений разом,
+    # стандартной очереди в 5 соединений мало (сбросы соединений под нагрузкой)
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeBotAPIServer:
+    """
+    Локальный HTTP-сервер, имитирующий Telegram Bot API, для тестов и бенчмарков.
+    Запоминает отправленные сообщения, умеет отвечать 429 (RetryAfter)
+    и ошибкой "chat not found" для заданных чатов.
+
+    Использование:
+        with FakeBotAPIServer() as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                ...
+    """
+
+    def __init__(self, rate_limited=0, retry_after=1, missing_chats=()):
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.missing_chats = {str(chat_id) for chat_id in missing_chats}
+        self.messages = []
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1)
+        self._server = _HTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/bot'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method, params):
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}}
+        if method != 'sendMessage':
+            return 200, {'ok': True, 'result': True}
+
+        chat_id = str(params.get('chat_id'))
+        with self._lock:
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                return 429, {
+                    'ok': False, 'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after}}
+            if chat_id in self.missing_chats:
+                return 400, {'ok': False, 'error_code': 400,
+                             'description': 'Bad Request: chat not found'}
+            message_id = next(self._message_ids)
+            reply_markup = params.get('reply_markup')
+            if isinstance(reply_markup, str):
+                reply_markup = json.loads(reply_markup)
+            self.messages.append({
+                'chat_id': chat_id, 'text': params.get('text'),
+                'reply_markup': reply_markup, 'time': time.monotonic()})
+        return 200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id) if chat_id.lstrip('-').isdigit() else 0, 'type': 'private'},
+            'text': params.get('text')}}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode()
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    params = json.loads(body or '{}')
+                else:
+                    params = {key: values[0] for key, values in parse_qs(body).items()}
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                status, payload = fake.handle(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
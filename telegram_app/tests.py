@@ -1,9 +1,36 @@
-from unittest.mock import patch, AsyncMock
-from django.test import TestCase
-from telegram_app.tasks import send_telegram_notification, send_reminders
+from unittest.mock import call, patch, AsyncMock, MagicMock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from datetime import timedelta
+import datetime
+from django.test import TestCase, override_settings
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from telegram_app.tasks import (
+    send_telegram_notification, send_reminders, deliver_reminder_batch, send_habit_reminders,
+    queue_reminder_page)
+from telegram_app.scheduler import ReminderScheduler
+from habits.events import encode_change
+from telegram_app.delivery import send_telegram_batch, create_rate_limiter, RedisRateLimiter
+from telegram_app.testing import FakeBotAPIServer
+from telegram_app.bot import start, done, build_application, create_webhook_app, SECRET_TOKEN_HEADER
+from telegram_app.linking import link_chat
+from habits.models import Habit
 from users.models import CustomUser
+from config.celery import app as celery_app
 from django.conf import settings
 import asyncio
+from prometheus_client import REGISTRY
+import subprocess
+import sys
+import os
+import threading
+import time
+
+
+def metric(name, **labels):
+    """Текущее значение метрики Prometheus (0, если ее еще не было)."""
+    return REGISTRY.get_sample_value(name, labels) or 0
 
 
 class TelegramNotificationTest(TestCase):
@@ -15,7 +42,7 @@ class TelegramNotificationTest(TestCase):
         self.user.telegram_chat_id = '123456789'
         self.user.save()
 
-    @patch('telegram_app.tasks.Bot')  # Мокаем Telegram Bot для проверки
+    @patch('telegram.Bot')  # Мокаем Telegram Bot для проверки
     def test_send_telegram_notification(self, MockBot):
         """Тест отправки уведомлений через Telegram"""
         send_telegram_notification(
@@ -32,13 +59,13 @@ class TelegramNotificationTest(TestCase):
         self.user.telegram_chat_id = None
         self.user.save()
 
-        with patch('telegram_app.tasks.Bot') as MockBot:
+        with patch('telegram.Bot') as MockBot:
             send_telegram_notification(
                 telegram_chat_id=self.user.telegram_chat_id, message="Test message"
             )
             MockBot().send_message.assert_not_called()
 
-    @patch('telegram_app.tasks.Bot')
+    @patch('telegram.Bot')
     def test_invalid_user(self, MockBot):
         """Тест отправки уведомления несуществующему пользователю"""
         invalid_telegram_chat_id = '9999'
@@ -58,11 +85,11 @@ class TelegramNotificationTest(TestCase):
 
     def test_send_notification_with_empty_message(self):
         """Тест отправки уведомления с пустым сообщением"""
-        with patch('telegram_app.tasks.Bot') as MockBot:
+        with patch('telegram.Bot') as MockBot:
             send_telegram_notification(telegram_chat_id=self.user.telegram_chat_id, message="")
             MockBot().send_message.assert_called_once_with(chat_id='123456789', text="")
 
-    @patch('telegram_app.tasks.Bot')
+    @patch('telegram.Bot')
     def test_send_notification_with_special_characters(self, MockBot):
         """Тест отправки уведомления с специальными символами"""
         special_message = "Test & * $ # @!"
@@ -83,7 +110,7 @@ class TelegramAppTestCase(TestCase):
             password='password123',
             telegram_chat_id='123456789')
 
-    @patch('telegram_app.tasks.Bot')
+    @patch('telegram.Bot')
     def test_send_telegram_notification(self, MockBot):
         """Тест успешной отправки уведомления через Telegram."""
         send_telegram_notification(self.user.telegram_chat_id, "Test message")
@@ -97,3 +124,666 @@ class TelegramAppTestCase(TestCase):
             send_telegram_notification('9999', "Test message")
             self.assertIn("Failed to send message to 9999: Chat not found", log.output[0])
 
+
+class SendRemindersTest(TestCase):
+
+    def setUp(self):
+        # Задачи группы выполняются сразу, без брокера
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com',
+            password='password123',
+            telegram_chat_id='123456789')
+        self.user_without_chat = CustomUser.objects.create_user(
+            email='nochat@example.com', password='password123')
+
+    def create_habit(self, user, next_reminder, **fields):
+        fields.setdefault('action', "Выход на пробежку")
+        return Habit.objects.create(
+            user=user,
+            time=datetime.time(7, 30),
+            place="Парк",
+            duration=60,
+            next_reminder=next_reminder,
+            **fields)
+
+    def sent_messages(self, mock_batch):
+        return [message for call in mock_batch.call_args_list for message in call.args[0]]
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_only_due_habits_are_sent(self, mock_batch):
+        """Напоминания уходят только по привычкам из текущего окна."""
+        now = timezone.now()
+        due = self.create_habit(self.user, now + timedelta(hours=1))
+        self.create_habit(self.user, now + timedelta(days=2))
+        self.create_habit(self.user, now - timedelta(hours=1))
+        self.create_habit(self.user_without_chat, now + timedelta(hours=1))
+
+        send_reminders()
+
+        self.assertEqual(
+            self.sent_messages(mock_batch),
+            [('123456789', "Не забудьте выполнить свою привычку!\n\n• 07:30 — Выход на пробежку (Парк)",
+              {'inline_keyboard': [[{'text': '✅ Выход на пробежку', 'callback_data': f'done:{due.id}'}]]})])
+        # Отправленная привычка перенесена на следующий цикл
+        due_reminder = due.next_reminder
+        due.refresh_from_db()
+        self.assertEqual(due.next_reminder, due_reminder + timedelta(days=1))
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_missed_reminder_is_sent_in_catch_up_window(self, mock_batch):
+        """Просроченная привычка переносится в текущее окно и отправляется."""
+        self.create_habit(self.user, timezone.now() - timedelta(days=3, hours=-1))
+
+        send_reminders()
+
+        self.assertEqual(len(self.sent_messages(mock_batch)), 1)
+
+    @override_settings(REMINDER_BATCH_SIZE=2)
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_keyset_pagination_covers_whole_window(self, mock_batch):
+        """Постраничная выборка не теряет, не дублирует и не разрывает привычки пользователя."""
+        reminder = timezone.now() + timedelta(hours=1)
+        other = CustomUser.objects.create_user(
+            email='other@example.com', password='password123', telegram_chat_id='987654321')
+        for _ in range(3):
+            self.create_habit(self.user, reminder)
+        for _ in range(2):
+            self.create_habit(other, reminder)
+
+        pages = list(Habit.objects.iter_due(
+            timezone.now(), timezone.now() + timedelta(hours=4), 2))
+
+        # Третья привычка первого пользователя дочитывается в его страницу
+        self.assertEqual([len(page) for page in pages], [3, 2])
+        ids = [habit_id for page in pages for habit_id, _ in page]
+        self.assertEqual(len(set(ids)), 5)
+
+        send_reminders()
+        # Все привычки пользователя уходят одним сообщением
+        messages = sorted(self.sent_messages(mock_batch))
+        self.assertEqual([chat_id for chat_id, *_ in messages], ['123456789', '987654321'])
+        self.assertEqual(messages[0][1].count("Выход на пробежку"), 3)
+        self.assertEqual(messages[1][1].count("Выход на пробежку"), 2)
+
+    @override_settings(REMINDER_BATCH_SIZE=1)
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_interrupted_run_does_not_resend_queued_pages(self, mock_batch):
+        """Каждая страница переносится вместе с постановкой в очередь, а не после всего окна."""
+        reminder = timezone.now() + timedelta(hours=1)
+        users = [
+            CustomUser.objects.create_user(
+                email=f'user{number}@example.com', password='password123',
+                telegram_chat_id=str(1000 + number))
+            for number in range(3)
+        ]
+        for user in users:
+            self.create_habit(user, reminder)
+        original = queue_reminder_page.delay
+        calls = []
+
+        def delay_then_fail(reminders):
+            calls.append(reminders)
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            return original(reminders)
+
+        with patch.object(queue_reminder_page, 'delay', side_effect=delay_then_fail):
+            with self.assertRaises(RuntimeError):
+                send_reminders()
+        self.assertEqual([chat_id for chat_id, *_ in self.sent_messages(mock_batch)], ['1000'])
+
+        mock_batch.reset_mock()
+        send_reminders()
+
+        # Первая страница уже перенесена, вторая перенесена до сбоя, третья отправлена
+        self.assertEqual([chat_id for chat_id, *_ in self.sent_messages(mock_batch)], ['1002'])
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_personalized_message_without_per_habit_queries(self, mock_batch):
+        """Текст собирается из полей привычки без отдельных запросов на каждую."""
+        reminder = timezone.now() + timedelta(hours=1)
+        pleasant = self.create_habit(
+            self.user, reminder + timedelta(days=3), action="Съесть яблоко", is_pleasant=True)
+        self.create_habit(self.user, reminder, action="Зарядка", linked_habit=pleasant)
+        self.create_habit(self.user, reminder, action="Прогулка", reward="Кино")
+
+        # Перенос пропущенных, страница id, блокировка и перенос страницы (в точке сохранения),
+        # проверки публичных привычек для кеша ленты, затем одна выборка для сообщений
+        with self.assertNumQueries(9):
+            send_reminders()
+
+        chat_id, text, keyboard = self.sent_messages(mock_batch)[0]
+        self.assertEqual(chat_id, '123456789')
+        self.assertEqual(
+            text,
+            "Не забудьте выполнить свои привычки!\n"
+            "\n• 07:30 — Зарядка (Парк)\n  Затем: Съесть яблоко"
+            "\n• 07:30 — Прогулка (Парк)\n  Награда: Кино")
+
+    @override_settings(REMINDER_CHUNK_SIZE=2)
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_reminders_are_fanned_out_in_chunks(self, mock_batch):
+        """Каждая задача доставки получает не больше REMINDER_CHUNK_SIZE сообщений."""
+        mock_batch.return_value = {'sent': 2, 'failed': [], 'deferred': [], 'rate_limited': 0}
+        reminder = timezone.now() + timedelta(hours=1)
+        for number in range(5):
+            user = CustomUser.objects.create_user(
+                email=f'user{number}@example.com',
+                password='password123',
+                telegram_chat_id=str(1000 + number))
+            self.create_habit(user, reminder)
+
+        queued = send_reminders()
+
+        self.assertEqual(queued, 5)
+        self.assertEqual([len(call.args[0]) for call in mock_batch.call_args_list], [2, 2, 1])
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_deliver_reminder_batch_reports_result(self, mock_batch):
+        """Задача доставки возвращает собственную статистику пачки."""
+        mock_batch.return_value = {'sent': 1, 'failed': ['2'], 'deferred': [], 'rate_limited': 0}
+
+        result = deliver_reminder_batch([('1', 'a'), ('2', 'b')])
+
+        self.assertEqual(result, {'sent': 1, 'failed': ['2'], 'deferred': [], 'rate_limited': 0, 'total': 2})
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_deliver_reminder_batch_records_queue_lag(self, mock_batch):
+        """Задержка доставки считается только по доставленным сообщениям."""
+        mock_batch.return_value = {'sent': 1, 'failed': ['2'], 'deferred': [], 'rate_limited': 0}
+        lag_count = metric('habits_reminder_queue_lag_seconds_count')
+        lag_sum = metric('habits_reminder_queue_lag_seconds_sum')
+        batches = metric('habits_reminder_batch_size_count')
+
+        deliver_reminder_batch([('1', 'a'), ('2', 'b')], [time.time() - 30, time.time() - 60])
+
+        self.assertEqual(metric('habits_reminder_queue_lag_seconds_count'), lag_count + 1)
+        self.assertGreaterEqual(metric('habits_reminder_queue_lag_seconds_sum') - lag_sum, 30)
+        self.assertEqual(metric('habits_reminder_batch_size_count'), batches + 1)
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_deferred_reminders_are_retried(self, mock_batch):
+        """Сообщения, не дождавшиеся слота лимита, уходят повторной попыткой, остальные — нет."""
+        mock_batch.side_effect = [
+            {'sent': 1, 'failed': [], 'deferred': [1, 2], 'rate_limited': 0},
+            {'sent': 2, 'failed': [], 'deferred': [], 'rate_limited': 0},
+        ]
+        due = [time.time()] * 3
+
+        with self.assertLogs('telegram_app.tasks', level='WARNING'):
+            deliver_reminder_batch.apply(args=([('1', 'a'), ('2', 'b'), ('3', 'c')], due))
+
+        self.assertEqual(mock_batch.call_count, 2)
+        self.assertEqual(mock_batch.call_args.args[0], [('2', 'b'), ('3', 'c')])
+        self.assertEqual(
+            mock_batch.call_args.kwargs['budget'], settings.REMINDER_DELIVERY_SEND_BUDGET)
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_deferred_reminders_are_logged_after_last_retry(self, mock_batch):
+        mock_batch.return_value = {'sent': 0, 'failed': [], 'deferred': [0], 'rate_limited': 0}
+
+        with patch.object(deliver_reminder_batch, 'max_retries', 0), \
+                self.assertLogs('telegram_app.tasks', level='ERROR') as logs:
+            result = deliver_reminder_batch.apply(args=([('1', 'a')],)).get()
+
+        self.assertEqual(result['deferred'], [0])
+        self.assertIn('Dropping 1 reminders', logs.output[0])
+
+
+@override_settings(TELEGRAM_GLOBAL_RATE_LIMIT=1000, TELEGRAM_PER_CHAT_INTERVAL=0.2)
+class TelegramBatchDeliveryTest(TestCase):
+    """Пакетная отправка через локальный фейковый Bot API."""
+
+    def test_batch_is_sent_through_one_client(self):
+        messages = [(str(chat_id), f"Сообщение {chat_id}") for chat_id in range(1, 51)]
+        with FakeBotAPIServer() as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                result = send_telegram_batch(messages)
+
+        self.assertEqual(result, {'sent': 50, 'failed': [], 'deferred': [], 'rate_limited': 0})
+        self.assertEqual(
+            sorted((m['chat_id'], m['text']) for m in server.messages), sorted(messages))
+
+    def test_per_chat_interval_is_respected(self):
+        messages = [('42', 'first'), ('42', 'second'), ('42', 'third')]
+        with FakeBotAPIServer() as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                send_telegram_batch(messages)
+
+        times = [m['time'] for m in server.messages]
+        self.assertEqual(len(times), 3)
+        for earlier, later in zip(times, times[1:]):
+            self.assertGreaterEqual(later - earlier, 0.15)
+
+    def test_retry_after_is_honoured(self):
+        with FakeBotAPIServer(rate_limited=1, retry_after=1) as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                result = send_telegram_batch([('1', 'hello')])
+
+        self.assertEqual(result, {'sent': 1, 'failed': [], 'deferred': [], 'rate_limited': 1})
+        self.assertEqual(len(server.messages), 1)
+
+    @override_settings(TELEGRAM_GLOBAL_RATE_LIMIT=10)
+    def test_messages_beyond_budget_are_deferred(self):
+        messages = [(None, 'skip')] + [(str(chat_id), 'hello') for chat_id in range(1, 6)]
+        with FakeBotAPIServer() as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                result = send_telegram_batch(messages, budget=0.15)
+
+        # 10 сообщений в секунду: за 0,15 с — слоты 0; 0,1 с, остальные откладываются
+        self.assertEqual(result['sent'], 2)
+        self.assertEqual(len(result['deferred']), 3)
+        self.assertNotIn(0, result['deferred'])
+        sent = {message['chat_id'] for message in server.messages}
+        self.assertFalse(sent & {messages[index][0] for index in result['deferred']})
+
+    def test_failed_chats_are_reported(self):
+        with FakeBotAPIServer(missing_chats=['13']) as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                with self.assertLogs('telegram_app.delivery', level='ERROR'):
+                    result = send_telegram_batch([('12', 'ok'), ('13', 'lost'), (None, 'skip')])
+
+        self.assertEqual(result['sent'], 1)
+        self.assertEqual(result['failed'], ['13'])
+
+    def test_reply_markup_is_sent(self):
+        keyboard = {'inline_keyboard': [[{'text': '✅ Зарядка', 'callback_data': 'done:1'}]]}
+        with FakeBotAPIServer() as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                send_telegram_batch([('1', 'hello', keyboard)])
+
+        self.assertEqual(server.messages[0]['reply_markup'], keyboard)
+
+    def test_delivery_metrics(self):
+        sent = metric('habits_telegram_messages_total', outcome='sent')
+        failed = metric('habits_telegram_messages_total', outcome='failed')
+        rate_limited = metric('habits_telegram_rate_limited_total')
+        calls = metric('habits_telegram_send_duration_seconds_count')
+        with FakeBotAPIServer(rate_limited=1, retry_after=1, missing_chats=['13']) as server:
+            with override_settings(TELEGRAM_API_BASE_URL=server.base_url):
+                with self.assertLogs('telegram_app.delivery', level='ERROR'):
+                    send_telegram_batch([('12', 'ok'), ('13', 'lost')])
+
+        self.assertEqual(metric('habits_telegram_messages_total', outcome='sent'), sent + 1)
+        self.assertEqual(metric('habits_telegram_messages_total', outcome='failed'), failed + 1)
+        self.assertEqual(metric('habits_telegram_rate_limited_total'), rate_limited + 1)
+        self.assertEqual(metric('habits_telegram_send_duration_seconds_count'), calls + 3)
+
+
+class FakeRateRedis:
+    """Выполняет скрипты RedisRateLimiter в памяти: одно состояние на все ограничители."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.next_at = 0
+
+    async def eval(self, script, numkeys, key, *args):
+        if self.fail:
+            raise ConnectionError('redis is down')
+        now = int(time.monotonic() * 1e6)
+        if script == RedisRateLimiter.RESERVE_SCRIPT:
+            delay, interval, max_wait = args
+            at = max(now + delay, self.next_at)
+            if 0 <= max_wait < at - now:
+                return -1
+            self.next_at = at + interval
+            return at - now
+        self.next_at = max(self.next_at, now + args[0])
+        return 0
+
+    async def aclose(self):
+        pass
+
+
+class SharedRateLimitTest(TestCase):
+    """Общий лимит Telegram на все пачки, которые отправляются параллельно."""
+
+    def acquire_all(self, limiters, chats):
+        async def run():
+            start = time.monotonic()
+            await asyncio.gather(*(
+                limiters[number % len(limiters)].acquire(chat_id)
+                for number, chat_id in enumerate(chats)))
+            return time.monotonic() - start
+
+        return asyncio.run(run())
+
+    def test_parallel_batches_share_global_rate(self):
+        redis = FakeRateRedis()
+        limiters = [RedisRateLimiter(redis, 20, 0, 'telegram:rate') for _ in range(2)]
+
+        elapsed = self.acquire_all(limiters, [str(chat_id) for chat_id in range(10)])
+
+        # 10 слотов по 50 мс на двоих, а не по 5 на каждый ограничитель
+        self.assertGreaterEqual(elapsed, 0.4)
+
+    def test_pause_applies_to_all_batches(self):
+        redis = FakeRateRedis()
+        first, second = (RedisRateLimiter(redis, 1000, 0, 'telegram:rate') for _ in range(2))
+
+        async def run():
+            await first.pause(0.3)
+            start = time.monotonic()
+            await second.acquire('1')
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.25)
+
+    def test_reservation_wait_is_capped(self):
+        redis = FakeRateRedis()
+        limiter = RedisRateLimiter(redis, 10, 0, 'telegram:rate')
+
+        async def run():
+            first = await limiter.acquire('1', max_wait=0.05)
+            # Следующий слот через 0,1 с: дальше max_wait, ничего не резервируется
+            second = await limiter.acquire('2', max_wait=0.05)
+            return first, second, redis.next_at
+
+        first, second, next_at = asyncio.run(run())
+        self.assertEqual((first, second), (True, False))
+        self.assertEqual(redis.next_at, next_at)
+
+    def test_local_limit_when_redis_is_unavailable(self):
+        limiter = RedisRateLimiter(FakeRateRedis(fail=True), 20, 0, 'telegram:rate')
+
+        with self.assertLogs('telegram_app.delivery', level='WARNING'):
+            elapsed = self.acquire_all([limiter], ['1', '2', '3'])
+
+        self.assertGreaterEqual(elapsed, 0.09)
+
+    def test_redis_limiter_is_used_with_redis_url(self):
+        redis = FakeRateRedis()
+        with override_settings(REDIS_URL='redis://redis:6379/1'), \
+                patch('redis.asyncio.Redis.from_url', return_value=redis):
+            limiter, client = create_rate_limiter()
+
+        self.assertIsInstance(limiter, RedisRateLimiter)
+        self.assertIs(client, redis)
+        with override_settings(REDIS_URL=''):
+            limiter, client = create_rate_limiter()
+        self.assertNotIsInstance(limiter, RedisRateLimiter)
+        self.assertIsNone(client)
+
+
+class TelegramBotStartTest(TestCase):
+    """Команда /start: привязка chat_id через асинхронный ORM и кеш."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com',
+            password='password123',
+            telegram_username='tester')
+
+    def make_update(self, username, chat_id=555):
+        update = MagicMock()
+        update.message.chat_id = chat_id
+        update.message.from_user.username = username
+        update.message.reply_text = AsyncMock()
+        return update
+
+    async def test_start_links_chat_id(self):
+        update = self.make_update('tester')
+
+        await start(update, None)
+
+        update.message.reply_text.assert_awaited_once_with(
+            "Привет, test@example.com! Ваш Telegram-чат ID сохранен.")
+        user = await CustomUser.objects.aget(pk=self.user.pk)
+        self.assertEqual(user.telegram_chat_id, '555')
+
+    async def test_unknown_username(self):
+        update = self.make_update('stranger')
+
+        await start(update, None)
+
+        update.message.reply_text.assert_awaited_once_with(
+            "Пользователь с таким Telegram username не найден.")
+
+    def test_lookup_is_cached(self):
+        async_to_sync(link_chat)('tester', 1)
+        with self.assertNumQueries(1):  # только UPDATE chat_id
+            email = async_to_sync(link_chat)('tester', 2)
+        self.assertEqual(email, 'test@example.com')
+
+    async def test_stale_cache_entry_is_refreshed(self):
+        await link_chat('tester', 1)
+        # username сменили в обход сигналов — запись в кеше устарела
+        await CustomUser.objects.filter(pk=self.user.pk).aupdate(telegram_username='renamed')
+        other = await CustomUser.objects.acreate(
+            email='other@example.com', telegram_username='tester')
+
+        email = await link_chat('tester', 2)
+
+        self.assertEqual(email, 'other@example.com')
+        other = await CustomUser.objects.aget(pk=other.pk)
+        self.assertEqual(other.telegram_chat_id, '2')
+
+    def test_saving_user_resets_not_found_cache(self):
+        self.assertIsNone(async_to_sync(link_chat)('newcomer', 1))
+        CustomUser.objects.create_user(
+            email='new@example.com', password='password123', telegram_username='newcomer')
+        self.assertEqual(async_to_sync(link_chat)('newcomer', 1), 'new@example.com')
+
+
+class TelegramDoneButtonTest(TestCase):
+    """Кнопка "Выполнено" под напоминанием отмечает привычку."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123', telegram_chat_id='555')
+        self.habit = Habit.objects.create(
+            user=self.user, action="Зарядка", time=datetime.time(7, 30), place="Дом", duration=60)
+
+    def press(self, habit_id, chat_id=555):
+        update = MagicMock()
+        update.callback_query.data = f'done:{habit_id}'
+        update.callback_query.message.chat_id = chat_id
+        update.callback_query.answer = AsyncMock()
+        async_to_sync(done)(update, None)
+        return update.callback_query.answer
+
+    def test_done_marks_habit(self):
+        answer = self.press(self.habit.id)
+
+        answer.assert_awaited_once_with("Отмечено! Серия: 1")
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.completion_count, 1)
+
+    def test_done_uses_owner_timezone(self):
+        self.user.timezone = 'Pacific/Kiritimati'
+        self.user.save()
+        # 12:00 UTC: на сервере (Париж) 10 марта, у владельца уже 11 марта
+        now = datetime.datetime(2026, 3, 10, 12, tzinfo=datetime.timezone.utc)
+        with patch('django.utils.timezone.now', return_value=now):
+            self.press(self.habit.id)
+
+        self.assertEqual(self.habit.completions.get().date, datetime.date(2026, 3, 11))
+
+    def test_foreign_chat_cannot_mark_habit(self):
+        answer = self.press(self.habit.id, chat_id=777)
+
+        answer.assert_awaited_once_with("Привычка не найдена.")
+        self.assertFalse(self.habit.completions.exists())
+
+
+class TelegramBotProcessTest(TestCase):
+    """Бот работает отдельным процессом и принимает обновления через вебхук."""
+
+    def post_update(self, headers, secret_token='s3cret'):
+        from aiohttp.test_utils import TestClient, TestServer
+
+        application = build_application(webhook=True)
+        payload = {
+            'update_id': 1,
+            'message': {
+                'message_id': 1, 'date': 0, 'text': '/start',
+                'chat': {'id': 555, 'type': 'private'},
+                'from': {'id': 7, 'is_bot': False, 'first_name': 'T', 'username': 'tester'},
+            },
+        }
+
+        async def post():
+            app = create_webhook_app(application, '/telegram/', secret_token=secret_token)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.post('/telegram/', json=payload, headers=headers)
+                return response.status
+
+        return async_to_sync(post)(), application.update_queue
+
+    def test_webhook_queues_update(self):
+        status, queue = self.post_update({SECRET_TOKEN_HEADER: 's3cret'})
+
+        self.assertEqual(status, 200)
+        update = queue.get_nowait()
+        self.assertEqual(update.message.chat_id, 555)
+        self.assertEqual(update.message.from_user.username, 'tester')
+
+    def test_webhook_rejects_wrong_secret(self):
+        status, queue = self.post_update({SECRET_TOKEN_HEADER: 'wrong'})
+
+        self.assertEqual(status, 403)
+        self.assertTrue(queue.empty())
+
+    def test_webhook_rejects_everything_without_secret(self):
+        for headers in ({}, {SECRET_TOKEN_HEADER: ''}):
+            status, queue = self.post_update(headers, secret_token='')
+            self.assertEqual(status, 403)
+            self.assertTrue(queue.empty())
+        status, _queue = self.post_update({})
+        self.assertEqual(status, 403)
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='')
+    def test_runbot_webhook_requires_secret(self):
+        with patch('telegram_app.bot.serve_webhook') as mock_serve, \
+                self.assertRaisesMessage(CommandError, 'TELEGRAM_WEBHOOK_SECRET'):
+            call_command('runbot', '--webhook', '--webhook-url', 'https://example.com/telegram/')
+        mock_serve.assert_not_called()
+
+    def test_web_and_worker_do_not_import_telegram(self):
+        code = (
+            'import sys, django; django.setup(); '
+            'import config.urls, config.celery, telegram_app.tasks; '
+            'print("telegram" in sys.modules)'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'})
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+class ReminderSchedulerTest(TestCase):
+    """Планировщик напоминаний: куча в памяти, изменения через pub/sub."""
+
+    def setUp(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        self.user = CustomUser.objects.create_user(
+            email='test@example.com', password='password123', telegram_chat_id='555')
+        self.now = timezone.now()
+        self.soon = self.create_habit(self.now + timedelta(minutes=1))
+        self.later = self.create_habit(self.now + timedelta(minutes=5))
+        self.far = self.create_habit(self.now + timedelta(hours=1))
+        self.dispatched = []
+        self.scheduler = ReminderScheduler(dispatch=self.dispatched.append, horizon=15 * 60)
+
+    def create_habit(self, next_reminder, user=None):
+        return Habit.objects.create(
+            user=user or self.user, action="Зарядка", time=datetime.time(7, 30),
+            place="Дом", duration=60, next_reminder=next_reminder)
+
+    def test_reminders_are_dispatched_on_time(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.scheduler.tick(self.now), [])
+        self.assertEqual(len(self.scheduler.heap), 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scheduler.tick(self.now + timedelta(minutes=2)), [self.soon.id])
+        self.assertEqual(self.scheduler.tick(self.now + timedelta(minutes=6)), [self.later.id])
+        self.assertEqual(self.dispatched, [[self.soon.id], [self.later.id]])
+
+    def test_changes_between_reloads(self):
+        self.scheduler.tick(self.now)
+        new = self.create_habit(self.now + timedelta(minutes=3))
+
+        self.scheduler.handle_message(encode_change(self.soon.id, self.now + timedelta(minutes=10)))
+        self.scheduler.handle_message(encode_change(self.later.id, None))
+        self.scheduler.handle_message(encode_change(new.id, new.next_reminder))
+        self.scheduler.handle_message('not json')
+
+        self.assertEqual(self.scheduler.tick(self.now + timedelta(minutes=6)), [new.id])
+        self.assertEqual(self.scheduler.tick(self.now + timedelta(minutes=11)), [self.soon.id])
+
+    def test_habit_changes_are_published(self):
+        redis = MagicMock()
+        with override_settings(REMINDER_SCHEDULER_ENABLED=True, REDIS_URL='redis://redis:6379/1'), \
+                patch('habits.events.get_redis', return_value=redis), \
+                self.captureOnCommitCallbacks(execute=True):
+            habit = self.create_habit(self.now + timedelta(minutes=7))
+
+        pipeline = redis.pipeline.return_value
+        pipeline.publish.assert_called_once_with(
+            settings.REMINDER_SCHEDULER_CHANNEL, encode_change(habit.id, habit.next_reminder))
+        pipeline.execute.assert_called_once()
+
+    def test_bulk_reminder_changes_are_published(self):
+        redis = MagicMock()
+        Habit.objects.filter(id=self.later.id).update(next_reminder=self.now - timedelta(hours=1))
+        with override_settings(REMINDER_SCHEDULER_ENABLED=True, REDIS_URL='redis://redis:6379/1'), \
+                patch('habits.events.get_redis', return_value=redis), \
+                self.captureOnCommitCallbacks(execute=True):
+            Habit.objects.filter(id=self.soon.id).advance_reminders()
+            Habit.objects.reschedule_missed(self.now)
+
+        self.soon.refresh_from_db()
+        self.later.refresh_from_db()
+        pipeline = redis.pipeline.return_value
+        self.assertEqual(pipeline.publish.call_args_list, [
+            call(settings.REMINDER_SCHEDULER_CHANNEL, encode_change(self.soon.id, self.soon.next_reminder)),
+            call(settings.REMINDER_SCHEDULER_CHANNEL, encode_change(self.later.id, self.later.next_reminder)),
+        ])
+
+    @override_settings(REDIS_URL='', REMINDER_SCHEDULER_MAX_BACKOFF_SECONDS=0.01)
+    def test_run_survives_failed_steps(self):
+        """Ошибка шага не останавливает цикл: после паузы напоминания перечитываются из базы."""
+        Habit.objects.filter(id=self.soon.id).update(next_reminder=self.now - timedelta(seconds=5))
+        stop_event = threading.Event()
+        attempts = []
+
+        def dispatch(habit_ids):
+            attempts.append(habit_ids)
+            if len(attempts) == 1:
+                raise ConnectionError('broker is down')
+            stop_event.set()
+
+        scheduler = ReminderScheduler(dispatch=dispatch, horizon=15 * 60)
+        # Закрытие соединения оборвало бы транзакцию теста
+        with self.assertLogs('telegram_app.scheduler', level='ERROR') as logs, \
+                patch('telegram_app.scheduler.close_old_connections') as close_connections:
+            scheduler.run(stop_event, max_wait=0.01)
+
+        self.assertEqual(attempts, [[self.soon.id], [self.soon.id]])
+        close_connections.assert_called_once()
+        self.assertIn('broker is down', logs.output[0])
+
+    @override_settings(REMINDER_SCHEDULER_ENABLED=False)
+    def test_runscheduler_requires_flag(self):
+        with patch('telegram_app.management.commands.runscheduler.ReminderScheduler') as scheduler:
+            with self.assertRaises(CommandError):
+                call_command('runscheduler')
+        scheduler.assert_not_called()
+
+    @patch('telegram_app.delivery.send_telegram_batch')
+    def test_send_habit_reminders_sends_once(self, mock_batch):
+        mock_batch.return_value = {'sent': 1, 'failed': [], 'deferred': [], 'rate_limited': 0}
+        Habit.objects.filter(id=self.soon.id).update(next_reminder=self.now - timedelta(seconds=5))
+
+        self.assertEqual(send_habit_reminders([self.soon.id, self.far.id]), 1)
+        # Повторная отправка той же пачки ничего не шлет: привычка уже перенесена
+        self.assertEqual(send_habit_reminders([self.soon.id]), 0)
+
+        self.assertEqual(mock_batch.call_count, 1)
+        self.soon.refresh_from_db()
+        self.assertGreater(self.soon.next_reminder, timezone.now())
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from hashlib import sha256
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+# Поля пользователя, которые кешируются вместе с токеном. Хеш пароля
+# в кеш не попадает; остальные поля загружаются из базы при обращении.
+CACHED_USER_FIELDS = ('id', 'email', 'timezone', 'is_active', 'is_staff', 'is_superuser')
+
+
+class LocalLRUCache:
+    """Небольшой LRU-кеш в памяти процесса с временем жизни записей."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_token_cache = LocalLRUCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_CACHE_TTL)
+
+
+def token_cache_key(key):
+    # В кеше хранится только хеш токена, сам токен не попадает в Redis
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_token(key):
+    """Удаляет токен из обоих уровней кеша (выход, смена токена, блокировка)."""
+    cache_key = token_cache_key(key)
+    local_token_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+def invalidate_user_tokens(user_ids):
+    """Удаляет из кеша все токены пользователей (изменились их кешируемые поля)."""
+    from rest_framework.authtoken.models import Token
+
+    for key in Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса Token + CustomUser на каждый вызов:
+    сначала LRU в памяти процесса, затем общий кеш (Redis), затем база.
+    В кеше лежат только поля CACHED_USER_FIELDS и дата создания токена.
+    Локальный уровень живет AUTH_TOKEN_LOCAL_CACHE_TTL секунд — это
+    максимальная задержка, с которой другие процессы увидят инвалидацию.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        credentials = local_token_cache.get(cache_key)
+        if credentials is None:
+            credentials = cache.get(cache_key)
+            if credentials is None:
+                user, token = super().authenticate_credentials(key)
+                credentials = ({field: getattr(user, field) for field in CACHED_USER_FIELDS}, token.created)
+                cache.set(cache_key, credentials, settings.AUTH_TOKEN_CACHE_TTL)
+                local_token_cache.set(cache_key, credentials)
+                return user, token
+            local_token_cache.set(cache_key, credentials)
+        fields, created = credentials
+        if not fields['is_active']:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        # Новый экземпляр на каждый запрос: незакешированные поля отложены (deferred)
+        user_model = get_user_model()
+        names = [field.attname for field in user_model._meta.concrete_fields if field.attname in fields]
+        user = user_model.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+        return user, self.get_model()(key=key, user=user, created=created)
@@ -0,0 +1,14 @@
+import csv
+import io
+
+IMPORT_FIELDS = ('email', 'password', 'phone_number', 'telegram_username')
+
+
+def read_users_csv(stream):
+    """Строки CSV для CustomUser.objects.bulk_import; лишние колонки отбрасываются."""
+    for row in csv.DictReader(stream):
+        yield {field: row[field] for field in IMPORT_FIELDS if row.get(field)}
+
+
+def read_uploaded_csv(uploaded_file):
+    return read_users_csv(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig'))
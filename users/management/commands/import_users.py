@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from users.imports import read_users_csv
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт пользователей из CSV (email,password[,phone_number,telegram_username])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к CSV-файлу')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Число процессов для хеширования паролей (0 — без пула)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+            created, skipped = CustomUser.objects.bulk_import(
+                read_users_csv(stream),
+                processes=options['processes'],
+                batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Создано пользователей: {created}'))
+        if skipped:
+            self.stdout.write(f'Пропущено (некорректные или уже существующие): {len(skipped)}')
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:18
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_case_duplicates(apps, schema_editor):
+    """
+    Ограничение не создастся, если в базе уже есть email, различающиеся
+    только регистром: такие аккаунты нужно объединить или переименовать вручную.
+    """
+    CustomUser = apps.get_model('users', 'CustomUser')
+    duplicates = list(
+        CustomUser.objects.annotate(email_lower=Lower('email'))
+        .values('email_lower').annotate(count=Count('id')).filter(count__gt=1)
+        .values_list('email_lower', flat=True)[:20])
+    if duplicates:
+        raise RuntimeError(
+            'Перед миграцией объедините пользователей с email, различающимися только регистром: '
+            + ', '.join(duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_alter_customuser_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_customuser_email_ci_unique'),
+        ),
+    ]
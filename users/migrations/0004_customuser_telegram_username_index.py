@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_customuser_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='telegram_username',
+            field=models.CharField(blank=True, db_index=True, help_text='Введите ваш ник в Telegram для связи с ботом.', max_length=100, null=True, verbose_name='Telegram Username'),
+        ),
+    ]
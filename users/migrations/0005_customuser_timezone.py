@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:36
+
+import users.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_customuser_telegram_username_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='timezone',
+            field=models.CharField(default='Europe/Paris', help_text='Часовой пояс IANA, в котором приходят напоминания (например, Europe/Moscow).', max_length=63, validators=[users.validators.validate_timezone], verbose_name='Часовой пояс'),
+        ),
+    ]
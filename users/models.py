@@ -1,11 +1,31 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.auth.hashers import check_password
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
 from django.core.exceptions import ValidationError
+from itertools import islice
+from .validators import validate_timezone
 
 
-class CustomUserManager(BaseUserManager):
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        UPDATE в обход save() (массовые действия, админка) тоже сбрасывает
+        кеш токенов, если меняются кешируемые поля пользователя или пароль.
+        """
+        from .authentication import CACHED_USER_FIELDS, invalidate_user_tokens
+
+        if not kwargs.keys() & {*CACHED_USER_FIELDS, 'password'}:
+            return super().update(**kwargs)
+        user_ids = list(self.values_list('id', flat=True))
+        updated = super().update(**kwargs)
+        invalidate_user_tokens(user_ids)
+        return updated
+
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     """Менеджер для создания пользователей и суперпользователей с Email в качестве ключа аутентификации."""
 
     def create_user(self, email, password=None, **extra_fields):
@@ -22,22 +42,86 @@ class CustomUserManager(BaseUserManager):
 
         email = self.normalize_email(email)
 
-        # Проверка на дубликат email
-        if CustomUser.objects.filter(email=email).exists():
-            raise ValidationError(
-                _('Пользователь с таким email уже существует.'))
-
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
 
+        # Дубликаты ловит уникальный индекс, без отдельного запроса exists()
         try:
-            user.save(using=self._db)
+            with transaction.atomic(using=self._db):
+                user.save(using=self._db)
         except IntegrityError:
             raise ValidationError(
-                _('Не удалось создать пользователя. Пользователь с таким email уже существует.'))
+                _('Пользователь с таким email уже существует.'))
 
         return user
 
+    def bulk_import(self, rows, processes=None, batch_size=1000):
+        """
+        Массовое создание пользователей (импорт из CSV).
+        rows — словари с ключами email, password и необязательными полями модели;
+        они читаются пачками по batch_size, поэтому файл не держится в памяти
+        целиком. Строки с некорректными полями (проверка как в clean_fields),
+        повторами и уже существующими email пропускаются. Пароли хешируются
+        параллельно в пуле процессов, пользователи вставляются через bulk_create.
+        Возвращает (создано, пропущенные email).
+        """
+        created = 0
+        skipped = []
+        seen = set()
+        rows = iter(rows)
+        while batch := list(islice(rows, batch_size)):
+            users = {}
+            for row in batch:
+                row = dict(row)
+                email = self.normalize_email(row.pop('email', '') or '').strip()
+                password = row.pop('password', '')
+                user = self.model(email=email, **row)
+                if not password or email.lower() in seen or not self._valid_import_row(user):
+                    skipped.append(email)
+                    continue
+                seen.add(email.lower())
+                users[email.lower()] = (user, password)
+            batch_created, batch_skipped = self._import_batch(users, processes)
+            created += batch_created
+            skipped += batch_skipped
+        return created, skipped
+
+    @staticmethod
+    def _valid_import_row(user):
+        # Длины и форматы полей проверяются до вставки: иначе DataError валит весь импорт
+        try:
+            user.clean_fields(exclude=['password'])
+        except ValidationError:
+            return False
+        return True
+
+    def _import_batch(self, users, processes):
+        """Вставляет пачку {email в нижнем регистре: (пользователь, пароль)}."""
+        from .passwords import hash_passwords
+
+        # Уже существующие email отсекаем одним запросом на пачку
+        existing = set(self._by_emails(users).values_list('email_lower', flat=True))
+        skipped = [users.pop(email)[0].email for email in existing]
+        if not users:
+            return 0, skipped
+
+        hashes = hash_passwords([password for _user, password in users.values()], processes)
+        new_users = []
+        for (user, _password), password_hash in zip(users.values(), hashes):
+            user.password = password_hash
+            new_users.append(user)
+        # ignore_conflicts: пользователь мог появиться параллельно с импортом
+        self.bulk_create(new_users, ignore_conflicts=True)
+        # bulk_create с ignore_conflicts не сообщает, какие строки вставлены:
+        # вставлены те, у кого в базе наш хеш (соль у каждого хеша своя)
+        stored = set(self._by_emails(users).values_list('password', flat=True))
+        inserted = [user for user in new_users if user.password in stored]
+        skipped += [user.email for user in new_users if user.password not in stored]
+        return len(inserted), skipped
+
+    def _by_emails(self, emails):
+        return self.annotate(email_lower=Lower('email')).filter(email_lower__in=list(emails))
+
     def create_superuser(self, email, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -68,6 +152,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         max_length=100,
         blank=True,
         null=True,
+        db_index=True,
         verbose_name='Telegram Username',
         help_text=_('Введите ваш ник в Telegram для связи с ботом.')
     )
@@ -77,6 +162,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         null=True,
         verbose_name='Telegram Chat ID',
         help_text=_('Чат ID используется для отправки уведомлений через Telegram.'))
+    timezone = models.CharField(
+        max_length=63,
+        default='Europe/Paris',
+        validators=[validate_timezone],
+        verbose_name='Часовой пояс',
+        help_text=_('Часовой пояс IANA, в котором приходят напоминания (например, Europe/Moscow).'))
     is_active = models.BooleanField(default=True, help_text=_(
         'Указывает, активен ли пользователь. Отключите это поле вместо удаления аккаунта.'))
     is_staff = models.BooleanField(default=False, help_text=_(
@@ -91,6 +182,25 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'  # Аутентификация по email
     REQUIRED_FIELDS = []  # Нет обязательных полей, кроме email и пароля
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходный часовой пояс: при его смене расписание привычек пересчитывается
+        instance.loaded_timezone = instance.__dict__.get('timezone')
+        return instance
+
+    def check_password(self, raw_password):
+        """
+        Проверка пароля без синхронного перехеширования: если хеш устарел
+        (сменились параметры хешера), обновление уходит в фоновый поток.
+        """
+        from .passwords import schedule_rehash
+
+        def setter(raw_password):
+            schedule_rehash(self.pk, self.password, raw_password)
+
+        return check_password(raw_password, self.password, setter)
+
     def __str__(self):
         return self.email
 
@@ -98,3 +208,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ['email']
+        constraints = [
+            # Email уникален без учета регистра
+            models.UniqueConstraint(Lower('email'), name='users_customuser_email_ci_unique'),
+        ]
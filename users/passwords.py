@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from threading import BoundedSemaphore
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Один фоновый поток на процесс: перехеширование не задерживает ответ на вход,
+# а пароль в открытом виде не покидает процесс (не уходит в брокер задач)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehash')
+# Места в очереди потока: при волне входов после смены хешера очередь
+# (и пароли в открытом виде в ней) не растет без предела
+_slots = BoundedSemaphore(settings.PASSWORD_REHASH_QUEUE_SIZE)
+
+
+def schedule_rehash(user_id, old_hash, raw_password):
+    """
+    Ставит обновление хеша пароля в фоновую очередь процесса. Если очередь
+    заполнена, обновление пропускается: хеш обновится при следующем входе.
+    """
+    if not _slots.acquire(blocking=False):
+        logger.warning(f"Password rehash queue is full, skipping user {user_id}")
+        return
+    try:
+        _executor.submit(_rehash_in_background, user_id, old_hash, raw_password)
+    except Exception:
+        _slots.release()
+        raise
+
+
+def _rehash_in_background(user_id, old_hash, raw_password):
+    try:
+        rehash_password(user_id, old_hash, raw_password)
+    finally:
+        _slots.release()
+        # Соединения фонового потока не должны висеть открытыми
+        connections.close_all()
+
+
+def rehash_password(user_id, old_hash, raw_password):
+    """
+    Пересчитывает хеш с текущими параметрами хешера. Запись обновляется,
+    только если пароль не поменяли, пока задача ждала в очереди.
+    """
+    from .models import CustomUser
+
+    try:
+        updated = CustomUser.objects.filter(pk=user_id, password=old_hash).update(
+            password=make_password(raw_password))
+        if updated:
+            logger.info(f"Upgraded password hash for user {user_id}")
+    except Exception as e:
+        logger.error(f"Failed to upgrade password hash for user {user_id}: {str(e)}")
+
+
+def _init_hash_worker():
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, processes=None):
+    """
+    Хеширует список паролей в пуле процессов (хеширование упирается в CPU,
+    потоки из-за GIL не помогут). processes=0 — в текущем процессе.
+    """
+    if processes == 0 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    workers = processes or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import CustomUser
 
@@ -8,7 +9,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CustomUser
-        fields = ['email', 'password', 'confirm_password']
+        fields = ['email', 'password', 'confirm_password', 'timezone']
+        # Уникальность проверяет индекс в базе, а не отдельный запрос UniqueValidator
+        extra_kwargs = {'email': {'validators': []}}
 
     def validate(self, data):
         if data['password'] != data['confirm_password']:
@@ -16,9 +19,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        user = CustomUser(
-            email=validated_data['email']
-        )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
+        try:
+            extra_fields = {}
+            if 'timezone' in validated_data:
+                extra_fields['timezone'] = validated_data['timezone']
+            return CustomUser.objects.create_user(
+                email=validated_data['email'],
+                password=validated_data['password'],
+                **extra_fields)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'email': e.messages})
+
+
+class UserImportSerializer(serializers.Serializer):
+    file = serializers.FileField(help_text="CSV с колонками email,password[,phone_number,telegram_username]")
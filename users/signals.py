@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user_tokens
+from .models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход или смена токена: старый токен больше не должен приниматься из кеша
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    # В кеше лежат поля пользователя (в т.ч. is_active) — сбрасываем их при изменениях
+    if created:
+        return
+    invalidate_user_tokens([instance.id])
+
+
+@receiver(post_save, sender=CustomUser)
+def telegram_username_changed(sender, instance, **kwargs):
+    # Бот кеширует соответствие username -> пользователь (в т.ч. "не найден")
+    if instance.telegram_username:
+        from telegram_app.linking import telegram_username_cache_key
+        cache.delete(telegram_username_cache_key(instance.telegram_username))
@@ -0,0 +1,28 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from users.imports import read_uploaded_csv
+from users.models import CustomUser
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def import_storage():
+    """Каталог загруженных CSV: общий для приложения и воркеров Celery."""
+    return FileSystemStorage(location=settings.USER_IMPORT_DIR)
+
+
+# Импорт пользователей из загруженного CSV. Пароли хешируются в воркере, а не
+# в HTTP-запросе; через брокер передается только имя файла, а не пароли.
+# Хеширование большого файла дольше общего CELERY_TASK_TIME_LIMIT
+@shared_task(time_limit=60 * 60)
+def import_users_file(name):
+    storage = import_storage()
+    try:
+        with storage.open(name, 'rb') as uploaded_file:
+            created, skipped = CustomUser.objects.bulk_import(read_uploaded_csv(uploaded_file))
+    finally:
+        storage.delete(name)
+    logger.info(f"Imported {created} users from {name}, skipped {len(skipped)}")
+    return {'created': created, 'skipped': skipped}
@@ -4,6 +4,24 @@ from rest_framework.test import APITestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from django.core.cache import cache
+from users.authentication import (
+    CachedTokenAuthentication, LocalLRUCache, local_token_cache, token_cache_key)
+from users.passwords import _rehash_in_background, rehash_password, schedule_rehash
+from django.contrib.auth.hashers import make_password
+from django.test import override_settings
+from unittest.mock import patch
+from django.contrib.auth.hashers import check_password
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from users.passwords import hash_passwords
+from users.tasks import import_users_file
+from threading import BoundedSemaphore
+import io
+import os
+import tempfile
+import time
 
 
 
@@ -192,6 +210,22 @@ class UserRegistrationTest(APITestCase):
             CustomUser.objects.get().email,
             'testuser@example.com')
 
+    def test_registration_with_timezone(self):
+        url = reverse('user-registration')
+        data = {
+            'email': 'testuser@example.com',
+            'password': 'password123',
+            'confirm_password': 'password123',
+            'timezone': 'Asia/Tokyo'
+        }
+        self.assertEqual(self.client.post(url, data).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CustomUser.objects.get().timezone, 'Asia/Tokyo')
+
+        data.update(email='other@example.com', timezone='Mars/Olympus')
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('timezone', response.data)
+
 
 class UserLoginTestCase(APITestCase):
 
@@ -216,3 +250,382 @@ class UserLoginTestCase(APITestCase):
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_token_cache.clear()
+        self.user = CustomUser.objects.create_user(email='testuser@example.com', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.url = '/api/habits/'
+
+    def authorize(self, key=None):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key or self.token.key}')
+
+    def test_token_lookup_is_cached(self):
+        self.authorize()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        # Повторный запрос: только COUNT привычек (список пуст), без Token + CustomUser
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_shared_cache_is_used_when_local_cache_is_empty(self):
+        self.authorize()
+        self.client.get(self.url)
+        local_token_cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_invalid_token(self):
+        self.authorize('invalid')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_invalidates_token(self):
+        self.authorize()
+        self.client.get(self.url)
+
+        response = self.client.post(reverse('user-logout'))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_rotation_invalidates_old_token(self):
+        self.authorize()
+        self.client.get(self.url)
+        old_key = self.token.key
+        self.token.delete()
+        Token.objects.create(user=self.user)
+
+        self.authorize(old_key)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.authorize()
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_hash_is_not_cached(self):
+        self.authorize()
+        self.client.get(self.url)
+
+        fields, _created = cache.get(token_cache_key(self.token.key))
+        self.assertNotIn('password', fields)
+        self.assertNotIn(self.user.password, repr(fields))
+
+    def test_cached_user_loads_other_fields_on_access(self):
+        self.authorize()
+        self.client.get(self.url)
+
+        user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+        self.assertEqual((user.id, user.email, token.key), (self.user.id, self.user.email, self.token.key))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('password123'))
+
+    def test_bulk_deactivation_invalidates_token(self):
+        self.authorize()
+        self.client.get(self.url)
+
+        CustomUser.objects.filter(id=self.user.id).update(is_active=False)
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_local_cache_is_lru_with_ttl(self):
+        lru = LocalLRUCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+
+        expired = LocalLRUCache(maxsize=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+
+class LoginThrottleTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='testuser@example.com', password='password123')
+        self.url = reverse('user-login')
+
+    @patch('users.views.authenticate', return_value=None)
+    def test_email_throttle_rejects_before_hashing(self, mock_authenticate):
+        data = {'email': 'testuser@example.com', 'password': 'wrong'}
+        for _ in range(5):
+            self.assertEqual(self.client.post(self.url, data).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, data)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Шестая попытка не дошла до authenticate() и хеширования пароля
+        self.assertEqual(mock_authenticate.call_count, 5)
+
+    @patch('users.views.authenticate', return_value=None)
+    def test_email_throttle_is_case_insensitive(self, mock_authenticate):
+        for number in range(5):
+            email = 'TestUser@Example.com' if number % 2 else 'testuser@example.com'
+            self.client.post(self.url, {'email': email, 'password': 'wrong'})
+        response = self.client.post(self.url, {'email': 'TESTUSER@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @patch('users.views.authenticate', return_value=None)
+    def test_ip_throttle_covers_many_accounts(self, mock_authenticate):
+        for number in range(30):
+            self.client.post(self.url, {'email': f'user{number}@example.com', 'password': 'wrong'})
+        response = self.client.post(self.url, {'email': 'other@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class FakeThrottleRedis:
+    """Выполняет скрипт AtomicRateThrottle в памяти: окна попыток по ключам."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.windows = {}
+
+    def eval(self, script, numkeys, key, window, limit, member):
+        if self.fail:
+            raise ConnectionError('redis is down')
+        now = int(time.time() * 1e6)
+        hits = [at for at in self.windows.get(key, []) if at > now - window]
+        self.windows[key] = hits
+        if len(hits) >= limit:
+            return hits[0] + window - now
+        hits.append(now)
+        return -1
+
+
+@override_settings(REDIS_URL='redis://redis:6379/0')
+class RedisLoginThrottleTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('user-login')
+        self.data = {'email': 'testuser@example.com', 'password': 'wrong'}
+
+    @patch('users.views.authenticate', return_value=None)
+    def test_attempts_are_counted_in_redis(self, mock_authenticate):
+        redis = FakeThrottleRedis()
+        with patch('users.throttling.get_redis', return_value=redis):
+            for _ in range(5):
+                self.assertEqual(self.client.post(self.url, self.data).status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.post(self.url, self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(mock_authenticate.call_count, 5)
+        self.assertLessEqual(int(response['Retry-After']), 60)
+        # Окна хранятся только в Redis, а не в кеше Django
+        self.assertEqual(len(redis.windows), 2)
+
+    @patch('users.views.authenticate', return_value=None)
+    def test_falls_back_to_cache_without_redis(self, mock_authenticate):
+        with patch('users.throttling.get_redis', return_value=FakeThrottleRedis(fail=True)):
+            for _ in range(5):
+                self.client.post(self.url, self.data)
+            response = self.client.post(self.url, self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+])
+class PasswordRehashTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='testuser@example.com', password='password123')
+        # Хеш устаревшим алгоритмом
+        self.user.password = make_password('password123', hasher='md5')
+        self.user.save()
+
+    @patch('users.passwords._executor')
+    def test_login_schedules_rehash_without_doing_it_inline(self, mock_executor):
+        response = self.client.post(
+            reverse('user-login'), {'email': 'testuser@example.com', 'password': 'password123'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_executor.submit.assert_called_once()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
+
+    @patch('users.passwords._executor')
+    def test_rehash_queue_is_bounded(self, mock_executor):
+        with patch('users.passwords._slots', BoundedSemaphore(1)):
+            schedule_rehash(self.user.pk, self.user.password, 'password123')
+            schedule_rehash(self.user.pk, self.user.password, 'password123')
+
+            # Второе перехеширование не встает в очередь, пока первое не выполнено
+            mock_executor.submit.assert_called_once()
+            with patch('users.passwords.connections'):  # соединение теста не закрывается
+                _rehash_in_background(*mock_executor.submit.call_args.args[1:])
+            schedule_rehash(self.user.pk, self.user.password, 'password123')
+
+        self.assertEqual(mock_executor.submit.call_count, 2)
+
+    def test_rehash_upgrades_hash(self):
+        rehash_password(self.user.pk, self.user.password, 'password123')
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('password123'))
+
+    def test_rehash_skips_changed_password(self):
+        old_hash = self.user.password
+        self.user.set_password('new-password')
+        self.user.save()
+
+        rehash_password(self.user.pk, old_hash, 'password123')
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password'))
+
+
+class RegistrationPipelineTest(APITestCase):
+
+    def test_duplicate_email_is_rejected_by_index(self):
+        CustomUser.objects.create_user(email='testuser@example.com', password='password123')
+        data = {
+            'email': 'TestUser@example.com',
+            'password': 'password123',
+            'confirm_password': 'password123'
+        }
+        response = self.client.post(reverse('user-registration'), data)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_registration_does_not_query_for_duplicates(self):
+        data = {
+            'email': 'testuser@example.com',
+            'password': 'password123',
+            'confirm_password': 'password123'
+        }
+        # SAVEPOINT, INSERT, RELEASE SAVEPOINT — без SELECT ... WHERE email
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('user-registration'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_case_insensitive_unique_email(self):
+        CustomUser.objects.create_user(email='testuser@example.com', password='password123')
+        with self.assertRaises(ValidationError):
+            CustomUser.objects.create_user(email='TESTUSER@example.com', password='password123')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkUserImportTest(APITestCase):
+
+    def setUp(self):
+        CustomUser.objects.create_user(email='existing@example.com', password='password123')
+        self.rows = [
+            {'email': 'first@example.com', 'password': 'secret1', 'telegram_username': 'first'},
+            {'email': 'second@example.com', 'password': 'secret2'},
+            {'email': 'Existing@example.com', 'password': 'secret3'},
+            {'email': 'FIRST@example.com', 'password': 'secret4'},
+            {'email': 'not-an-email', 'password': 'secret5'},
+        ]
+
+    def test_bulk_import(self):
+        created, skipped = CustomUser.objects.bulk_import(self.rows, processes=0)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(len(skipped), 3)
+        first = CustomUser.objects.get(email='first@example.com')
+        self.assertEqual(first.telegram_username, 'first')
+        self.assertTrue(first.check_password('secret1'))
+
+    def test_passwords_hashed_in_process_pool(self):
+        hashes = hash_passwords(['a', 'b', 'c'], processes=2)
+        self.assertEqual(len(hashes), 3)
+        self.assertTrue(check_password('b', hashes[1]))
+
+    def test_invalid_rows_are_skipped(self):
+        rows = [
+            {'email': 'phone@example.com', 'password': 'secret', 'phone_number': '1' * 40},
+            {'email': 'nopassword@example.com'},
+            {'email': 'ok@example.com', 'password': 'secret'},
+        ]
+        created, skipped = CustomUser.objects.bulk_import(rows, processes=0, batch_size=2)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(skipped, ['phone@example.com', 'nopassword@example.com'])
+        self.assertTrue(CustomUser.objects.filter(email='ok@example.com').exists())
+
+    def test_duplicates_across_batches_are_skipped(self):
+        created, skipped = CustomUser.objects.bulk_import(self.rows, processes=0, batch_size=1)
+
+        self.assertEqual(created, 2)
+        self.assertCountEqual(
+            skipped, ['Existing@example.com', 'FIRST@example.com', 'not-an-email'])
+
+    def test_conflicting_insert_is_not_counted(self):
+        # Пользователь появился между проверкой и вставкой: bulk_create его пропускает
+        original = CustomUser.objects.bulk_create
+
+        def bulk_create(users, **kwargs):
+            CustomUser.objects.create_user(email='race@example.com', password='other')
+            return original(users, **kwargs)
+
+        rows = [{'email': 'race@example.com', 'password': 'secret'},
+                {'email': 'calm@example.com', 'password': 'secret'}]
+        with patch.object(CustomUser.objects, 'bulk_create', bulk_create):
+            created, skipped = CustomUser.objects.bulk_import(rows, processes=0)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(skipped, ['race@example.com'])
+
+    def test_import_endpoint_and_command(self):
+        admin = CustomUser.objects.create_superuser(email='admin@example.com', password='password123')
+        self.client.force_authenticate(user=admin)
+        csv_file = SimpleUploadedFile(
+            'users.csv', b'email,password\nnew@example.com,secret\nexisting@example.com,secret\n')
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, import_dir)
+
+        with override_settings(USER_IMPORT_DIR=import_dir):
+            with patch('users.views.import_users_file') as mock_task:
+                mock_task.delay.return_value.id = 'task-id'
+                response = self.client.post(reverse('user-import'), {'file': csv_file})
+
+            # Запрос только сохраняет файл; пароли хешируются в задаче
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data, {'task_id': 'task-id'})
+            self.assertFalse(CustomUser.objects.filter(email='new@example.com').exists())
+            name, = mock_task.delay.call_args.args
+            with patch('users.passwords.ProcessPoolExecutor') as mock_pool:
+                result = import_users_file(name)
+
+        mock_pool.assert_not_called()  # одна строка — хешируется без пула
+        self.assertEqual(result, {'created': 1, 'skipped': ['existing@example.com']})
+        self.assertEqual(os.listdir(import_dir), [])
+
+        with patch('users.views.AsyncResult') as mock_result:
+            mock_result.return_value.status = 'SUCCESS'
+            mock_result.return_value.result = result
+            response = self.client.get(reverse('user-import-status', args=['task-id']))
+        mock_result.assert_called_once_with('task-id')
+        self.assertEqual(response.data, {'status': 'SUCCESS', **result})
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as stream:
+            stream.write('email,password,phone_number\ncmd@example.com,secret,123\n')
+        self.addCleanup(os.remove, stream.name)
+        call_command('import_users', stream.name, '--processes', '0', stdout=io.StringIO())
+        self.assertEqual(CustomUser.objects.get(email='cmd@example.com').phone_number, '123')
+
+    def test_import_endpoint_requires_admin(self):
+        user = CustomUser.objects.get(email='existing@example.com')
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('user-import'), {})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
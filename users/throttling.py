@@ -0,0 +1,77 @@
+from django.conf import settings
+from hashlib import sha256
+from config.redis import get_redis
+from rest_framework.throttling import SimpleRateThrottle
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class AtomicRateThrottle(SimpleRateThrottle):
+    """
+    Скользящее окно попыток в Redis, проверяемое и пополняемое одним скриптом.
+    SimpleRateThrottle читает историю из кеша и записывает ее обратно отдельно,
+    поэтому параллельные запросы в разных воркерах проходят сверх лимита.
+    Без REDIS_URL или при недоступном Redis работает как SimpleRateThrottle.
+    """
+
+    # KEYS[1] — ключ окна; ARGV — окно (мкс), лимит, id попытки.
+    # Возвращает -1, если попытка разрешена, иначе ожидание до освобождения места, мкс
+    HIT_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local window = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return tonumber(oldest[2]) + window - now
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], math.ceil(window / 1000))
+return -1
+"""
+
+    def allow_request(self, request, view):
+        if self.rate is None or not settings.REDIS_URL:
+            return super().allow_request(request, view)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        try:
+            wait = int(get_redis().eval(
+                self.HIT_SCRIPT, 1, self.key, self.duration * 1_000_000, self.num_requests,
+                uuid.uuid4().hex))
+        except Exception as e:
+            logger.warning(f"Redis throttle is unavailable, using cache: {str(e)}")
+            return super().allow_request(request, view)
+        self.redis_wait = wait / 1e6 if wait >= 0 else None
+        return self.redis_wait is None
+
+    def wait(self):
+        if getattr(self, 'redis_wait', None) is not None:
+            return self.redis_wait
+        return super().wait()
+
+
+class LoginIPRateThrottle(AtomicRateThrottle):
+    """
+    Ограничение попыток входа с одного IP. Проверяется до authenticate(),
+    поэтому отклоненная попытка не тратит CPU на хеширование пароля.
+    """
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginEmailRateThrottle(AtomicRateThrottle):
+    """Ограничение попыток входа в один аккаунт с любых адресов (перебор паролей)."""
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        ident = sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
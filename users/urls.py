@@ -1,9 +1,15 @@
 from django.urls import path
 from .views import UserRegistrationView
 from .views import UserLoginView
+from .views import UserLogoutView
+from .views import UserImportView
+from .views import UserImportStatusView
 
 
 urlpatterns = [
        path('register/', UserRegistrationView.as_view(), name='user-registration'),
        path('login/', UserLoginView.as_view(), name='user-login'),
+       path('logout/', UserLogoutView.as_view(), name='user-logout'),
+       path('import/', UserImportView.as_view(), name='user-import'),
+       path('import/<str:task_id>/', UserImportStatusView.as_view(), name='user-import-status'),
    ]
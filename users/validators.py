@@ -0,0 +1,10 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.core.exceptions import ValidationError
+
+
+def validate_timezone(value):
+    """Проверка, что часовой пояс есть в базе IANA (например, Europe/Moscow)."""
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f'Неизвестный часовой пояс: {value}.')
@@ -1,8 +1,11 @@
-from rest_framework import generics
+from celery.result import AsyncResult
+from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework import status
 from .models import CustomUser
-from .serializers import UserRegistrationSerializer
+from .serializers import UserImportSerializer, UserRegistrationSerializer
+from .tasks import import_storage, import_users_file
+from .throttling import LoginEmailRateThrottle, LoginIPRateThrottle
 #эндпоинт для авторизации
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
@@ -22,6 +25,9 @@ class UserRegistrationView(generics.CreateAPIView):
 
 
 class UserLoginView(APIView):
+    # Ограничения проверяются до authenticate() и хеширования пароля
+    throttle_classes = [LoginIPRateThrottle, LoginEmailRateThrottle]
+
     def post(self, request, *args, **kwargs):
         email = request.data.get('email')
         password = request.data.get('password')
@@ -30,3 +36,37 @@ class UserLoginView(APIView):
             token, created = Token.objects.get_or_create(user=user)
             return Response({'token': token.key}, status=status.HTTP_200_OK)
         return Response({'error': 'Неверные учетные данные'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UserLogoutView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        # Удаление токена сбрасывает его и из кеша аутентификации
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UserImportView(APIView):
+    """Массовый импорт пользователей из CSV (для администраторов)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UserImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Пароли хешируются в Celery: в HTTP-запросе это заняло бы воркер на минуты
+        name = import_storage().save('users.csv', serializer.validated_data['file'])
+        task = import_users_file.delay(name)
+        return Response({'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
+
+
+class UserImportStatusView(APIView):
+    """Результат импорта: {'status': ..., 'created': ..., 'skipped': [...]} после завершения."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, task_id, *args, **kwargs):
+        result = AsyncResult(task_id)
+        data = {'status': result.status}
+        if result.successful():
+            data.update(result.result)
+        return Response(data)